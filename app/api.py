@@ -1,16 +1,33 @@
-from flask import Flask, jsonify, request, g, render_template
+from flask import Flask, jsonify, request, g, render_template, Response, stream_with_context
 from flask_cors import CORS
-import subprocess
+import json
 import time
 import uuid
 import os
 
-from utils.config import load_services
-from utils.system_info import get_system_info
+from utils.config import load_services, get_service_registry, public_service
+from utils.system_info import (
+    get_system_info, get_static_info, get_cpu_sampler, collect_system_report, render_system_report
+)
+from utils.cache import get_cache_stats
+from utils.scan_jobs import get_scan_manager, QueueFullError
+from utils.metrics import get_metrics_registry, HTTP_REQUESTS, HTTP_LATENCY, RATE_LIMITED, COALESCED
+from utils.history import get_metrics_history
+from utils.health import get_health_registry, LIVENESS, READINESS
 from utils.aws_info import get_aws_info
 from utils.network import validate_port, test_tcp_connection
-from utils.validation import validate_scan_target
-from utils.logging_config import setup_logging, get_logger
+from utils.protocols import check_service as run_service_check, check_services as run_service_checks
+from utils.validation import validate_scan_targets
+from utils.probe_scheduler import get_probe_scheduler
+from utils.sharding import get_shard_membership
+from utils.events import get_event_bus, get_metrics_watcher, format_sse
+from utils.http_cache import finalize_response, static_url
+from utils.fleet import get_fleet
+from utils.rate_limit import (
+    get_rate_limiter, client_ip, retry_after_header, RATE_LIMIT_ENABLED
+)
+from utils.singleflight import get_single_flight
+from utils.logging_config import setup_logging, get_logger, sample_request_log
 
 # Setup logging
 logger = setup_logging()
@@ -25,20 +42,135 @@ def log_request_event(event_type, **kwargs):
 app = Flask(__name__, static_folder='static', static_url_path='/static', template_folder='templates')
 CORS(app)
 
+# Collect static system facts once at startup instead of on the first request,
+# and detect AWS in the background; requests never wait on IMDS
+get_static_info()
+get_cpu_sampler().start()
+get_aws_info(wait=False)
+
+service_registry = get_service_registry()
+
+# Probe configured services in the background; /api/services reads the results.
+# With SHARD_PEERS set, each replica probes its share and pulls the rest.
+shard_membership = get_shard_membership()
+probe_scheduler = get_probe_scheduler()
+if os.getenv('PROBE_SCHEDULER_ENABLED', 'true').lower() == 'true':
+    probe_scheduler.start()
+
+scan_manager = get_scan_manager()
+
+# Aggregates peer instances when FLEET_PEERS or FLEET_DNS is set
+fleet = get_fleet()
+
+metrics_registry = get_metrics_registry()
+metrics_registry.start_flusher()
+
+metrics_history = get_metrics_history()
+if os.getenv('HISTORY_ENABLED', 'true').lower() == 'true':
+    metrics_history.start()
+
+event_bus = get_event_bus()
+metrics_watcher = get_metrics_watcher()
+STREAM_KEEPALIVE = float(os.getenv('STREAM_KEEPALIVE', 15))
+# Each open stream holds a server thread; leave the rest for requests
+STREAM_MAX_CLIENTS = int(os.getenv(
+    'STREAM_MAX_CLIENTS', max(1, int(os.getenv('WEB_THREADS', 32)) // 2)
+))
+
+# Checks of services not in services.json may only connect or GET /
+CLIENT_CHECK_TYPES = ('tcp', 'http', 'https')
+
+# Per-client budgets for expensive endpoints, and coalescing of identical probes
+rate_limiter = get_rate_limiter()
+single_flight = get_single_flight()
+
 
 @app.before_request
 def before_request():
     """Log request details and setup request context."""
     g.start_time = time.time()
     g.request_id = str(uuid.uuid4())[:8]
+    g.log_sampled = sample_request_log()
     
-    log_request_event(
-        "Request started",
-        method=request.method,
-        endpoint=request.endpoint or request.path,
-        user_ip=request.remote_addr,
-        user_agent=request.headers.get('User-Agent', '')
+    if g.log_sampled:
+        log_request_event(
+            "Request started",
+            method=request.method,
+            endpoint=request.endpoint or request.path,
+            user_ip=request.remote_addr,
+            user_agent=request.headers.get('User-Agent', '')
+        )
+    
+    # CORS preflights carry no work and must not spend the client's budget
+    if RATE_LIMIT_ENABLED and request.endpoint and request.method != 'OPTIONS':
+        return enforce_rate_limit(request.endpoint)
+
+
+def enforce_rate_limit(endpoint):
+    """Refuse the request with 429 when the client has used its budget."""
+    client = client_ip(request)
+    allowed, retry_after = rate_limiter.allow(endpoint, client)
+    if allowed:
+        return None
+    
+    RATE_LIMITED.inc((endpoint,))
+    logger.warning(
+        "Request rate limited",
+        extra={
+            'request_id': g.get('request_id'),
+            'endpoint': endpoint,
+            'client': client,
+            'retry_after': round(retry_after, 2)
+        }
     )
+    response = jsonify({
+        'error': f'Too many requests to {request.path}; retry in {retry_after:.0f}s',
+        'retry_after': round(retry_after, 2)
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+
+def coalesced(endpoint, params, compute):
+    """Run compute once for concurrent requests with identical parameters."""
+    key = (endpoint, json.dumps(params, sort_keys=True, default=str))
+    result, shared = single_flight.do(key, compute)
+    if shared:
+        COALESCED.inc((endpoint,))
+    return result
+
+
+def client_service(data):
+    """
+    Build the probe for a service check requested by a client.
+
+    A name found in services.json selects that entry with all its options.
+    Anything else is probed from its host, port and type alone: payloads,
+    credentials and custom requests are never taken from the request body.
+
+    Raises:
+        ValueError: If the port or type is not allowed
+    """
+    name = data.get('name')
+    configured = service_registry.get(str(name)) if name is not None else None
+    if configured is not None:
+        return configured.to_dict()
+    service_type = str(data.get('type', 'tcp'))
+    if service_type not in CLIENT_CHECK_TYPES:
+        raise ValueError(
+            f"Type must be one of {', '.join(CLIENT_CHECK_TYPES)} for services not in services.json"
+        )
+    service = {
+        'host': str(data.get('host', 'localhost')),
+        'port': validate_port(data.get('port', 80)),
+        'type': service_type
+    }
+    if service_type != 'tcp':
+        service.update(method='GET', path='/')
+    if name is not None:
+        service['name'] = name
+    return service
 
 
 @app.after_request
@@ -46,6 +178,15 @@ def after_request(response):
     """Log response details."""
     duration = time.time() - g.get('start_time', time.time())
     
+    endpoint = request.endpoint or 'unmatched'
+    status = str(response.status_code)
+    HTTP_REQUESTS.inc((endpoint, request.method, status))
+    HTTP_LATENCY.observe((endpoint, status), duration)
+    
+    # Unsampled requests are still logged when they fail
+    if not g.get('log_sampled', True) and response.status_code < 500:
+        return response
+    
     log_request_event(
         "Request completed",
         method=request.method,
@@ -56,6 +197,21 @@ def after_request(response):
     
     return response
 
+# Registered after the logging hook so it runs first and the logs and
+# metrics see the final (possibly 304) status
+@app.after_request
+def cache_headers(response):
+    """Add ETags, conditional GET handling, compression and cache headers."""
+    return finalize_response(request, response)
+
+@app.context_processor
+def inject_static_url():
+    """Let templates reference static files by content-hashed URLs."""
+    return {
+        'static_url': lambda filename: static_url(app.static_folder, filename),
+        'fleet_enabled': fleet.enabled
+    }
+
 @app.route('/')
 def index():
     """Serve the main HTML page."""
@@ -94,6 +250,20 @@ def network_analysis_page():
         )
         return "Application not found", 404
 
+@app.route('/fleet')
+def fleet_page():
+    """Serve the fleet overview page."""
+    if not fleet.enabled:
+        return "Fleet mode is not configured", 404
+    try:
+        return render_template('fleet.html')
+    except IOError as e:
+        logger.error(
+            "Failed to serve fleet page",
+            extra={'request_id': g.get('request_id'), 'error': str(e)}
+        )
+        return "Application not found", 404
+
 @app.route('/api/instance-info')
 def instance_info():
     """Get comprehensive instance information."""
@@ -103,12 +273,14 @@ def instance_info():
         # Get comprehensive system info
         info = get_system_info()
         
-        # Try to add AWS metadata if available
-        aws_info = get_aws_info()
+        # Try to add AWS metadata if available; detection runs in the background
+        aws_info = get_aws_info(wait=False)
         if aws_info:
             info.update(aws_info)
             info['cloud_provider'] = 'AWS'
             log_request_event("AWS metadata retrieved")
+        elif aws_info is None:
+            info['cloud_provider'] = 'Unknown (detecting)'
         else:
             info['cloud_provider'] = 'Unknown/On-Premise'
         
@@ -117,53 +289,69 @@ def instance_info():
         log_request_event("Failed to get instance information", error=str(e))
         return jsonify({'error': 'Failed to retrieve instance information'}), 500
 
-def _run_health_checks(check_level='basic'):
-    """Run health checks with different levels of thoroughness."""
-    checks = {}
-    overall_status = 'healthy' if check_level == 'basic' else 'ready'
-    
-    # Config check (both levels)
-    try:
-        load_services()
-        checks['config'] = 'ok'
-    except Exception:
-        checks['config'] = 'error'
-        overall_status = 'degraded' if check_level == 'basic' else 'not_ready'
-    
-    # System info check (both levels)  
-    try:
-        get_system_info()
-        checks['system' if check_level == 'basic' else 'system_info'] = 'ok'
-    except Exception:
-        checks['system' if check_level == 'basic' else 'system_info'] = 'error'
-        overall_status = 'degraded' if check_level == 'basic' else 'not_ready'
-    
-    # Network check (readiness only)
-    if check_level == 'readiness':
-        try:
-            if test_tcp_connection('localhost', int(os.getenv('PORT', 80))):
-                checks['network'] = 'ok'
-            else:
-                checks['network'] = 'warning'
-        except Exception:
-            checks['network'] = 'error'
-            overall_status = 'not_ready'
-    else:
-        # Basic health always includes app check
-        checks['app'] = 'ok'
-    
-    return {
-        'status': overall_status,
-        'timestamp': time.time(),
-        'checks': checks
-    }
+@app.route('/metrics')
+def metrics():
+    """Expose request, probe and cache metrics in Prometheus text format."""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/metrics/history')
+def metrics_history_view():
+    """Get sampled metric and probe history, downsampled to ?points= rows."""
+    since = request.args.get('since', 0, type=float)
+    if 'window' in request.args:
+        since = max(since, time.time() - request.args.get('window', 0, type=float))
+    points = request.args.get('points', 500, type=int)
+    return jsonify(metrics_history.query(since, points, request.args.get('service')))
+
+
+@app.route('/api/fleet')
+def fleet_view():
+    """Get instance info and service status merged across all fleet peers."""
+    if not fleet.enabled:
+        return jsonify({'error': 'Fleet mode is not configured (set FLEET_PEERS or FLEET_DNS)'}), 404
+    if request.args.get('refresh', 'false').lower() == 'true':
+        fleet.refresh()
+    include_services = request.args.get('services', 'true').lower() != 'false'
+    return jsonify(fleet.view(include_services=include_services))
+
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Get hit/miss counters for the in-process caches."""
+    return jsonify(get_cache_stats())
+
+def _check_config():
+    service_registry.refresh()
+    return 'ok' if service_registry.error is None else 'warning'
+
+
+def _check_system():
+    get_system_info()
+    return 'ok'
+
+
+def _check_network():
+    if test_tcp_connection('localhost', int(os.getenv('PORT', 80))):
+        return 'ok'
+    return 'warning'
+
+
+# Health checks run in the background; /health and /ready only read results
+health_registry = get_health_registry()
+health_registry.register('app', lambda: 'ok', levels=(LIVENESS,))
+health_registry.register('config', _check_config)
+health_registry.register('system', _check_system)
+health_registry.register('network', _check_network, levels=(READINESS,))
+health_registry.start()
 
 
 @app.route('/health')
 def health_check():
     """Health check endpoint for container orchestration."""
     try:
-        result = _run_health_checks('basic')
+        result = health_registry.report(LIVENESS)
+        result['status'] = 'healthy' if result.pop('healthy') else 'degraded'
         status_code = 200 if result['status'] == 'healthy' else 503
         return jsonify(result), status_code
     except Exception as e:
@@ -179,7 +367,8 @@ def health_check():
 def readiness_check():
     """Readiness check endpoint for container orchestration."""
     try:
-        result = _run_health_checks('readiness')
+        result = health_registry.report(READINESS)
+        result['status'] = 'ready' if result.pop('healthy') else 'not_ready'
         status_code = 200 if result['status'] == 'ready' else 503
         return jsonify(result), status_code
     except Exception as e:
@@ -193,8 +382,59 @@ def readiness_check():
 
 @app.route('/api/services')
 def get_services():
-    """Get configured services list."""
-    return jsonify(load_services())
+    """Get configured services (filterable by type, name or host) with live status."""
+    filters = {k: request.args[k] for k in ('type', 'name', 'host') if k in request.args}
+    if filters:
+        services = [s.public_dict() for s in service_registry.filter(**filters)]
+    else:
+        services = service_registry.public_config()['services']
+    
+    if probe_scheduler.running:
+        services = probe_scheduler.snapshot(services)
+    return jsonify({'services': services})
+
+@app.route('/api/shard/results')
+def shard_results():
+    """Get the probe results this replica owns, for its sharding peers."""
+    return jsonify({
+        'shard': probe_scheduler.shard_status(),
+        'results': probe_scheduler.owned_results()
+    })
+
+@app.route('/api/stream')
+def event_stream():
+    """Push service status and metric changes as server-sent events."""
+    if event_bus.subscriber_count >= STREAM_MAX_CLIENTS:
+        # EventSource gives up on an error status and the dashboard polls instead
+        response = jsonify({'error': 'Too many open streams; poll /api/services instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    subscription = event_bus.subscribe()
+    metrics_watcher.start()
+    log_request_event("Event stream opened", subscribers=event_bus.subscriber_count)
+    
+    def generate():
+        try:
+            yield format_sse('snapshot', {
+                'services': probe_scheduler.snapshot() if probe_scheduler.running else None,
+                'metrics': metrics_watcher.current
+            })
+            while not subscription.closed:
+                event = subscription.get(timeout=STREAM_KEEPALIVE)
+                if event is None:
+                    # Comment frame keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(*event)
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/check-service', methods=['POST'])
 def check_service():
@@ -216,12 +456,12 @@ def check_service():
         }
     )
     
-    # Validate port
+    # Validate port and type, or look up the named service
     try:
-        port = validate_port(data.get('port', 80))
+        service = client_service(data)
     except ValueError as e:
         logger.warning(
-            "Invalid port provided",
+            "Invalid service check",
             extra={
                 'request_id': g.get('request_id'),
                 'port': data.get('port', 80),
@@ -236,10 +476,10 @@ def check_service():
             'message': str(e)
         }), 400
     
-    # Test connection
-    is_online = test_tcp_connection(host, port)
-    status = 'online' if is_online else 'offline'
-    message = f'Successfully connected to {host}:{port}' if is_online else f'Cannot connect to {host}:{port}'
+    # Identical checks already in flight (e.g. many dashboards refreshing) share one probe
+    host, port, service_type = service['host'], service['port'], service['type']
+    result = coalesced('check_service', service, lambda: run_service_check(service))
+    status = result['status']
     
     logger.info(
         "Service connectivity check completed",
@@ -256,31 +496,77 @@ def check_service():
         'port': port,
         'type': service_type,
         'status': status,
-        'message': message
+        'message': result['message'],
+        'latency_ms': result['latency_ms']
     })
 
+@app.route('/api/check-services', methods=['POST'])
+def check_services():
+    """Check connectivity to many services concurrently in a single request."""
+    data = request.get_json(silent=True) or {}
+    targets = data.get('targets', 'all')
+    
+    if targets == 'all':
+        targets = load_services().get('services', [])
+    elif not isinstance(targets, list):
+        return jsonify({'error': "targets must be a list or 'all'"}), 400
+    
+    # Validate every target up front; invalid entries are reported, not probed
+    valid_targets = []
+    results = []
+    for target in targets:
+        if not isinstance(target, dict):
+            results.append({'status': 'error', 'message': 'Invalid target entry'})
+            continue
+        try:
+            valid_targets.append(client_service(target))
+        except ValueError as e:
+            results.append({
+                'name': target.get('name'),
+                'host': target.get('host', 'localhost'),
+                'port': target.get('port', 80),
+                'type': target.get('type', 'tcp'),
+                'status': 'error',
+                'message': str(e)
+            })
+    
+    start = time.time()
+    checked = coalesced('check_services', valid_targets, lambda: run_service_checks(valid_targets))
+    # Targets named in services.json carry their private options; drop them
+    for result in map(public_service, checked):
+        if result['status'] == 'timeout':
+            endpoint = f"{result['host']}:{result['port']}"
+            result['message'] = f'Check of {endpoint} did not finish before the batch deadline'
+        results.append(result)
+    
+    log_request_event(
+        "Batch service check completed",
+        count=len(results),
+        duration=f"{time.time() - start:.3f}s"
+    )
+    
+    return jsonify({'results': results})
+
 @app.route('/api/system-info')
 def system_info():
-    """Get system information via script."""
+    """Get the system report as JSON, or as plain text with ?format=text."""
     try:
-        result = subprocess.run(
-            ['/app/scripts/system-info.sh'], 
-            capture_output=True, 
-            text=True, 
-            timeout=10
-        )
-        return jsonify({
-            'output': result.stdout,
-            'error': result.stderr
-        })
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'System info script timed out'}), 504
+        report = collect_system_report()
+        text = render_system_report(report)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        # JSON even for ?format=text, so the dashboard can show the error
+        log_request_event("Failed to collect system report", error=str(e))
+        return jsonify({'error': 'Failed to collect system report'}), 500
+    if request.args.get('format') == 'text':
+        return Response(text, mimetype='text/plain')
+    return jsonify({
+        'report': report,
+        'output': text
+    })
 
 @app.route('/api/network-scan', methods=['POST'])
 def network_scan():
-    """Perform network scan on target."""
+    """Queue a network scan of a target and return its job."""
     if not request.json:
         return jsonify({'error': 'No JSON data provided'}), 400
     
@@ -288,19 +574,21 @@ def network_scan():
     target = data.get('target', 'localhost')
     
     # Enhanced input validation
-    if not target or len(target.strip()) == 0:
+    if not isinstance(target, str) or len(target.strip()) == 0:
         return jsonify({'error': 'Target cannot be empty'}), 400
     
-    target = target.strip()
+    # Several hosts or networks may be given, separated by commas or spaces
+    target = ' '.join(target.replace(',', ' ').split())
     
     logger.info(
         "Network scan requested",
         extra={'request_id': g.get('request_id'), 'target': target}
     )
     
-    # Validate scan target for security
-    is_valid, error_msg = validate_scan_target(target)
-    if not is_valid:
+    # Validate every scan target for security
+    decisions = validate_scan_targets(target.split())
+    error_msg = next((error for valid, error in decisions if not valid), None)
+    if error_msg is not None:
         logger.warning(
             "Network scan blocked - invalid target",
             extra={
@@ -311,51 +599,55 @@ def network_scan():
         )
         return jsonify({'error': f'Invalid target: {error_msg}'}), 400
     
+    # Ports may be a list or a spec such as "top100" or "22,80,8000-8100"
+    ports = data.get('ports')
+    if isinstance(ports, list):
+        ports = ','.join(str(p) for p in ports)
+    elif ports is not None:
+        ports = str(ports)
+    
     try:
-        # Use safe command construction with limited scope
-        cmd = ['nmap', '-sT', '-F', '--host-timeout', '10s', target]
-        logger.info(
-            "Starting network scan",
-            extra={'request_id': g.get('request_id'), 'target': target}
+        job, source = scan_manager.submit(
+            target,
+            refresh=bool(data.get('refresh')),
+            scanner=data.get('scanner'),
+            ports=ports
         )
-        
-        result = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True, 
-            timeout=30
-        )
-        
-        logger.info(
-            "Network scan completed",
-            extra={
-                'request_id': g.get('request_id'),
-                'target': target,
-                'return_code': result.returncode
-            }
-        )
-        
-        return jsonify({
-            'target': target,
-            'output': result.stdout,
-            'error': result.stderr if result.stderr else None
-        })
-    except subprocess.TimeoutExpired:
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFullError as e:
         logger.warning(
-            "Network scan timed out",
+            "Network scan rejected - queue full",
             extra={'request_id': g.get('request_id'), 'target': target}
         )
-        return jsonify({'error': 'Network scan timed out'}), 504
-    except Exception as e:
-        logger.error(
-            "Network scan failed",
-            extra={
-                'request_id': g.get('request_id'),
-                'target': target,
-                'error': str(e)
-            }
-        )
-        return jsonify({'error': 'Network scan failed'}), 500
+        return jsonify({'error': str(e)}), 429
+    
+    logger.info(
+        "Network scan queued",
+        extra={
+            'request_id': g.get('request_id'),
+            'target': target,
+            'job_id': job.id,
+            'source': source
+        }
+    )
+    
+    # Raw scanner output is opt-in; the parsed results are usually enough
+    result = job.to_dict(include_output=bool(data.get('output', False)))
+    result['source'] = source
+    return jsonify(result), 200 if source == 'cached' else 202
+
+
+@app.route('/api/network-scan/<job_id>')
+def network_scan_status(job_id):
+    """Get scan job status and parsed results (output lines from ?offset= with ?output=true)."""
+    job = scan_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    include_output = request.args.get('output', 'false').lower() == 'true'
+    return jsonify(job.to_dict(max(offset, 0), include_output))
 
 if __name__ == '__main__':
     # Use port 80 for production, allow PORT override for development
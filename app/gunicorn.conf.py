@@ -0,0 +1,61 @@
+"""Gunicorn settings for the production serving mode.
+
+Every value can be overridden through the environment; see README.md.
+Threaded workers (gthread) serve many requests per process, but each open
+/api/stream connection holds one thread for as long as it lasts, so the API
+caps streams per process at half of WEB_THREADS (STREAM_MAX_CLIENTS).
+"""
+import glob
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '80')}"
+
+# One process by default: the background probes, health checks, samplers
+# and caches all live in the process, and request handlers mostly wait on
+# I/O, so threads scale better here than processes. Extra workers share
+# probe results, scan jobs, history and metrics through the files below.
+workers = int(os.getenv('WEB_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 32))
+
+# Keep-alive and timeouts
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+backlog = int(os.getenv('WEB_BACKLOG', 2048))
+
+# Worker recycling is off by default: a recycled worker drops its open
+# streams and fails the scans it is running (0 disables)
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 0))
+
+# The app does its own request logging
+accesslog = None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+# Background probes and health checks start on import; loading the app in the
+# master would leave them behind when workers fork, so load per worker.
+preload_app = False
+
+# Workers write metric snapshots here so /metrics can sum all processes
+metrics_dir = os.environ.setdefault('METRICS_MULTIPROC_DIR', '/tmp/webapp-metrics')
+# One worker samples metric history into this file; all workers serve it
+os.environ.setdefault('HISTORY_FILE', '/tmp/webapp-history.bin')
+# One worker probes services and shares the results through this file
+probe_state_file = os.environ.setdefault('PROBE_STATE_FILE', '/tmp/webapp-probes.json')
+# Scan jobs are shared through this database, so any worker can answer for a job
+scan_job_db = os.environ.setdefault('SCAN_JOB_DB', '/tmp/webapp-scans.db')
+
+
+def on_starting(server):
+    """Clear metric snapshots, probe results and scan jobs left over from a previous run."""
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.unlink(path)
+    stale = [probe_state_file]
+    if scan_job_db:
+        stale += [scan_job_db + suffix for suffix in ('', '-wal', '-shm', '-journal')]
+    for path in stale:
+        if path and os.path.isfile(path):
+            os.unlink(path)
@@ -0,0 +1,7 @@
+"""Command line TCP probe sweeper built on the shared asyncio probe engine."""
+import sys
+
+from utils.network import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Server entry point for Simple Web App.
+
+SERVER_MODE selects how the app is served:
+- production (default): Gunicorn with multiple threaded workers, configured
+  by gunicorn.conf.py
+- development: the single-process Flask development server
+"""
+import os
+import shutil
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_development():
+    """Run the Flask development server."""
+    sys.path.insert(0, APP_DIR)
+    from api import app
+    port = int(os.getenv('PORT', 80))
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV') == 'development')
+
+
+def run_production():
+    """Replace this process with Gunicorn so supervisord signals reach it directly."""
+    gunicorn = shutil.which('gunicorn')
+    if gunicorn is None:
+        print("gunicorn not found, falling back to the development server", file=sys.stderr)
+        run_development()
+        return
+    os.execv(gunicorn, [
+        gunicorn,
+        '--config', os.path.join(APP_DIR, 'gunicorn.conf.py'),
+        '--chdir', APP_DIR,
+        'api:app'
+    ])
+
+
+if __name__ == '__main__':
+    mode = os.getenv('SERVER_MODE', 'production').lower()
+    if mode == 'development':
+        run_development()
+    elif mode == 'production':
+        run_production()
+    else:
+        sys.exit(f"Unknown SERVER_MODE '{mode}' (expected 'production' or 'development')")
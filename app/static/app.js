@@ -5,19 +5,26 @@
 class MonitorDashboard {
     constructor() {
         this.refreshInterval = null;
+        this.eventSource = null;
+        this.instanceData = null;
+        this.fleetInterval = null;
         this.init();
     }
 
     init() {
         this.loadInstanceInfo();
-        this.loadServices();
         this.setupEventListeners();
-        this.startAutoRefresh();
+
+        // The fleet page polls; peers are fetched server-side with deadlines
+        if (document.getElementById('fleet-peers')) {
+            this.loadFleet();
+            this.fleetInterval = setInterval(() => this.loadFleet(), 10000);
+        }
         
-        // Load system overview
-        const overviewContainer = document.getElementById('system-overview');
-        if (overviewContainer) {
-            this.loadInstanceInfo();
+        // Prefer pushed updates; fall back to polling without EventSource
+        if (!this.connectStream()) {
+            this.loadServices();
+            this.startAutoRefresh();
         }
     }
 
@@ -52,6 +59,74 @@ class MonitorDashboard {
         }, 30000);
     }
 
+    connectStream() {
+        if (!window.EventSource) return false;
+        // Pages without live widgets (e.g. network analysis) need no stream
+        if (!document.getElementById('services-list') && !document.getElementById('system-overview')) {
+            return true;
+        }
+
+        this.eventSource = new EventSource('/api/stream');
+
+        this.eventSource.addEventListener('snapshot', (e) => {
+            const data = JSON.parse(e.data);
+            if (data.services) {
+                this.renderServiceList(data.services);
+            } else {
+                this.loadServices();
+            }
+            this.applyMetrics(data.metrics);
+        });
+
+        this.eventSource.addEventListener('services', (e) => {
+            this.renderServiceList(JSON.parse(e.data));
+        });
+
+        this.eventSource.addEventListener('service', (e) => {
+            const data = JSON.parse(e.data);
+            this.updateServiceStatus(data.key, data);
+            this.showRefreshIndicator();
+        });
+
+        this.eventSource.addEventListener('metrics', (e) => {
+            this.applyMetrics(JSON.parse(e.data));
+        });
+
+        this.eventSource.onerror = () => {
+            // EventSource reconnects by itself; poll only if it gives up (e.g. a
+            // 503 when the server has too many streams), loading right away so
+            // the page does not stay empty until the first poll
+            if (this.eventSource.readyState === EventSource.CLOSED && !this.refreshInterval) {
+                this.loadServices();
+                this.loadInstanceInfo();
+                this.startAutoRefresh();
+            }
+        };
+
+        return true;
+    }
+
+    applyMetrics(metrics) {
+        if (!metrics) return;
+
+        this.instanceData = { ...(this.instanceData || {}), ...metrics };
+
+        const container = document.getElementById('instance-info');
+        const overviewContainer = document.getElementById('system-overview');
+        if (overviewContainer) {
+            overviewContainer.innerHTML = this.renderSystemOverview(this.instanceData);
+        }
+        if (container && this.instanceData.hostname) {
+            const activeTab = container.querySelector('.tab-section.active')?.id;
+            container.innerHTML = this.renderInstanceInfo(this.instanceData);
+            if (activeTab) {
+                container.querySelectorAll('.tab-section').forEach(section => {
+                    section.classList.toggle('active', section.id === activeTab);
+                });
+            }
+        }
+    }
+
     showRefreshIndicator() {
         const indicator = document.getElementById('refresh-indicator');
         if (indicator) {
@@ -92,6 +167,7 @@ class MonitorDashboard {
 
         try {
             const data = await this.makeApiCall('/api/instance-info');
+            this.instanceData = data;
             if (container) {
                 container.innerHTML = this.renderInstanceInfo(data);
             }
@@ -148,7 +224,7 @@ class MonitorDashboard {
             },
             'resources': {
                 title: 'Resource Usage',
-                fields: ['cpu_cores', 'cpu_threads', 'cpu_usage', 'cpu_frequency', 'memory_total', 'memory_used', 'memory_usage', 'memory_available']
+                fields: ['cpu_cores', 'cpu_threads', 'cpu_limit', 'cpu_usage', 'cpu_per_core', 'cpu_throttled', 'load_average', 'cpu_frequency', 'memory_limit', 'memory_total', 'memory_used', 'memory_usage', 'memory_available']
             },
             'network': {
                 title: 'Network Configuration',
@@ -173,6 +249,9 @@ class MonitorDashboard {
                     if (field === 'network_interfaces' && Array.isArray(value)) {
                         value = value.join('<br>');
                     }
+                    if (field === 'cpu_per_core' && Array.isArray(value)) {
+                        value = value.join(', ');
+                    }
                     if (field === 'processor' && value.length > 50) {
                         value = value.substring(0, 47) + '...';
                     }
@@ -195,6 +274,11 @@ class MonitorDashboard {
                         'memory_available': '<i class="fas fa-memory"></i>',
                         'cpu_threads': '<i class="fas fa-microchip"></i>',
                         'cpu_frequency': '<i class="fas fa-microchip"></i>',
+                        'cpu_limit': '<i class="fas fa-microchip"></i>',
+                        'cpu_per_core': '<i class="fas fa-chart-bar"></i>',
+                        'cpu_throttled': '<i class="fas fa-hourglass-half"></i>',
+                        'load_average': '<i class="fas fa-tachometer-alt"></i>',
+                        'memory_limit': '<i class="fas fa-memory"></i>',
                         'disk_total': '<i class="fas fa-hdd"></i>',
                         'disk_used': '<i class="fas fa-hdd"></i>',
                         'disk_free': '<i class="fas fa-hdd"></i>',
@@ -227,27 +311,34 @@ class MonitorDashboard {
 
         try {
             const data = await this.makeApiCall('/api/services');
+            this.renderServiceList(data.services);
             
-            if (data.services && data.services.length > 0) {
-                container.innerHTML = this.renderServices(data.services);
-                
-                // Check all services
-                data.services.forEach(service => {
-                    this.checkService(service.host, service.port, service.name);
-                });
-            } else {
-                container.innerHTML = '<div class="no-data">No services configured</div>';
+            // Statuses come from the server-side probe scheduler; fall back
+            // to a batch check when it is disabled
+            if (data.services && data.services.some(service => service.status === undefined)) {
+                await this.checkAllServices();
             }
         } catch (error) {
             container.innerHTML = `<div class="error">Failed to load services: ${error.message}</div>`;
         }
     }
 
+    renderServiceList(services) {
+        const container = document.getElementById('services-list');
+        if (!container) return;
+
+        if (services && services.length > 0) {
+            container.innerHTML = this.renderServices(services);
+        } else {
+            container.innerHTML = '<div class="no-data">No services configured</div>';
+        }
+    }
+
     renderServices(services) {
         return services.map(service => `
             <div class="service-item" id="service-${service.name}">
                 <span class="service-name">${service.name}</span>
-                <span class="status checking">Checking</span>
+                <span class="status ${service.status || 'checking'}" title="${service.message || ''}">${(service.status || 'checking').toUpperCase()}</span>
                 <button onclick="dashboard.recheckService('${service.host}', ${service.port}, '${service.name}')" 
                         class="small-button"><i class="fas fa-redo-alt"></i></button>
             </div>
@@ -258,7 +349,7 @@ class MonitorDashboard {
         try {
             const data = await this.makeApiCall('/api/check-service', {
                 method: 'POST',
-                body: JSON.stringify({ host, port })
+                body: JSON.stringify(name ? { name, host, port } : { host, port })
             });
 
             if (name) {
@@ -275,6 +366,23 @@ class MonitorDashboard {
         }
     }
 
+    async checkAllServices() {
+        try {
+            const data = await this.makeApiCall('/api/check-services', {
+                method: 'POST',
+                body: JSON.stringify({ targets: 'all' })
+            });
+
+            data.results.forEach(result => {
+                if (result.name) {
+                    this.updateServiceStatus(result.name, result);
+                }
+            });
+        } catch (error) {
+            console.error('Batch service check failed:', error);
+        }
+    }
+
     updateServiceStatus(name, data) {
         const statusElement = document.querySelector(`#service-${name} .status`);
         if (statusElement) {
@@ -340,16 +448,122 @@ class MonitorDashboard {
         resultDiv.innerHTML = '<div class="checking">Scanning network... (this may take a moment)</div>';
 
         try {
-            const data = await this.makeApiCall('/api/network-scan', {
+            let job = await this.makeApiCall('/api/network-scan', {
                 method: 'POST',
-                body: JSON.stringify({ target: 'localhost' })
+                body: JSON.stringify({ target: 'localhost', output: true })
             });
-            resultDiv.innerHTML = `<pre>${data.output || data.error || 'No scan results'}</pre>`;
+
+            // Poll the job, appending only the output lines we have not seen yet
+            const lines = [...job.output];
+            while (job.status === 'queued' || job.status === 'running') {
+                resultDiv.innerHTML = `<div class="checking">Scan ${job.status}...</div><pre>${lines.join('\n')}</pre>`;
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                job = await this.makeApiCall(`/api/network-scan/${job.job_id}?output=true&offset=${lines.length}`);
+                lines.push(...job.output);
+            }
+
+            if (job.results) {
+                resultDiv.innerHTML = this.renderScanResults(job);
+            } else {
+                const output = lines.join('\n');
+                resultDiv.innerHTML = `<pre>${output || job.error || 'No scan results'}</pre>`;
+            }
         } catch (error) {
             resultDiv.innerHTML = `<div class="error">Network scan failed: ${error.message}</div>`;
         }
     }
 
+    renderScanResults(job) {
+        if (job.results.length === 0) {
+            return '<div class="no-data">No hosts found</div>';
+        }
+
+        const rows = job.results.flatMap(host => {
+            const name = host.hostnames.length ? `${host.address} (${host.hostnames[0]})` : host.address;
+            if (host.ports.length === 0) {
+                return [`<tr><td>${name}</td><td colspan="3">${host.state}, no open ports</td></tr>`];
+            }
+            return host.ports.map(port => `
+                <tr>
+                    <td>${name}</td>
+                    <td>${port.port}/${port.protocol}</td>
+                    <td><span class="status ${port.state === 'open' ? 'online' : 'offline'}">${port.state}</span></td>
+                    <td>${port.service || ''}</td>
+                </tr>
+            `);
+        });
+
+        const cached = job.source === 'cached' ? ' (cached)' : '';
+        return `
+            <div class="scan-meta">Scan of ${job.target} (${job.scanner})${cached}</div>
+            <table class="info-table">${rows.join('')}</table>
+        `;
+    }
+
+    // Fleet View
+    async loadFleet() {
+        const peersDiv = document.getElementById('fleet-peers');
+        const servicesDiv = document.getElementById('fleet-services');
+        if (!peersDiv) return;
+
+        try {
+            const data = await this.makeApiCall('/api/fleet');
+            peersDiv.innerHTML = this.renderFleetPeers(data);
+            if (servicesDiv) {
+                servicesDiv.innerHTML = this.renderFleetServices(data);
+            }
+            this.showRefreshIndicator();
+        } catch (error) {
+            peersDiv.innerHTML = `<div class="error">Failed to load fleet: ${error.message}</div>`;
+        }
+    }
+
+    renderFleetPeers(data) {
+        if (data.peers.length === 0) {
+            return '<div class="no-data">No peers discovered</div>';
+        }
+
+        const rows = data.peers.map(peer => {
+            const info = peer.instance || {};
+            const statusClass = peer.status === 'up' ? 'online' : (peer.status === 'down' ? 'offline' : 'checking');
+            const stale = peer.stale ? ' (stale)' : '';
+            return `
+                <tr>
+                    <td>${info.hostname || peer.peer}</td>
+                    <td><span class="status ${statusClass}">${peer.status}${stale}</span></td>
+                    <td>${info.cpu_usage || ''}</td>
+                    <td>${info.memory_usage || ''}</td>
+                    <td>${peer.latency_ms !== null ? `${peer.latency_ms}ms` : (peer.error || '')}</td>
+                </tr>
+            `;
+        });
+
+        const summary = data.summary;
+        const refreshing = data.refreshing ? ', refreshing' : '';
+        return `
+            <div class="scan-meta">${summary.up} of ${summary.peers} instances up${refreshing}</div>
+            <table class="info-table">${rows.join('')}</table>
+        `;
+    }
+
+    renderFleetServices(data) {
+        if (!data.services || data.services.length === 0) {
+            return '<div class="no-data">No services reported</div>';
+        }
+
+        const rows = data.services.map(service => {
+            const statusClass = service.online === service.total ? 'online' : (service.online === 0 ? 'offline' : 'checking');
+            return `
+                <tr>
+                    <td>${service.name}</td>
+                    <td>${service.host}:${service.port}</td>
+                    <td><span class="status ${statusClass}">${service.online}/${service.total} online</span></td>
+                </tr>
+            `;
+        });
+        return `<table class="info-table">${rows.join('')}</table>`;
+    }
+
     // Utility Methods
     updateGlancesLink(event) {
         event.preventDefault();
@@ -362,6 +576,12 @@ class MonitorDashboard {
         if (this.refreshInterval) {
             clearInterval(this.refreshInterval);
         }
+        if (this.fleetInterval) {
+            clearInterval(this.fleetInterval);
+        }
+        if (this.eventSource) {
+            this.eventSource.close();
+        }
     }
 }
 
@@ -402,6 +622,10 @@ function scanNetwork() {
     dashboard?.scanNetwork();
 }
 
+function loadFleet() {
+    dashboard?.loadFleet();
+}
+
 function updateGlancesLink(event) {
     dashboard?.updateGlancesLink(event);
 }
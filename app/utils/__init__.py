@@ -3,26 +3,45 @@ Simple Web App Utilities Package
 
 This package contains utility modules for the Simple Web App:
 - config: Service configuration management
-- system_info: System information gathering
+- system_info: System information gathering and /proc-based system reports
+- cgroup: Container CPU/memory limits and usage (cgroup v1/v2)
 - aws_info: AWS metadata retrieval
 - network: Network connectivity utilities
+- resolver: Caching DNS resolver shared by all probes
+- protocols: Protocol-aware service probes (HTTP, Redis, Postgres, banners)
+- probe_scheduler: Background service health probing
+- sharding: Consistent-hash split of probe work across replicas
+- events: Server-sent event fan-out for live updates
 - validation: Input validation and security
 - logging_config: Structured logging setup
+- cache: TTL caches with hit/miss counters
+- health: Background liveness/readiness checks
+- scan_jobs: Background network scan job queue
+- port_sweep: Built-in concurrent TCP connect port sweep
+- metrics: Prometheus-style request, probe and cache metrics
+- http_cache: Response compression, ETags and static cache busting
+- history: Ring-buffer time series of system metrics and probe results
+- fleet: Aggregated view of peer instances (fleet mode)
+- rate_limit: Per-client rate limiting
+- singleflight: Coalescing of concurrent identical calls
 """
 
 __version__ = "1.0.0"
 __author__ = "Simple Web App Team"
 
 # Import commonly used functions
-from .config import load_services
+from .config import load_services, get_service_registry
 from .system_info import get_system_info
-from .network import test_tcp_connection, validate_port
-from .validation import validate_scan_target
+from .network import test_tcp_connection, check_tcp_connections, validate_port
+from .validation import validate_scan_target, validate_scan_targets
 
 __all__ = [
     'load_services',
+    'get_service_registry',
     'get_system_info', 
     'test_tcp_connection',
+    'check_tcp_connections',
     'validate_port',
-    'validate_scan_target'
+    'validate_scan_target',
+    'validate_scan_targets'
 ]
\ No newline at end of file
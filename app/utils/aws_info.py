@@ -1,38 +1,154 @@
 """AWS metadata utilities for cloud instance information.
 
 This module retrieves AWS EC2 instance metadata when running on AWS infrastructure.
+
+Instance metadata does not change during the instance's lifetime, so the
+result of get_aws_info() is cached for the life of the process. An empty
+"not on AWS" result is cached for AWS_METADATA_RETRY seconds and then
+re-checked in the background, so off-AWS hosts rarely pay the detection
+timeout and a briefly unreachable service is not mistaken for good.
+IMDSv2 session tokens are requested once and reused until shortly before
+they expire; IMDSv1 is used when no token can be had, including when the
+token response never arrives (a hop limit of 1 seen from a container).
 """
+import os
+import threading
+import time
 import urllib.request
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+
+AWS_METADATA_ENDPOINT = os.getenv('AWS_METADATA_ENDPOINT', 'http://169.254.169.254').rstrip('/')
+AWS_METADATA_URL = AWS_METADATA_ENDPOINT + '/latest/meta-data/'
+AWS_TOKEN_URL = AWS_METADATA_ENDPOINT + '/latest/api/token'
+AWS_TOKEN_TTL = int(os.getenv('AWS_METADATA_TOKEN_TTL', 21600))
+# Refresh the token this many seconds before it expires
+AWS_TOKEN_REFRESH_MARGIN = 60
+# Seconds before an empty (not on AWS) result is checked again
+AWS_METADATA_RETRY = float(os.getenv('AWS_METADATA_RETRY', 300))
+
+AWS_FIELDS = {
+    'instance_id': 'instance-id',
+    'instance_type': 'instance-type',
+    'public_ip': 'public-ipv4',
+    'availability_zone': 'placement/availability-zone',
+    'security_groups': 'security-groups'
+}
+
+_token = None
+_token_expires = 0.0
+_token_lock = threading.Lock()
 
+_aws_info = None
+_aws_info_expires = 0.0
+_aws_info_refreshing = False
+_aws_info_lock = threading.Lock()
 
-AWS_METADATA_URL = 'http://169.254.169.254/latest/meta-data/'
 
+def get_metadata_token(timeout=2) -> Optional[str]:
+    """
+    Get an IMDSv2 session token, reusing the cached one until it nears expiry.
 
-def get_aws_metadata(endpoint, timeout=2):
+    Returns:
+        str: Session token, or None to use IMDSv1 (tokens refused, or the
+             token request failed or timed out)
+    """
+    global _token, _token_expires
+    with _token_lock:
+        if _token and time.monotonic() < _token_expires - AWS_TOKEN_REFRESH_MARGIN:
+            return _token
+        request = urllib.request.Request(
+            AWS_TOKEN_URL,
+            method='PUT',
+            headers={'X-aws-ec2-metadata-token-ttl-seconds': str(AWS_TOKEN_TTL)}
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+            _token = response.read().decode()
+            _token_expires = time.monotonic() + AWS_TOKEN_TTL
+            return _token
+        except (urllib.error.URLError, TimeoutError, OSError):
+            # Refused, or the reply was dropped on the way: try IMDSv1
+            return None
+
+
+def get_aws_metadata(endpoint, timeout=2, token=None):
     """Fetch AWS metadata for a specific endpoint."""
     try:
         url = AWS_METADATA_URL + endpoint
-        response = urllib.request.urlopen(url, timeout=timeout)
+        headers = {'X-aws-ec2-metadata-token': token} if token else {}
+        request = urllib.request.Request(url, headers=headers)
+        response = urllib.request.urlopen(request, timeout=timeout)
         return response.read().decode()
     except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, OSError):
         return None
 
 
-def get_aws_info():
-    """Get AWS-specific metadata if available."""
-    aws_info = {}
-    aws_fields = {
-        'instance_id': 'instance-id',
-        'instance_type': 'instance-type',
-        'public_ip': 'public-ipv4',
-        'availability_zone': 'placement/availability-zone',
-        'security_groups': 'security-groups'
-    }
-    
-    for key, endpoint in aws_fields.items():
-        value = get_aws_metadata(endpoint)
-        if value:
-            aws_info[key] = value
-    
-    return aws_info
\ No newline at end of file
+def _fetch_aws_info() -> Dict[str, str]:
+    token = get_metadata_token()
+    with ThreadPoolExecutor(max_workers=len(AWS_FIELDS)) as executor:
+        values = executor.map(lambda endpoint: get_aws_metadata(endpoint, token=token),
+                              AWS_FIELDS.values())
+        return {key: value for key, value in zip(AWS_FIELDS, values) if value}
+
+
+def _store_aws_info(info: Dict[str, str]):
+    # Caller holds _aws_info_lock
+    global _aws_info, _aws_info_expires
+    _aws_info = info
+    _aws_info_expires = float('inf') if info else time.monotonic() + AWS_METADATA_RETRY
+
+
+def _refresh_aws_info():
+    global _aws_info_refreshing
+    try:
+        info = _fetch_aws_info()
+        with _aws_info_lock:
+            _store_aws_info(info)
+    finally:
+        _aws_info_refreshing = False
+
+
+def get_aws_info(wait: bool = True) -> Optional[Dict[str, str]]:
+    """
+    Get AWS-specific metadata if available.
+
+    Metadata is cached for the process lifetime. An empty result is kept for
+    AWS_METADATA_RETRY seconds, then returned while it is re-checked in the
+    background.
+
+    Args:
+        wait: Block on the first detection (up to the token and metadata
+              timeouts off AWS); if False, start it in the background instead
+
+    Returns:
+        dict: Metadata fields, empty when not on AWS, or None if wait is False
+              and the first detection has not finished
+    """
+    global _aws_info_refreshing
+    if _aws_info is None and wait:
+        with _aws_info_lock:
+            if _aws_info is None:
+                _store_aws_info(_fetch_aws_info())
+    elif _aws_info is None or time.monotonic() >= _aws_info_expires:
+        with _aws_info_lock:
+            start = not _aws_info_refreshing and (
+                _aws_info is None or time.monotonic() >= _aws_info_expires
+            )
+            _aws_info_refreshing = _aws_info_refreshing or start
+        if start:
+            threading.Thread(target=_refresh_aws_info, name='aws-metadata', daemon=True).start()
+    info = _aws_info
+    return None if info is None else dict(info)
+
+
+def reset_aws_info_cache():
+    """Forget the cached metadata and token so the next call re-detects AWS."""
+    global _aws_info, _aws_info_expires, _token, _token_expires
+    with _aws_info_lock, _token_lock:
+        _aws_info = None
+        _aws_info_expires = 0.0
+        _token = None
+        _token_expires = 0.0
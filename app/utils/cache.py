@@ -0,0 +1,109 @@
+"""In-process caching utilities.
+
+This module provides a small thread-safe TTL cache with hit/miss counters.
+Every named cache registers itself so its statistics can be reported from
+one place.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .singleflight import SingleFlight
+
+
+_registry: Dict[str, 'TTLCache'] = {}
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache whose entries expire after a fixed TTL.
+
+    Example:
+        >>> cache = TTLCache('example', ttl=5)
+        >>> cache.get_or_compute('answer', lambda: 42)
+        42
+        >>> cache.stats()['hits']
+        0
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: Optional[int] = None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: Dict[Hashable, tuple] = {}
+        # Concurrent misses for a key wait for one computation
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live cached value, counting a hit or a miss."""
+        entry = self._data.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the oldest entry when maxsize is reached."""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        # Caller holds self._lock
+        if self.maxsize and key not in self._data and len(self._data) >= self.maxsize:
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss.
+
+        Concurrent misses for the same key wait for a single computation
+        instead of all recomputing the value. The computation runs outside
+        the cache lock, so other keys are served meanwhile.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        def load():
+            # A computation that finished since the miss has stored its value
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+            value = compute()
+            # Stored before the call ends, so later misses find it
+            self.set(key, value)
+            return value
+
+        return self._flight.do(key, load)[0]
+
+    def invalidate(self, key: Hashable = _MISSING):
+        """Drop one key, or every entry when no key is given."""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+            'size': len(self._data),
+            'ttl': self.ttl
+        }
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return statistics for every registered cache, keyed by name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
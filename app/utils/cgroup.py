@@ -0,0 +1,200 @@
+"""Container resource limits and usage from cgroups.
+
+Inside a container psutil reports the host's CPUs and memory. The limits that
+actually apply (CPU quota, memory limit) and the container's own usage and
+throttling counters live in the cgroup filesystem, in one of two layouts:
+
+- cgroup v2: a single hierarchy with cpu.max, cpu.stat, memory.max, ...
+- cgroup v1: one hierarchy per controller with cpu.cfs_quota_us,
+  cpuacct.usage, memory.limit_in_bytes, ...
+
+The process's cgroup directories are located once from /proc/self/mountinfo
+and /proc/self/cgroup; every read afterwards is a handful of small file reads.
+"""
+import os
+from typing import Any, Dict, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger('utils.cgroup')
+
+
+PROC_SELF = '/proc/self'
+# v1 "unlimited" memory is a huge page-aligned number; anything above this is no limit
+_UNLIMITED = 1 << 60
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(path: str) -> Optional[int]:
+    value = _read(path)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _read_stat(path: str) -> Dict[str, int]:
+    stats = {}
+    for line in (_read(path) or '').splitlines():
+        key, _, value = line.partition(' ')
+        try:
+            stats[key] = int(value)
+        except ValueError:
+            continue
+    return stats
+
+
+class Cgroup:
+    """
+    Reader for the current process's cgroup limits and usage.
+
+    Example:
+        >>> cgroup = Cgroup()
+        >>> cgroup.version, cgroup.limits()
+        (2, {'cpu_limit': 1.5, 'memory_limit': 536870912})
+    """
+
+    def __init__(self, proc: str = PROC_SELF):
+        self.version: Optional[int] = None
+        self._dirs: Dict[str, str] = {}
+        try:
+            self._detect(proc)
+        except OSError as e:
+            logger.warning(f"Failed to detect cgroup layout: {e}")
+        if self.version is None:
+            logger.info("No cgroup limits found; using host totals")
+
+    def _detect(self, proc: str):
+        mounts_v1, mount_v2 = {}, None
+        with open(os.path.join(proc, 'mountinfo'), 'r') as f:
+            for line in f:
+                # <id> <parent> <dev> <root> <mountpoint> <opts> [tags] - <fstype> <source> <super opts>
+                fields, _, tail = line.partition(' - ')
+                fields, tail = fields.split(), tail.split()
+                if len(fields) < 5 or len(tail) < 3:
+                    continue
+                root, mountpoint = fields[3], fields[4]
+                if tail[0] == 'cgroup2':
+                    mount_v2 = (root, mountpoint)
+                elif tail[0] == 'cgroup':
+                    for option in tail[2].split(','):
+                        mounts_v1[option] = (root, mountpoint)
+
+        paths = {}
+        with open(os.path.join(proc, 'cgroup'), 'r') as f:
+            for line in f:
+                hierarchy, controllers, path = line.rstrip('\n').split(':', 2)
+                if hierarchy == '0':
+                    paths[''] = path
+                for controller in controllers.split(','):
+                    paths[controller] = path
+
+        if 'cpu' in mounts_v1 or 'memory' in mounts_v1:
+            self.version = 1
+            for controller in ('cpu', 'cpuacct', 'memory'):
+                if controller in mounts_v1 and controller in paths:
+                    self._dirs[controller] = self._resolve(mounts_v1[controller], paths[controller])
+        elif mount_v2 is not None and '' in paths:
+            self.version = 2
+            directory = self._resolve(mount_v2, paths[''])
+            self._dirs = {'cpu': directory, 'cpuacct': directory, 'memory': directory}
+
+    @staticmethod
+    def _resolve(mount, path: str) -> str:
+        # Within a cgroup namespace the mount root is the process's own cgroup,
+        # so the path from /proc/self/cgroup may not exist under the mount point.
+        root, mountpoint = mount
+        if root != '/' and path.startswith(root):
+            path = path[len(root):]
+        directory = os.path.join(mountpoint, path.lstrip('/'))
+        return directory if os.path.isdir(directory) else mountpoint
+
+    def _file(self, controller: str, name: str) -> str:
+        directory = self._dirs.get(controller)
+        return os.path.join(directory, name) if directory else os.devnull
+
+    def limits(self) -> Dict[str, Any]:
+        """
+        Return the CPU limit in cores and the memory limit in bytes.
+
+        Returns:
+            dict: {'cpu_limit': float or None, 'memory_limit': int or None},
+                  None meaning no limit is set
+        """
+        cpu_limit, memory_limit = None, None
+        if self.version == 2:
+            quota, _, period = (_read(self._file('cpu', 'cpu.max')) or 'max').partition(' ')
+            if quota != 'max' and period:
+                cpu_limit = int(quota) / int(period)
+            memory_limit = _read_int(self._file('memory', 'memory.max'))
+        elif self.version == 1:
+            quota = _read_int(self._file('cpu', 'cpu.cfs_quota_us'))
+            period = _read_int(self._file('cpu', 'cpu.cfs_period_us'))
+            if quota is not None and quota > 0 and period:
+                cpu_limit = quota / period
+            memory_limit = _read_int(self._file('memory', 'memory.limit_in_bytes'))
+        if memory_limit is not None and memory_limit >= _UNLIMITED:
+            memory_limit = None
+        return {
+            'cpu_limit': round(cpu_limit, 3) if cpu_limit else None,
+            'memory_limit': memory_limit
+        }
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Return cumulative CPU time, throttling counters and memory usage.
+
+        Returns:
+            dict: {'cpu_usage_seconds', 'periods', 'throttled_periods',
+                   'throttled_seconds', 'memory_usage', 'memory_working_set'}
+                  with None for anything the cgroup does not expose
+        """
+        usage = dict.fromkeys((
+            'cpu_usage_seconds', 'periods', 'throttled_periods',
+            'throttled_seconds', 'memory_usage', 'memory_working_set'
+        ))
+        if self.version is None:
+            return usage
+
+        cpu_stat = _read_stat(self._file('cpu', 'cpu.stat'))
+        usage['periods'] = cpu_stat.get('nr_periods')
+        usage['throttled_periods'] = cpu_stat.get('nr_throttled')
+        memory_stat = _read_stat(self._file('memory', 'memory.stat'))
+        if self.version == 2:
+            if 'usage_usec' in cpu_stat:
+                usage['cpu_usage_seconds'] = cpu_stat['usage_usec'] / 1e6
+            if 'throttled_usec' in cpu_stat:
+                usage['throttled_seconds'] = cpu_stat['throttled_usec'] / 1e6
+            memory = _read_int(self._file('memory', 'memory.current'))
+            inactive_file = memory_stat.get('inactive_file', 0)
+        else:
+            cpu_ns = _read_int(self._file('cpuacct', 'cpuacct.usage'))
+            if cpu_ns is not None:
+                usage['cpu_usage_seconds'] = cpu_ns / 1e9
+            if 'throttled_time' in cpu_stat:
+                usage['throttled_seconds'] = cpu_stat['throttled_time'] / 1e9
+            memory = _read_int(self._file('memory', 'memory.usage_in_bytes'))
+            inactive_file = memory_stat.get('total_inactive_file', 0)
+        if memory is not None:
+            usage['memory_usage'] = memory
+            # Same definition as the kubelet/docker stats: usage minus reclaimable page cache
+            usage['memory_working_set'] = max(0, memory - inactive_file)
+        return usage
+
+
+_cgroup = None
+
+
+def get_cgroup() -> Cgroup:
+    """Return the process-wide cgroup reader, detecting the layout on first use."""
+    global _cgroup
+    if _cgroup is None:
+        _cgroup = Cgroup()
+    return _cgroup
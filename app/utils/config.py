@@ -1,36 +1,259 @@
 """Configuration utilities for Simple Web App.
 
 This module handles loading and validation of service configuration files.
+
+The service list is held by a ServiceRegistry that parses services.json once,
+validates entries into compact Service records and indexes them by name, host
+and type. The file is re-read only when its inode, mtime or size changes, and
+the stat itself is rate-limited, so lookups never re-parse the file.
+
+Entries carry probe options such as credentials and payloads. Anything sent to
+clients goes through public_service(), which keeps only PUBLIC_OPTIONS.
 """
 import json
 import os
-from typing import Dict, List, Any
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger('utils.config')
+
+
+SERVICES_CONFIG_PATH = os.getenv('SERVICES_CONFIG_PATH', '/app/config/services.json')
+# Minimum seconds between stat() calls on the config file
+CONFIG_CHECK_INTERVAL = float(os.getenv('CONFIG_CHECK_INTERVAL', 2))
+# Probe options shown to clients; all others (password, send, ...) stay server-side
+PUBLIC_OPTIONS = ('path', 'method', 'expect_status', 'tls', 'verify_tls')
+
+
+class Service(NamedTuple):
+    """A validated service entry from services.json."""
+    name: str
+    host: str
+    port: int
+    type: str
+    interval: Optional[float] = None
+    # Any additional, protocol-specific fields from the entry
+    options: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = dict(self.options) if self.options else {}
+        data.update(name=self.name, host=self.host, port=self.port, type=self.type)
+        if self.interval is not None:
+            data['interval'] = self.interval
+        return data
+
+    def public_dict(self) -> Dict[str, Any]:
+        """Return to_dict() without the options kept from clients."""
+        return public_service(self.to_dict())
+
+
+_SERVICE_FIELDS = set(Service._fields)
+# Service fields, the status a probe adds to them, and the options clients may see
+_PUBLIC_FIELDS = (_SERVICE_FIELDS - {'options'}) | set(PUBLIC_OPTIONS) | {
+    'status', 'message', 'latency_ms', 'last_checked', 'last_change', 'probed_by'
+}
+
+
+def public_service(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a copy of a service entry (or probe result) safe to send to clients.
+
+    Example:
+        >>> public_service({'name': 'cache', 'port': 6379, 'password': 's3cret', 'status': 'online'})
+        {'name': 'cache', 'port': 6379, 'status': 'online'}
+    """
+    return {k: v for k, v in entry.items() if k in _PUBLIC_FIELDS}
+
+
+def parse_service(entry: Dict[str, Any]) -> Service:
+    """
+    Validate a raw services.json entry into a Service.
+
+    Raises:
+        ValueError: If the entry is malformed
+    """
+    if not isinstance(entry, dict):
+        raise ValueError("Service entry must be an object")
+    host = str(entry.get('host', 'localhost'))
+    try:
+        port = int(entry.get('port', 80))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid port for {host}: {entry.get('port')!r}")
+    if port < 1 or port > 65535:
+        raise ValueError(f"Port must be between 1 and 65535 for {host}")
+    interval = entry.get('interval')
+    if interval is not None:
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError(f"Interval must be positive for {host}:{port}")
+    options = {k: v for k, v in entry.items() if k not in _SERVICE_FIELDS}
+    return Service(
+        name=str(entry.get('name') or f"{host}:{port}"),
+        host=host,
+        port=port,
+        type=str(entry.get('type', 'tcp')),
+        interval=interval,
+        options=options or None
+    )
+
+
+class ServiceRegistry:
+    """
+    Indexed, hot-reloading view of services.json.
+
+    Example:
+        >>> registry = ServiceRegistry('/app/config/services.json')
+        >>> [s.name for s in registry.filter(type='tcp')]
+        ['test-redis', 'test-postgres']
+    """
+
+    def __init__(self, path: str = SERVICES_CONFIG_PATH,
+                 check_interval: float = CONFIG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.error: Optional[str] = None
+        self.invalid_entries = 0
+        self._file_key = False  # never equal to a stat key, forces first load
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._set_services([])
+
+    def _set_services(self, services: List[Service]):
+        by_name, by_host, by_type = {}, {}, {}
+        for service in services:
+            by_name[service.name] = service
+            by_host.setdefault(service.host, []).append(service)
+            by_type.setdefault(service.type, []).append(service)
+        # Swap every index in one assignment so readers see a consistent view
+        self._state = (
+            tuple(services),
+            by_name,
+            by_host,
+            by_type,
+            {'services': [s.to_dict() for s in services]},
+            {'services': [s.public_dict() for s in services]}
+        )
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload the file if it changed since the last load.
+
+        Returns:
+            bool: True if the registry contents were reloaded
+        """
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        with self._lock:
+            self._next_check = now + self.check_interval
+            key = self._stat_key()
+            if not force and key == self._file_key:
+                return False
+            self._file_key = key
+            self._load()
+            return True
+
+    def _load(self):
+        if self._file_key is None:
+            self.error = 'Config file not found'
+            self._set_services([])
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (json.JSONDecodeError, IOError, UnicodeDecodeError) as e:
+            logger.warning(f"Failed to load services config: {e}")
+            self.error = str(e)
+            self._set_services([])
+            return
+        if not isinstance(config, dict) or not isinstance(config.get('services'), list):
+            self.error = "Config must contain a 'services' list"
+            self._set_services([])
+            return
 
+        services, invalid = [], 0
+        for entry in config['services']:
+            try:
+                services.append(parse_service(entry))
+            except (ValueError, TypeError) as e:
+                invalid += 1
+                logger.warning(f"Skipping invalid service entry: {e}")
+        self.error = None
+        self.invalid_entries = invalid
+        self._set_services(services)
+        logger.info(f"Loaded {len(services)} services from {self.path}")
 
-SERVICES_CONFIG_PATH = '/app/config/services.json'
+    def services(self) -> tuple:
+        """Return all services, reloading first if the file changed."""
+        self.refresh()
+        return self._state[0]
+
+    def get(self, name: str) -> Optional[Service]:
+        """Look up a service by name."""
+        self.refresh()
+        return self._state[1].get(name)
+
+    def filter(self, type: Optional[str] = None, name: Optional[str] = None,
+               host: Optional[str] = None) -> List[Service]:
+        """Return services matching every given criterion, using the indexes."""
+        self.refresh()
+        services, by_name, by_host, by_type = self._state[:4]
+        if name is not None:
+            candidates = [by_name[name]] if name in by_name else []
+        elif host is not None:
+            candidates = by_host.get(host, [])
+        elif type is not None:
+            candidates = by_type.get(type, [])
+        else:
+            return list(services)
+        return [
+            s for s in candidates
+            if (type is None or s.type == type) and (host is None or s.host == host)
+        ]
+
+    def as_config(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the services in services.json form (shared; do not mutate)."""
+        self.refresh()
+        return self._state[4]
+
+    def public_config(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return as_config() without the options kept from clients (shared; do not mutate)."""
+        self.refresh()
+        return self._state[5]
+
+
+_registry = ServiceRegistry()
+
+
+def get_service_registry() -> ServiceRegistry:
+    """Return the process-wide service registry."""
+    return _registry
 
 
 def load_services() -> Dict[str, List[Dict[str, Any]]]:
     """
     Load services configuration from JSON file.
     
+    The file is parsed by the shared ServiceRegistry and only re-read when it
+    changes; the returned dict is shared and must be treated as read-only.
+    
     Returns:
         dict: Dictionary containing 'services' key with list of service configurations.
               Returns empty services list if file doesn't exist or is invalid.
-              
+    
     Example:
         >>> services = load_services()
         >>> print(services['services'])
         [{'name': 'redis', 'host': 'localhost', 'port': 6379, 'type': 'tcp'}]
     """
-    if os.path.exists(SERVICES_CONFIG_PATH):
-        try:
-            with open(SERVICES_CONFIG_PATH, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # Validate basic structure
-                if isinstance(config, dict) and 'services' in config:
-                    return config
-                return {"services": []}
-        except (json.JSONDecodeError, IOError, UnicodeDecodeError):
-            return {"services": []}
-    return {"services": []}
\ No newline at end of file
+    return _registry.as_config()
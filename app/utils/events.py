@@ -0,0 +1,185 @@
+"""Server-sent event fan-out for service status and system metric changes.
+
+Producers (the probe scheduler and the metrics watcher) publish events to a
+process-wide EventBus only when something changed. Each connected /api/stream
+client owns a bounded queue; a client that falls too far behind is dropped and
+its EventSource reconnects to receive a fresh snapshot.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .logging_config import get_logger
+from .system_info import get_usage_metrics
+
+logger = get_logger('utils.events')
+
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', 256))
+METRICS_SAMPLE_INTERVAL = float(os.getenv('STREAM_METRICS_INTERVAL', 2))
+# Minimum change (percentage points) before a metric update is pushed
+METRICS_DELTA = float(os.getenv('STREAM_METRICS_DELTA', 2))
+# Levels matching the dashboard's warning/error colouring; crossing one always pushes
+METRICS_THRESHOLDS = (60.0, 80.0)
+
+_CLOSED = object()
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """A single stream client's bounded event queue."""
+
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout: float) -> Optional[Tuple[str, Any]]:
+        """
+        Wait for the next event.
+
+        Returns:
+            tuple: (event, data), or None if the timeout expired or the
+                   subscription was closed by the bus (check `closed`).
+        """
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _CLOSED:
+            return None
+        return item
+
+    def close(self):
+        self.closed = True
+        # Make room for the sentinel so a blocked reader always wakes up
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.put(_CLOSED)
+
+
+class EventBus:
+    """Thread-safe publish/subscribe hub for stream events."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: str, data: Any):
+        """Deliver an event to every subscriber, dropping any that are full."""
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.put((event, data)):
+                logger.warning("Dropping slow stream subscriber")
+                self.unsubscribe(subscription)
+                subscription.close()
+
+
+def _threshold_level(value: float) -> int:
+    return sum(1 for threshold in METRICS_THRESHOLDS if value > threshold)
+
+
+class MetricsWatcher:
+    """
+    Sample usage metrics in the background and publish meaningful changes.
+
+    Sampling only happens while at least one stream client is subscribed.
+    """
+
+    def __init__(self, bus: 'EventBus', interval: float = METRICS_SAMPLE_INTERVAL,
+                 delta: float = METRICS_DELTA):
+        self._bus = bus
+        self.interval = interval
+        self.delta = delta
+        self._last: Dict[str, Any] = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> Dict[str, Any]:
+        """Latest published metrics, sampling now if nothing is cached yet."""
+        return self._last or get_usage_metrics()
+
+    def start(self):
+        """Start the sampling thread if it is not already running."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='metrics-watcher', daemon=True
+                )
+                self._thread.start()
+
+    def _changed(self, metrics: Dict[str, Any]) -> bool:
+        if not self._last:
+            return True
+        for key in ('cpu_percent', 'memory_percent', 'disk_percent'):
+            old, new = self._last.get(key), metrics.get(key)
+            if old is None or new is None:
+                if old != new:
+                    return True
+                continue
+            if abs(new - old) >= self.delta or _threshold_level(new) != _threshold_level(old):
+                return True
+        return metrics.get('uptime') != self._last.get('uptime')
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._bus.subscriber_count:
+                    self._thread = None
+                    self._last = {}
+                    return
+            try:
+                metrics = get_usage_metrics()
+                if self._changed(metrics):
+                    self._last = metrics
+                    self._bus.publish('metrics', metrics)
+            except Exception as e:
+                logger.warning(f"Failed to sample metrics: {e}")
+            time.sleep(self.interval)
+
+
+_bus = EventBus()
+_metrics_watcher = MetricsWatcher(_bus)
+
+
+def get_event_bus() -> EventBus:
+    """Return the process-wide event bus."""
+    return _bus
+
+
+def get_metrics_watcher() -> MetricsWatcher:
+    """Return the process-wide metrics watcher."""
+    return _metrics_watcher
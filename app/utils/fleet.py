@@ -0,0 +1,254 @@
+"""Fleet aggregation: one dashboard for many webapp instances.
+
+When FLEET_PEERS (a static list) or FLEET_DNS (a name resolving to one
+address per replica) is set, this instance also serves a merged view of its
+peers. Each peer's /api/instance-info and /api/services are fetched
+concurrently on the probe engine over pooled keep-alive connections, each
+peer under its own FLEET_TIMEOUT deadline.
+
+Results are cached per peer for FLEET_CACHE_TTL seconds. A request for the
+fleet view starts at most one refresh and waits for it no longer than
+FLEET_WAIT seconds; peers that have not answered by then are shown with
+their last known data marked stale, so one slow peer never stalls the page.
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .logging_config import get_logger
+from .network import ProbeEngine, get_probe_engine
+from .protocols import ProtocolError, http_request
+from .resolver import get_resolver
+
+logger = get_logger('utils.fleet')
+
+
+# Comma separated peers: host:port or http(s)://host:port
+FLEET_PEERS = os.getenv('FLEET_PEERS', '')
+# Name resolving to every replica, optionally with a port (tasks.webapp:80)
+FLEET_DNS = os.getenv('FLEET_DNS', '')
+FLEET_TIMEOUT = float(os.getenv('FLEET_TIMEOUT', 2))
+FLEET_CACHE_TTL = float(os.getenv('FLEET_CACHE_TTL', 5))
+FLEET_WAIT = float(os.getenv('FLEET_WAIT', 1))
+FLEET_MAX_RESPONSE_BYTES = int(os.getenv('FLEET_MAX_RESPONSE_BYTES', 4 * 1024 * 1024))
+
+INSTANCE_PATH = '/api/instance-info'
+SERVICES_PATH = '/api/services'
+
+
+class Peer(NamedTuple):
+    """A webapp instance to aggregate."""
+    host: str
+    port: int
+    tls: bool = False
+
+    @property
+    def url(self) -> str:
+        host = f"[{self.host}]" if ':' in self.host else self.host
+        return f"{'https' if self.tls else 'http'}://{host}:{self.port}"
+
+
+def parse_peer(spec: str) -> Peer:
+    """
+    Parse 'host', 'host:port' or 'http(s)://host[:port]' into a Peer.
+
+    Example:
+        >>> parse_peer('webapp-2:8080')
+        Peer(host='webapp-2', port=8080, tls=False)
+
+    Raises:
+        ValueError: If the port is not a number
+    """
+    spec = spec.strip().rstrip('/')
+    tls = spec.startswith('https://')
+    if '://' in spec:
+        spec = spec.split('://', 1)[1]
+    default_port = 443 if tls else 80
+    if spec.startswith('['):
+        host, _, rest = spec[1:].partition(']')
+        port = rest.lstrip(':') or default_port
+    elif spec.count(':') == 1:
+        host, port = spec.split(':')
+    else:
+        host, port = spec, default_port
+    try:
+        return Peer(host, int(port), tls)
+    except ValueError:
+        raise ValueError(f"Invalid peer: {spec}")
+
+
+class FleetAggregator:
+    """
+    Cached, deadline-bounded merged view of many webapp instances.
+
+    Peer fetches run on the probe engine loop; view() may be called from any
+    thread.
+    """
+
+    def __init__(self, peers: str = FLEET_PEERS, dns: str = FLEET_DNS,
+                 timeout: float = FLEET_TIMEOUT, ttl: float = FLEET_CACHE_TTL,
+                 wait: float = FLEET_WAIT, engine: Optional[ProbeEngine] = None):
+        self.static_peers = [parse_peer(p) for p in peers.split(',') if p.strip()]
+        self.dns = parse_peer(dns) if dns.strip() else None
+        self.timeout = timeout
+        self.ttl = ttl
+        self.wait = wait
+        self._engine = engine or get_probe_engine()
+        # peer URL -> latest entry; entries are replaced, never mutated
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._refreshed = 0.0
+        self._refreshing: Optional[concurrent.futures.Future] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any peers are configured."""
+        return bool(self.static_peers or self.dns)
+
+    async def discover(self) -> List[Peer]:
+        """Return the static peers plus one peer per address of FLEET_DNS."""
+        peers = list(self.static_peers)
+        if self.dns is not None:
+            try:
+                addresses = await get_resolver().resolve_async(self.dns.host)
+            except OSError as e:
+                logger.warning(f"Fleet peer discovery failed for {self.dns.host}: {e}")
+                addresses = []
+            # A replica with both A and AAAA records would otherwise count twice
+            family = addresses[0][0] if addresses else None
+            peers.extend(Peer(address, self.dns.port, self.dns.tls)
+                         for fam, address in addresses if fam == family)
+        return list(dict.fromkeys(peers))
+
+    async def _get_json(self, peer: Peer, path: str) -> Any:
+        response = await http_request(
+            self._engine, {'host': peer.host, 'port': peer.port}, 'GET', path,
+            tls=peer.tls, accept_gzip=True, limit=FLEET_MAX_RESPONSE_BYTES
+        )
+        if response.status != 200:
+            raise ProtocolError(f"HTTP {response.status} from {path}")
+        return json.loads(response.body)
+
+    async def _fetch(self, peer: Peer):
+        start = time.perf_counter()
+        previous = self._entries.get(peer.url, {})
+        try:
+            instance, services = await asyncio.wait_for(asyncio.gather(
+                self._get_json(peer, INSTANCE_PATH),
+                self._get_json(peer, SERVICES_PATH)
+            ), self.timeout)
+        except asyncio.TimeoutError:
+            error = f"No response within {self.timeout:g}s"
+        except (OSError, asyncio.IncompleteReadError, ProtocolError, ValueError) as e:
+            error = str(e) or type(e).__name__
+        else:
+            self._entries[peer.url] = {
+                'peer': peer.url,
+                'status': 'up',
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+                'fetched_at': time.time(),
+                'stale': False,
+                'error': None,
+                'instance': instance,
+                'services': services.get('services', [])
+            }
+            return
+        # Keep the last good data so the view degrades instead of emptying
+        self._entries[peer.url] = dict(
+            previous, peer=peer.url, status='down', latency_ms=None,
+            stale=bool(previous.get('instance')), error=error
+        )
+
+    async def _refresh(self):
+        peers = await self.discover()
+        urls = {peer.url for peer in peers}
+        for url in list(self._entries):
+            if url not in urls:
+                del self._entries[url]
+        for peer in peers:
+            self._entries.setdefault(peer.url, {
+                'peer': peer.url, 'status': 'pending', 'latency_ms': None,
+                'fetched_at': None, 'stale': False, 'error': None,
+                'instance': None, 'services': []
+            })
+        await asyncio.gather(*(self._fetch(peer) for peer in peers))
+
+    def refresh(self) -> concurrent.futures.Future:
+        """Start a refresh unless one is already running; returns its future."""
+        with self._lock:
+            if self._refreshing is None or self._refreshing.done():
+                self._refreshed = time.time()
+                self._refreshing = self._engine.submit(self._refresh())
+            return self._refreshing
+
+    def view(self, wait: Optional[float] = None, include_services: bool = True) -> Dict[str, Any]:
+        """
+        Return the merged fleet view, refreshing it first if it is stale.
+
+        Args:
+            wait: Longest time to wait for a refresh (default: FLEET_WAIT)
+            include_services: Merge per-service status across peers
+
+        Returns:
+            dict: {'peers': [...], 'summary': {...}, 'services': [...],
+                   'generated_at': float, 'refreshing': bool}
+        """
+        future = self._refreshing
+        if time.time() - self._refreshed >= self.ttl:
+            future = self.refresh()
+        if future is not None and not future.done():
+            try:
+                future.result(self.wait if wait is None else wait)
+            except concurrent.futures.TimeoutError:
+                pass
+
+        entries = sorted(self._entries.values(), key=lambda e: e['peer'])
+        summary = {'peers': len(entries)}
+        for status in ('up', 'down', 'pending'):
+            summary[status] = sum(1 for e in entries if e['status'] == status)
+        result = {
+            'peers': [{k: v for k, v in e.items() if k != 'services'} for e in entries],
+            'summary': summary,
+            'generated_at': time.time(),
+            'refreshing': future is not None and not future.done()
+        }
+        if include_services:
+            result['services'] = merge_services(entries)
+        return result
+
+
+def merge_services(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge each peer's service list into one row per service.
+
+    Returns:
+        list: [{'name', 'host', 'port', 'type', 'statuses': {peer: status},
+                'online': int, 'total': int}] sorted by name
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        for service in entry.get('services') or []:
+            name = service.get('name') or f"{service.get('host')}:{service.get('port')}"
+            row = merged.get(name)
+            if row is None:
+                row = merged[name] = {
+                    'name': name, 'host': service.get('host'), 'port': service.get('port'),
+                    'type': service.get('type'), 'statuses': {}, 'online': 0, 'total': 0
+                }
+            status = service.get('status', 'unknown')
+            row['statuses'][entry['peer']] = status
+            row['total'] += 1
+            row['online'] += status == 'online'
+    return [merged[name] for name in sorted(merged)]
+
+
+_fleet = FleetAggregator()
+
+
+def get_fleet() -> FleetAggregator:
+    """Return the process-wide fleet aggregator."""
+    return _fleet
@@ -0,0 +1,135 @@
+"""Background health checks for liveness and readiness probes.
+
+Checks register with their own interval and run on a single background
+thread. Results (status, latency and run time) are stored in memory, so the
+/health and /ready endpoints only read the latest results and their cost does
+not depend on what the checks do.
+"""
+import heapq
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger('utils.health')
+
+
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 10))
+# A result older than this many intervals is reported as stale
+HEALTH_STALE_FACTOR = float(os.getenv('HEALTH_STALE_FACTOR', 3))
+
+LIVENESS = 'liveness'
+READINESS = 'readiness'
+
+
+class HealthCheck:
+    """A named check function with its schedule and latest result."""
+
+    def __init__(self, name: str, func: Callable[[], str], interval: float,
+                 levels: Tuple[str, ...]):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.levels = levels
+        self.result: Optional[Dict[str, Any]] = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            status = self.func() or 'ok'
+        except Exception as e:
+            logger.warning(f"Health check '{self.name}' failed: {e}")
+            status = 'error'
+        self.result = {
+            'status': status,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+            'last_run': time.time()
+        }
+
+
+class HealthRegistry:
+    """
+    Registry of health checks run periodically in the background.
+
+    A check function returns 'ok', 'warning' or 'error' (returning None means
+    'ok' and raising means 'error').
+    """
+
+    def __init__(self, stale_factor: float = HEALTH_STALE_FACTOR):
+        self.stale_factor = stale_factor
+        self._checks: Dict[str, HealthCheck] = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, name: str, func: Callable[[], str],
+                 interval: float = HEALTH_CHECK_INTERVAL,
+                 levels: Tuple[str, ...] = (LIVENESS, READINESS)):
+        """Register a check to run every `interval` seconds."""
+        self._checks[name] = HealthCheck(name, func, interval, levels)
+
+    def start(self):
+        """Run every check once, then keep them running in the background."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            for check in self._checks.values():
+                check.run()
+            self._thread = threading.Thread(target=self._run, name='health-checks', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        now = time.monotonic()
+        schedule = [(now + check.interval, name) for name, check in self._checks.items()]
+        heapq.heapify(schedule)
+        while schedule:
+            due, name = heapq.heappop(schedule)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            check = self._checks.get(name)
+            if check is None:
+                continue
+            check.run()
+            heapq.heappush(schedule, (time.monotonic() + check.interval, name))
+
+    def report(self, level: str) -> Dict[str, Any]:
+        """
+        Build a health report for a probe level from the stored results.
+
+        Returns:
+            dict: {'healthy': bool, 'timestamp': float, 'checks': {name: status},
+                   'details': {name: {status, latency_ms, last_run, age_seconds, stale}}}
+        """
+        now = time.time()
+        healthy = True
+        checks = {}
+        details = {}
+        for name, check in list(self._checks.items()):
+            if level not in check.levels:
+                continue
+            result = check.result
+            if result is None:
+                status, age, stale = 'pending', None, True
+                detail = {'latency_ms': None, 'last_run': None}
+            else:
+                status = result['status']
+                age = now - result['last_run']
+                stale = age > check.interval * self.stale_factor
+                detail = dict(result)
+            if status == 'error' or stale:
+                healthy = False
+            checks[name] = status
+            detail.update(status=status, age_seconds=None if age is None else round(age, 3),
+                          stale=stale, interval=check.interval)
+            details[name] = detail
+        return {'healthy': healthy, 'timestamp': now, 'checks': checks, 'details': details}
+
+
+_registry = HealthRegistry()
+
+
+def get_health_registry() -> HealthRegistry:
+    """Return the process-wide health registry."""
+    return _registry
@@ -0,0 +1,346 @@
+"""Historical time series for system metrics and service probe results.
+
+A background sampler records CPU, memory and disk usage (and each service's
+latest probe result) at a fixed cadence into fixed-size ring buffers. Values
+live in typed array columns rather than per-sample dicts, so a day of history
+is a few flat buffers instead of millions of Python objects.
+
+When HISTORY_FILE is set, the system metric columns are backed by a memory-
+mapped file so history survives restarts, and each service's columns by a
+file in HISTORY_FILE.services/. With several worker processes only the one
+holding the file lock samples; the others read the shared mappings. Rings of
+services that are no longer configured are removed.
+"""
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Collection, Dict, List, Optional
+from urllib.parse import quote, unquote
+
+from .config import get_service_registry
+from .logging_config import get_logger
+from .probe_scheduler import get_probe_scheduler
+from .system_info import get_usage_metrics
+
+logger = get_logger('utils.history')
+
+
+HISTORY_INTERVAL = float(os.getenv('HISTORY_INTERVAL', 10))
+HISTORY_RETENTION = float(os.getenv('HISTORY_RETENTION', 86400))
+HISTORY_FILE = os.getenv('HISTORY_FILE')
+HISTORY_MAX_POINTS = 2000
+
+SYSTEM_COLUMNS = ('cpu', 'memory', 'disk')
+SERVICE_COLUMNS = ('latency_ms', 'up')
+
+_MAGIC = b'WAHIST01'
+# magic, capacity, count, head
+_HEADER = struct.Struct('<8sIII')
+_HEADER_SIZE = 32
+_NAN = float('nan')
+
+
+class RingColumns:
+    """
+    Fixed-capacity ring of rows with one float64 array per column.
+
+    The backing buffer is a bytearray, or an mmap when persisting. Row counters
+    are kept in the buffer header so a mapped file reopens where it left off.
+    """
+
+    def __init__(self, columns: List[str], capacity: int, path: Optional[str] = None):
+        self.columns = ['timestamp'] + list(columns)
+        self.capacity = capacity
+        size = _HEADER_SIZE + len(self.columns) * capacity * 8
+        self._file = None
+        if path:
+            self._file = open(path, 'a+b')
+            if os.path.getsize(path) != size:
+                self._file.truncate(size)
+            self._buffer = mmap.mmap(self._file.fileno(), size)
+        else:
+            self._buffer = bytearray(size)
+
+        magic, stored_capacity, count, head = _HEADER.unpack_from(self._buffer, 0)
+        self._count, self._head = count, head
+
+        self._view = memoryview(self._buffer)
+        self._arrays = {}
+        for i, name in enumerate(self.columns):
+            start = _HEADER_SIZE + i * capacity * 8
+            self._arrays[name] = self._view[start:start + capacity * 8].cast('d')
+        # Only a new or incompatible ring is (re)initialized; rewriting a valid
+        # header could undo a row the sampling process just appended
+        if magic != _MAGIC or stored_capacity != capacity:
+            self._count, self._head = 0, 0
+            self._write_header()
+
+    @property
+    def file(self):
+        return self._file
+
+    def _write_header(self):
+        _HEADER.pack_into(self._buffer, 0, _MAGIC, self.capacity, self._count, self._head)
+
+    def _reload_header(self):
+        if self._file is not None:
+            _, _, self._count, self._head = _HEADER.unpack_from(self._buffer, 0)
+
+    def append(self, timestamp: float, values: Dict[str, float]):
+        """Write one row, overwriting the oldest once the ring is full."""
+        row = self._head
+        for name in self.columns[1:]:
+            self._arrays[name][row] = values.get(name, _NAN)
+        # Timestamp last, so a concurrent reader never sees a half-written row as new
+        self._arrays['timestamp'][row] = timestamp
+        self._head = (row + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self._write_header()
+
+    def rows_since(self, since: float) -> List[int]:
+        """Return ring indexes of rows newer than `since`, oldest first."""
+        self._reload_header()
+        count, head, capacity = self._count, self._head, self.capacity
+        timestamps = self._arrays['timestamp']
+        indexes = [(head - count + i) % capacity for i in range(count)]
+        return [i for i in indexes if timestamps[i] > since]
+
+    def column(self, name: str):
+        return self._arrays[name]
+
+    def close(self):
+        """Release the buffer (and its file, when mapped)."""
+        for array in self._arrays.values():
+            array.release()
+        self._view.release()
+        if self._file is not None:
+            self._buffer.close()
+            self._file.close()
+
+
+def downsample(indexes: List[int], columns: Dict[str, Any], points: int) -> Dict[str, List[Optional[float]]]:
+    """Average consecutive rows into at most `points` buckets, ignoring NaN."""
+    if not indexes:
+        return {name: [] for name in columns}
+    step = max(1, math.ceil(len(indexes) / points))
+    result = {}
+    for name, column in columns.items():
+        values = []
+        for start in range(0, len(indexes), step):
+            bucket = [column[i] for i in indexes[start:start + step]]
+            bucket = [v for v in bucket if v == v]  # drop NaN
+            values.append(round(sum(bucket) / len(bucket), 3) if bucket else None)
+        result[name] = values
+    return result
+
+
+class MetricsHistory:
+    """
+    Samples system metrics and probe results into ring buffers.
+
+    Args:
+        sample_system: Returns the current system metrics
+        sample_services: Returns the latest probe result of each service, by name
+        configured_services: Returns the names of the configured services, or
+            None while the config cannot be read; other rings are removed
+    """
+
+    def __init__(self, sample_system: Callable[[], Dict[str, Any]],
+                 sample_services: Callable[[], Dict[str, Dict[str, Any]]],
+                 configured_services: Callable[[], Optional[Collection[str]]] = lambda: None,
+                 interval: float = HISTORY_INTERVAL,
+                 retention: float = HISTORY_RETENTION,
+                 path: Optional[str] = HISTORY_FILE):
+        self.interval = interval
+        self.capacity = max(1, int(retention / interval))
+        self._sample_system = sample_system
+        self._sample_services = sample_services
+        self._configured_services = configured_services
+        self._path = path
+        self._system: Optional[RingColumns] = None
+        self._services: Dict[str, RingColumns] = {}
+        # Guards _services: the sampler adds and removes rings while requests read them
+        self._services_lock = threading.Lock()
+        self._thread = None
+        self._owner = False
+        self._lock = threading.Lock()
+
+    def _open_system(self) -> RingColumns:
+        if self._system is None:
+            try:
+                self._system = RingColumns(SYSTEM_COLUMNS, self.capacity, self._path)
+            except OSError as e:
+                logger.warning(f"Cannot use history file {self._path}: {e}")
+                self._system = RingColumns(SYSTEM_COLUMNS, self.capacity)
+        return self._system
+
+    def _service_dir(self) -> Optional[str]:
+        return f"{self._path}.services" if self._path else None
+
+    def _service_names(self) -> List[str]:
+        """Services with history: the ring files on disk, or the rings in memory."""
+        directory = self._service_dir()
+        if directory is None:
+            return list(self._services)
+        try:
+            files = os.listdir(directory)
+        except OSError:
+            return []
+        return [unquote(f[:-len('.bin')]) for f in files if f.endswith('.bin')]
+
+    def _service_ring(self, name: str, create: bool = False) -> Optional[RingColumns]:
+        # Caller holds self._services_lock
+        ring = self._services.get(name)
+        if ring is not None:
+            return ring
+        directory = self._service_dir()
+        if directory is None:
+            if not create:
+                return None
+            ring = RingColumns(SERVICE_COLUMNS, self.capacity)
+        else:
+            path = os.path.join(directory, quote(name, safe='') + '.bin')
+            if not create and not os.path.exists(path):
+                return None
+            try:
+                if create:
+                    os.makedirs(directory, exist_ok=True)
+                ring = RingColumns(SERVICE_COLUMNS, self.capacity, path)
+            except OSError as e:
+                logger.warning(f"Cannot use service history file {path}: {e}")
+                if not create:
+                    return None
+                ring = RingColumns(SERVICE_COLUMNS, self.capacity)
+        self._services[name] = ring
+        return ring
+
+    def _drop_service(self, name: str, remove: bool = False):
+        # Caller holds self._services_lock
+        ring = self._services.pop(name, None)
+        if ring is not None:
+            ring.close()
+        directory = self._service_dir()
+        if remove and directory is not None:
+            try:
+                os.unlink(os.path.join(directory, quote(name, safe='') + '.bin'))
+            except OSError:
+                pass
+
+    def start(self):
+        """Start the sampler thread (a no-op if already running)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._open_system()
+            self._thread = threading.Thread(target=self._run, name='history-sampler', daemon=True)
+            self._thread.start()
+
+    def _owns_file(self) -> bool:
+        # Only one process samples into a shared file; the others keep trying
+        # so a recycled owner worker is replaced on the next interval.
+        system = self._open_system()
+        if system.file is None or self._owner:
+            return True
+        try:
+            fcntl.flock(system.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._owner = True
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._owns_file():
+                    self.sample()
+            except Exception as e:
+                logger.warning(f"Failed to record history sample: {e}")
+            time.sleep(self.interval)
+
+    def sample(self):
+        """Record one row of system metrics and probe results."""
+        now = time.time()
+        metrics = self._sample_system()
+        self._open_system().append(now, {
+            'cpu': _number(metrics.get('cpu_percent')),
+            'memory': _number(metrics.get('memory_percent')),
+            'disk': _number(metrics.get('disk_percent'))
+        })
+        services = self._sample_services()
+        configured = self._configured_services()
+        with self._services_lock:
+            # Services removed from the config take their history with them. A
+            # service without a result yet (e.g. just after a restart) keeps it.
+            if configured is not None:
+                for name in set(self._service_names()) | set(self._services):
+                    if name not in configured:
+                        self._drop_service(name, remove=True)
+            for name, result in services.items():
+                if configured is not None and name not in configured:
+                    continue
+                self._service_ring(name, create=True).append(now, {
+                    'latency_ms': _number(result.get('latency_ms')),
+                    'up': 1.0 if result.get('status') == 'online' else 0.0
+                })
+
+    def query(self, since: float = 0, points: int = 500,
+              service: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Return history newer than `since`, averaged down to at most `points` rows.
+
+        Returns:
+            dict: {'interval', 'timestamps', 'cpu', 'memory', 'disk',
+                   'services': {name: {'timestamps', 'latency_ms', 'up'}}}
+        """
+        points = max(1, min(points, HISTORY_MAX_POINTS))
+        system = self._open_system()
+        indexes = system.rows_since(since)
+        columns = {name: system.column(name) for name in system.columns}
+        result = downsample(indexes, columns, points)
+        result['timestamps'] = result.pop('timestamp')
+        result['interval'] = self.interval
+
+        services = {}
+        with self._services_lock:
+            names = self._service_names()
+            # Forget rings whose files the sampling process has removed
+            for name in list(self._services):
+                if name not in names:
+                    self._drop_service(name)
+            for name in ([service] if service else names):
+                ring = self._service_ring(name) if name in names else None
+                if ring is None:
+                    continue
+                ring_indexes = ring.rows_since(since)
+                data = downsample(ring_indexes, {c: ring.column(c) for c in ring.columns}, points)
+                data['timestamps'] = data.pop('timestamp')
+                services[name] = data
+        result['services'] = services
+        return result
+
+
+def _number(value) -> float:
+    return _NAN if value is None else float(value)
+
+
+def _configured_service_names() -> Optional[Collection[str]]:
+    registry = get_service_registry()
+    services = registry.services()
+    # An unreadable config is not an empty one: keep every ring until it loads
+    if registry.error is not None:
+        return None
+    return {service.name for service in services}
+
+
+_history = MetricsHistory(
+    get_usage_metrics, lambda: get_probe_scheduler().results(), _configured_service_names
+)
+
+
+def get_metrics_history() -> MetricsHistory:
+    """Return the process-wide metrics history."""
+    return _history
@@ -0,0 +1,127 @@
+"""HTTP compression, validators and cache headers for responses.
+
+finalize_response() is run on every response. It gives bodies a strong ETag
+derived from their content, answers matching If-None-Match requests with
+304 Not Modified, and compresses compressible bodies above
+COMPRESS_MIN_SIZE with the best encoding the client accepts (brotli when the
+optional `brotli` package is installed, otherwise gzip). Compressed bodies
+are cached by ETag, so an unchanged payload polled by many dashboards is
+compressed once.
+
+Static files are referenced through static_url(), which appends a hash of
+the file's contents; those versioned URLs can be cached by browsers for
+STATIC_MAX_AGE seconds because any change produces a new URL.
+"""
+import gzip
+import hashlib
+import os
+from typing import Optional
+
+from .cache import TTLCache
+from .logging_config import get_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger('utils.http_cache')
+
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 31536000))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+_compressed = TTLCache('compressed_responses', ttl=300, maxsize=128)
+_static_versions = {}
+
+
+def content_etag(data: bytes) -> str:
+    """Return a strong ETag value for a response body."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Pick 'br' or 'gzip' from a werkzeug Accept-Encoding header, or None."""
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str, etag: str) -> bytes:
+    """Compress a body, reusing the result for bodies with the same ETag."""
+    def encode():
+        if encoding == 'br':
+            return brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+        return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    return _compressed.get_or_compute((etag, encoding), encode)
+
+
+def static_url(static_folder: str, filename: str) -> str:
+    """
+    Return the URL of a static file with a content hash for cache busting.
+
+    Example:
+        >>> static_url(app.static_folder, 'app.js')
+        '/static/app.js?v=3f1c9a0b2d4e'
+    """
+    path = os.path.join(static_folder, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return f"/static/{filename}"
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _static_versions.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, 'rb') as f:
+            cached = _static_versions[path] = (key, content_etag(f.read())[:12])
+    return f"/static/{filename}?v={cached[1]}"
+
+
+def finalize_response(request, response):
+    """
+    Add ETag/304 handling, compression and Cache-Control to a response.
+
+    Only complete 200 responses to GET/HEAD are touched; streams (such as
+    /api/stream) and already-encoded bodies pass through unchanged.
+    """
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+            or response.mimetype == 'text/event-stream'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    is_static = request.endpoint == 'static'
+    if is_static:
+        # Read the file so it can be hashed and compressed (static files are small)
+        response.direct_passthrough = False
+    elif response.is_streamed:
+        return response
+
+    data = response.get_data()
+    etag = content_etag(data)
+    encoding = None
+    if response.mimetype and response.mimetype.startswith(COMPRESSIBLE_TYPES):
+        response.vary.add('Accept-Encoding')
+        if len(data) >= COMPRESS_MIN_SIZE:
+            encoding = choose_encoding(request.accept_encodings)
+    # Each encoding is a different representation, so it needs its own strong ETag
+    response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+
+    if is_static and request.args.get('v'):
+        response.headers['Cache-Control'] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+    else:
+        # Let browsers keep the body but revalidate it with If-None-Match
+        response.headers['Cache-Control'] = 'no-cache'
+
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    if encoding:
+        response.set_data(compress(data, encoding, etag))
+        response.headers['Content-Encoding'] = encoding
+    return response
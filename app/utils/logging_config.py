@@ -1,38 +1,124 @@
-"""Simple logging configuration for the application."""
+"""Simple logging configuration for the application.
+
+Records can be written synchronously, or (LOG_ASYNC=true, the default) pushed
+onto a bounded queue drained by a background listener thread so request
+threads never block on console or file I/O. LOG_FORMAT=json emits one compact
+JSON object per line including any `extra=` fields. Per-request start/complete
+events can be sampled with LOG_REQUEST_SAMPLE_RATE.
+"""
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+
+
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# Fraction of requests whose start/complete events are logged
+REQUEST_SAMPLE_RATE = float(os.getenv('LOG_REQUEST_SAMPLE_RATE', 1.0))
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as compact single-line JSON including extra fields."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
 
 
 def setup_logging():
     """Setup simple logging that works in dev and production."""
+    global _listener
     log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
-    
-    # Simple format for both console and file
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
+
+    # Simple format for both console and file, or JSON lines
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+
     # Create logger
     logger = logging.getLogger('webapp')
     logger.setLevel(getattr(logging, log_level))
-    
+    if logger.handlers:
+        return logger  # Already configured in this process
+
+    handlers = []
+
     # Console handler (always present)
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+    handlers.append(console_handler)
+
     # File handler (only if we can write to /var/log, for production)
     if os.path.exists('/var/log') and os.access('/var/log', os.W_OK):
         try:
             file_handler = logging.FileHandler('/var/log/webapp.log')
             file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
         except (OSError, PermissionError):
             pass  # File logging not available
-    
+
+    if os.getenv('LOG_ASYNC', 'true').lower() == 'true':
+        # Request threads only enqueue; a background listener does the I/O
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        logger.addHandler(DroppingQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(_stop_listener)
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
+
     return logger
 
 
 def get_logger(name):
     """Get a logger instance."""
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
+
+
+def sample_request_log():
+    """Decide whether to log start/complete events for the current request."""
+    rate = REQUEST_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
@@ -0,0 +1,380 @@
+"""In-process metrics with Prometheus text exposition.
+
+Counters and fixed-bucket histograms keep each label set's values in a
+preallocated array, so recording is a bucket bisect plus a few in-place adds
+under a short per-metric lock.
+
+With several worker processes (Gunicorn), set METRICS_MULTIPROC_DIR: every
+process periodically writes a snapshot of its values to <dir>/<pid>.json and
+the /metrics handler sums the snapshots of all processes before rendering.
+When a process exits, its counters and histograms are folded into
+<dir>/archive.json rather than dropped, so the summed values never go
+backwards when workers are restarted.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cache import get_cache_stats
+from .logging_config import get_logger
+
+logger = get_logger('utils.metrics')
+
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# A snapshot not rewritten for this many seconds is treated as an exited process
+METRICS_STALE_SECONDS = float(os.getenv('METRICS_STALE_SECONDS', 300))
+
+ARCHIVE_FILE = 'archive.json'
+# Metric types whose values of exited processes still count
+ARCHIVED_TYPES = ('counter', 'histogram')
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROBE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 3)
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    type = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], array] = {}
+        self._lock = threading.Lock()
+
+    def _series(self, labels: Tuple[str, ...]) -> array:
+        series = self._values.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._values.setdefault(labels, array('d', [0.0]))
+        return series
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0):
+        series = self._series(labels)
+        with self._lock:
+            series[0] += amount
+
+    def set(self, labels: Tuple[str, ...], value: float):
+        """Overwrite the value; for collectors mirroring an external counter."""
+        self._series(labels)[0] = value
+
+    def collect(self) -> List[List[Any]]:
+        return [[list(labels), list(values)] for labels, values in list(self._values.items())]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram keyed by a tuple of label values.
+
+    Each series is an array of per-bucket counts (plus an overflow bucket),
+    followed by the sum and count of observations.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...],
+                 buckets: Iterable[float]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._size = len(self.buckets) + 3
+        self._values: Dict[Tuple[str, ...], array] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._values.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._values.setdefault(labels, array('d', bytes(8 * self._size)))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> List[List[Any]]:
+        return [[list(labels), list(values)] for labels, values in list(self._values.items())]
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them in Prometheus text format."""
+
+    def __init__(self, multiproc_dir: Optional[str] = METRICS_MULTIPROC_DIR):
+        self.multiproc_dir = multiproc_dir
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._flusher = None
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...],
+                  buckets: Iterable[float]) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, func: Callable[[], None]):
+        """Register a callback run before every snapshot to refresh derived values."""
+        self._collectors.append(func)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return this process's metric values in a JSON-serializable form."""
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        families = {}
+        for name, metric in list(self._metrics.items()):
+            families[name] = {
+                'type': metric.type,
+                'help': metric.help,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'series': metric.collect()
+            }
+        return families
+
+    # Multi-process support
+
+    def start_flusher(self, interval: float = METRICS_FLUSH_INTERVAL):
+        """Periodically write this process's snapshot when multiproc_dir is set."""
+        if not self.multiproc_dir or self._flusher is not None:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.flush()
+
+        self._flusher = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._flusher.start()
+        # Final values of a cleanly exiting worker reach the archive too
+        atexit.register(self.flush)
+
+    def flush(self):
+        """Atomically write this process's snapshot to multiproc_dir."""
+        if not self.multiproc_dir:
+            return
+        path = os.path.join(self.multiproc_dir, f"{os.getpid()}.json")
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+    def _read_snapshots(self) -> List[Dict[str, Any]]:
+        snapshots = []
+        exited = []
+        now = time.time()
+        for path in glob.glob(os.path.join(self.multiproc_dir, '*.json')):
+            name = os.path.basename(path)[:-len('.json')]
+            if name == ARCHIVE_FILE[:-len('.json')]:
+                continue
+            try:
+                pid = int(name)
+            except ValueError:
+                continue
+            try:
+                if (pid != os.getpid() and not _pid_alive(pid)) \
+                        or now - os.path.getmtime(path) > METRICS_STALE_SECONDS:
+                    exited.append(path)
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        if exited:
+            self._archive(exited)
+        archive = _load(os.path.join(self.multiproc_dir, ARCHIVE_FILE))
+        if archive:
+            snapshots.append(archive)
+        return snapshots
+
+    def _archive(self, paths: List[str]):
+        """Fold exited processes' snapshots into the archive and remove them."""
+        archive_path = os.path.join(self.multiproc_dir, ARCHIVE_FILE)
+        try:
+            with open(archive_path + '.lock', 'a') as lock:
+                # Workers rendering /metrics at once must not fold a snapshot twice
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                snapshots = [_load(archive_path)]
+                folded = []
+                for path in paths:
+                    snapshot = _load(path)
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+                        folded.append(path)
+                if not folded:
+                    return
+                tmp_path = archive_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merge_snapshots(snapshots, ARCHIVED_TYPES), f, separators=(',', ':'))
+                os.replace(tmp_path, archive_path)
+                for path in folded:
+                    os.unlink(path)
+        except OSError as e:
+            logger.warning(f"Failed to archive metrics of exited processes: {e}")
+
+    def aggregate(self) -> Dict[str, Any]:
+        """Return metric values summed over every worker process."""
+        if not self.multiproc_dir:
+            return self.snapshot()
+        self.flush()
+        return merge_snapshots(self._read_snapshots())
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        families = self.aggregate()
+        _add_cache_hit_ratio(families)
+        lines = []
+        for name, family in sorted(families.items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            labelnames = family['labelnames']
+            for labels, values in family['series']:
+                pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labels)]
+                if family['type'] in ('counter', 'gauge'):
+                    lines.append(f"{name}{_labels(pairs)} {_number(values[0])}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(family['buckets'] + ['+Inf'], values[:-2]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(bound)
+                    bucket_labels = _labels(pairs + [f'le="{le}"'])
+                    lines.append(f"{name}_bucket{bucket_labels} {_number(cumulative)}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(values[-2])}")
+                lines.append(f"{name}_count{_labels(pairs)} {_number(values[-1])}")
+        return '\n'.join(lines) + '\n'
+
+
+def merge_snapshots(snapshots: Iterable[Optional[Dict[str, Any]]],
+                    types: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """Sum snapshots series by series, keeping only the given metric types."""
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, family in (snapshot or {}).items():
+            if types is not None and family['type'] not in types:
+                continue
+            target = merged.setdefault(name, dict(family, series={}))
+            for labels, values in family['series']:
+                key = tuple(labels)
+                existing = target['series'].get(key)
+                if existing is None:
+                    target['series'][key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        existing[i] += value
+    for family in merged.values():
+        family['series'] = [[list(k), v] for k, v in family['series'].items()]
+    return merged
+
+
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add_cache_hit_ratio(families: Dict[str, Any]):
+    # Ratios cannot be summed across processes, so derive them after merging
+    requests = families.get('webapp_cache_requests_total')
+    if not requests:
+        return
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), values in requests['series']:
+        hits_misses = totals.setdefault(cache, [0.0, 0.0])
+        hits_misses[0 if result == 'hit' else 1] += values[0]
+    families['webapp_cache_hit_ratio'] = {
+        'type': 'gauge',
+        'help': 'Fraction of cache lookups that were hits.',
+        'labelnames': ['cache'],
+        'buckets': [],
+        'series': [[[cache], [hits / (hits + misses) if hits + misses else 0.0]]
+                   for cache, (hits, misses) in totals.items()]
+    }
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs: List[str]) -> str:
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+_registry = MetricsRegistry()
+
+HTTP_REQUESTS = _registry.counter(
+    'webapp_http_requests_total', 'HTTP requests handled.',
+    ('endpoint', 'method', 'status')
+)
+HTTP_LATENCY = _registry.histogram(
+    'webapp_http_request_duration_seconds', 'HTTP request latency in seconds.',
+    ('endpoint', 'status'), REQUEST_BUCKETS
+)
+PROBES = _registry.counter(
+    'webapp_probe_total', 'Background service probes by result.',
+    ('service', 'status')
+)
+PROBE_LATENCY = _registry.histogram(
+    'webapp_probe_duration_seconds', 'Connect latency of successful service probes in seconds.',
+    ('service',), PROBE_BUCKETS
+)
+RATE_LIMITED = _registry.counter(
+    'webapp_rate_limited_total', 'Requests refused by the per-client rate limiter.',
+    ('endpoint',)
+)
+COALESCED = _registry.counter(
+    'webapp_coalesced_requests_total', 'Requests answered by an identical in-flight request.',
+    ('endpoint',)
+)
+
+CACHE_REQUESTS = _registry.counter(
+    'webapp_cache_requests_total', 'In-process cache lookups by result.',
+    ('cache', 'result')
+)
+
+
+def _collect_cache_stats():
+    for name, stats in get_cache_stats().items():
+        CACHE_REQUESTS.set((name, 'hit'), stats['hits'])
+        CACHE_REQUESTS.set((name, 'miss'), stats['misses'])
+
+
+_registry.add_collector(_collect_cache_stats)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
@@ -2,13 +2,38 @@
 
 This module provides utilities for validating network parameters and testing
 TCP connections to remote services.
+
+Connection tests run on an asyncio probe engine: every probe is a non-blocking
+connect on a single background event loop, so thousands of checks can be in
+flight without parking one OS thread per probe. Host names go through the
+shared caching resolver, and hosts with several addresses are connected to
+Happy Eyeballs style: attempts are staggered and the first to succeed wins. The engine can be driven from
+synchronous code (Flask routes) or from the command line:
+
+    python3 /app/probe.py 10.0.0.0/24 --ports 22,80,443 --open
 """
-import socket
-from typing import Union
+import argparse
+import asyncio
+import concurrent.futures
+import ipaddress
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from .resolver import get_resolver
 
 
 DEFAULT_TIMEOUT = 3
 
+# Global cap on concurrently open probe connections, shared by all callers
+MAX_IN_FLIGHT = int(os.getenv('PROBE_MAX_IN_FLIGHT', 512))
+BATCH_DEADLINE = float(os.getenv('CHECK_BATCH_DEADLINE', 5))
+# Seconds to wait on one address before also trying the next (RFC 8305)
+HAPPY_EYEBALLS_DELAY = float(os.getenv('HAPPY_EYEBALLS_DELAY', 0.25))
+
 
 def validate_port(port_data: Union[str, int]) -> int:
     """
@@ -38,6 +63,197 @@ def validate_port(port_data: Union[str, int]) -> int:
         raise ValueError(f"Invalid port number: {str(e)}")
 
 
+class ProbeEngine:
+    """
+    Asyncio TCP probe engine with per-probe timeouts and a global concurrency cap.
+    
+    The engine owns a daemon thread running its event loop. Coroutines can be
+    awaited directly on that loop, or submitted from any other thread with
+    run(), which blocks the caller until the result is ready.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, timeout: float = DEFAULT_TIMEOUT,
+                 resolver=None):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.resolver = resolver or get_resolver()
+        self._loop = None
+        self._semaphore = None
+        self._bulk_semaphore = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name='probe-engine', daemon=True
+                )
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the engine loop without waiting for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """
+        Run a coroutine on the engine loop and wait for its result.
+
+        Args:
+            coro: Coroutine to run
+            timeout: Overall deadline, covering time spent waiting for slots;
+                     the coroutine is cancelled on the loop when it expires
+
+        Raises:
+            asyncio.TimeoutError: If the timeout expired
+        """
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        return self.submit(coro).result()
+
+    def slots(self) -> asyncio.Semaphore:
+        """Return the semaphore bounding in-flight probes; hold it while probing."""
+        if self._semaphore is None:
+            # Created lazily so it binds to the loop actually running the probes
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def bulk_slots(self) -> asyncio.Semaphore:
+        """
+        Return the semaphore shared by bulk work such as port sweeps.
+
+        It admits half of max_in_flight, so however many sweeps run at once
+        the other half of the slots stays free for service probes. Bulk work
+        holds it around slots().
+        """
+        if self._bulk_semaphore is None:
+            self._bulk_semaphore = asyncio.Semaphore(max(1, self.max_in_flight // 2))
+        return self._bulk_semaphore
+
+    async def _connect_any(self, addresses, port: int, **kwargs):
+        """Connect to the first reachable address, staggering attempts."""
+        remaining = list(addresses)
+        pending = set()
+        error = None
+        try:
+            while remaining or pending:
+                if remaining:
+                    _, address = remaining.pop(0)
+                    pending.add(asyncio.ensure_future(
+                        asyncio.open_connection(address, port, **kwargs)
+                    ))
+                # Start the next attempt after the delay, or as soon as one fails
+                done, pending = await asyncio.wait(
+                    pending, timeout=HAPPY_EYEBALLS_DELAY if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                connected = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif connected is None:
+                        connected = task.result()
+                    else:
+                        task.result()[1].close()
+                if connected is not None:
+                    return connected
+            raise error or OSError(f"No addresses to connect to on port {port}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def connect(self, host: str, port: int, ssl=None):
+        """
+        Resolve a host through the shared resolver and open a connection.
+
+        Args:
+            ssl: Optional SSLContext to wrap the connection in TLS; the host
+                 name is used for SNI and certificate checks
+
+        Returns:
+            tuple: (StreamReader, StreamWriter)
+        """
+        addresses = await self.resolver.resolve_async(host)
+        if ssl is None:
+            return await self._connect_any(addresses, port)
+        return await self._connect_any(addresses, port, ssl=ssl, server_hostname=host)
+
+    async def probe(self, host: str, port: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Attempt a single non-blocking TCP connect.
+    
+        Returns:
+            dict: {'status': 'online' | 'offline', 'latency_ms': float or None}
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        async with self.slots():
+            start = time.perf_counter()
+            try:
+                _, writer = await asyncio.wait_for(self.connect(host, port), timeout)
+            except (asyncio.TimeoutError, OSError, ValueError, UnicodeError):
+                return {'status': 'offline', 'latency_ms': None}
+            latency_ms = (time.perf_counter() - start) * 1000
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        return {'status': 'online', 'latency_ms': round(latency_ms, 2)}
+
+    async def probe_many(self, targets: List[Dict[str, Any]],
+                         timeout: Optional[float] = None,
+                         deadline: Optional[float] = None,
+                         probe=None) -> List[Dict[str, Any]]:
+        """
+        Probe many targets concurrently, bounded by the engine's in-flight cap.
+    
+        Args:
+            targets: List of dicts with at least 'host' and a validated 'port'
+            timeout: Per-probe timeout in seconds (default: engine timeout)
+            deadline: Maximum time in seconds to wait for the whole batch
+            probe: Coroutine function probe(target, timeout) returning a result
+                   dict (default: a plain TCP connect)
+    
+        Returns:
+            list: One result per target, in input order. Each result is a copy
+                  of the target with 'status' ('online', 'offline' or 'timeout'
+                  if the deadline expired first) and 'latency_ms'.
+        """
+        if not targets:
+            return []
+        timeout = self.timeout if timeout is None else timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline)
+
+        if probe is None:
+            probe = lambda target, timeout: self.probe(target['host'], target['port'], timeout)
+        tasks = [asyncio.ensure_future(probe(t, timeout)) for t in targets]
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for target, task in zip(targets, tasks):
+            result = dict(target)
+            if task in pending:
+                result.update(status='timeout', latency_ms=None)
+            else:
+                result.update(task.result())
+            results.append(result)
+        return results
+
+
+_engine = ProbeEngine()
+
+
+def get_probe_engine() -> ProbeEngine:
+    """Return the process-wide probe engine."""
+    return _engine
+
+
 def test_tcp_connection(host: str, port: int, timeout: int = DEFAULT_TIMEOUT) -> bool:
     """
     Test TCP connection to specified host and port.
@@ -56,11 +272,96 @@ def test_tcp_connection(host: str, port: int, timeout: int = DEFAULT_TIMEOUT) ->
         >>> test_tcp_connection('unreachable.host', 443)
         False
     """
+    # The deadline also bounds the wait for a free slot, so a busy engine
+    # cannot stall the caller (e.g. the health check thread)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        result = sock.connect_ex((host, port))
-        sock.close()
-        return result == 0
-    except (socket.error, OSError):
-        return False
\ No newline at end of file
+        result = _engine.run(_engine.probe(host, port, timeout), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return result['status'] == 'online'
+
+
+def check_tcp_connections(targets: List[Dict[str, Any]],
+                          timeout: float = DEFAULT_TIMEOUT,
+                          deadline: float = BATCH_DEADLINE) -> List[Dict[str, Any]]:
+    """
+    Test many TCP connections concurrently on the shared probe engine.
+    
+    Args:
+        targets: List of dicts with at least 'host' and a validated 'port'
+        timeout: Per-connection timeout in seconds (default: 3)
+        deadline: Maximum time in seconds to wait for the whole batch
+    
+    Returns:
+        list: One result per target, in input order. Each result is a copy of
+              the target with 'status' set to 'online', 'offline' or 'timeout'
+              (the latter when the batch deadline expired first) and
+              'latency_ms'.
+    
+    Example:
+        >>> check_tcp_connections([{'host': 'localhost', 'port': 80}])
+        [{'host': 'localhost', 'port': 80, 'status': 'online', 'latency_ms': 0.21}]
+    """
+    return _engine.run(_engine.probe_many(targets, timeout, deadline))
+
+
+def _expand_hosts(spec: str) -> List[str]:
+    """Expand a host, IP address or CIDR block into a list of hosts."""
+    try:
+        network = ipaddress.ip_network(spec, strict=False)
+    except ValueError:
+        return [spec]
+    if network.num_addresses == 1:
+        return [str(network.network_address)]
+    return [str(ip) for ip in network.hosts()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point for sweeping host:port pairs."""
+    from .validation import validate_scan_targets
+
+    parser = argparse.ArgumentParser(
+        prog='probe.py',
+        description='Probe TCP connectivity to many hosts and ports concurrently.'
+    )
+    parser.add_argument('targets', nargs='+',
+                        help='host, IP, CIDR block or host:port')
+    parser.add_argument('--ports', default='80',
+                        help='comma separated ports for targets without one (default: 80)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='per-probe timeout in seconds')
+    parser.add_argument('--concurrency', type=int, default=MAX_IN_FLIGHT,
+                        help='maximum probes in flight')
+    parser.add_argument('--open', action='store_true',
+                        help='only print targets that accepted the connection')
+    args = parser.parse_args(argv)
+
+    try:
+        default_ports = [validate_port(p) for p in args.ports.split(',') if p]
+    except ValueError as e:
+        parser.error(str(e))
+
+    specs = []
+    for spec in args.targets:
+        host, sep, port = spec.rpartition(':')
+        if sep and port.isdigit() and ':' not in host:
+            specs.append((host, [validate_port(port)]))
+        else:
+            specs.append((spec, default_ports))
+
+    # A CIDR block is validated as a whole before it is expanded
+    targets = []
+    decisions = validate_scan_targets(host for host, _ in specs)
+    for (host, ports), (is_valid, error_msg) in zip(specs, decisions):
+        if not is_valid:
+            print(f"Skipping {host}: {error_msg}", file=sys.stderr)
+            continue
+        for addr in _expand_hosts(host):
+            targets.extend({'host': addr, 'port': p} for p in ports)
+
+    engine = ProbeEngine(max_in_flight=args.concurrency, timeout=args.timeout)
+    for result in asyncio.run(engine.probe_many(targets)):
+        if args.open and result['status'] != 'online':
+            continue
+        print(json.dumps(result))
+    return 0
@@ -0,0 +1,344 @@
+"""Background health probing for configured services.
+
+This module runs one probe loop per service from load_services() on the shared
+probe engine. Each loop sleeps for the service's own interval (with jitter, so
+probes do not line up), checks it with the protocol handler for its type
+(see protocols) and writes the latest status, latency, message and last-change
+time into an in-memory table. Request handlers only read that table, so probe
+load no longer depends on how many dashboards are open.
+
+When sharding is configured (see sharding), only the services this replica
+owns on the hash ring are probed here; the rest of the table is filled from
+the other replicas' results.
+
+With several worker processes, PROBE_STATE_FILE makes the probing happen in
+one of them: the process holding the file's lock runs the probe loops and
+writes the table to the file, and the other workers follow that file. A
+follower takes over the lock, with the table as last written, when the
+owner exits.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import load_services, public_service
+from .events import EventBus, get_event_bus
+from .logging_config import get_logger
+from .metrics import PROBES, PROBE_LATENCY
+from .network import ProbeEngine, get_probe_engine, validate_port
+from .protocols import probe_service
+from .sharding import SHARD_SYNC_INTERVAL, ShardMembership, get_shard_membership
+
+logger = get_logger('utils.probe_scheduler')
+
+
+PROBE_INTERVAL = float(os.getenv('PROBE_INTERVAL', 30))
+PROBE_JITTER = float(os.getenv('PROBE_JITTER', 0.1))
+CONFIG_REFRESH_INTERVAL = float(os.getenv('PROBE_CONFIG_REFRESH', 5))
+# Shared probe table for multi-process servers (unset: every process probes)
+PROBE_STATE_FILE = os.getenv('PROBE_STATE_FILE')
+# Seconds between writes (owner) or reads (followers) of the state file
+PROBE_STATE_INTERVAL = float(os.getenv('PROBE_STATE_INTERVAL', 1))
+
+
+def service_key(service: Dict[str, Any]) -> str:
+    """Return the table key for a service entry (its name, or host:port)."""
+    return service.get('name') or f"{service.get('host')}:{service.get('port')}"
+
+
+class ProbeScheduler:
+    """
+    Periodically probe configured services and keep their latest status.
+
+    Services may set an 'interval' field (seconds) in services.json to override
+    the default probe interval. Status changes are published to the event bus
+    as 'service' events, and changes to the service set as a 'services' event.
+    """
+
+    def __init__(self, engine: Optional[ProbeEngine] = None,
+                 bus: Optional[EventBus] = None,
+                 default_interval: float = PROBE_INTERVAL,
+                 jitter: float = PROBE_JITTER,
+                 config_refresh: float = CONFIG_REFRESH_INTERVAL,
+                 shard: Optional[ShardMembership] = None,
+                 shard_sync: float = SHARD_SYNC_INTERVAL,
+                 state_file: Optional[str] = PROBE_STATE_FILE,
+                 state_interval: float = PROBE_STATE_INTERVAL):
+        self._engine = engine or get_probe_engine()
+        self._bus = bus or get_event_bus()
+        self._shard = shard or get_shard_membership()
+        self.shard_sync = shard_sync
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.config_refresh = config_refresh
+        self.state_file = state_file
+        self.state_interval = state_interval
+        # Without a state file this process is the only one and always probes
+        self._owner = not state_file
+        self._lock_file = None
+        self._state_mtime = None
+        # Owned keys and shard status as last read from the owner's state file
+        self._owned: List[str] = []
+        self._shard_status: Optional[Dict[str, Any]] = None
+        # Both dicts are replaced or updated from the engine loop thread only;
+        # readers take a reference and never see a half-built entry.
+        self._services: Dict[str, Dict[str, Any]] = {}
+        self._table: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started = False
+
+    @property
+    def running(self) -> bool:
+        """Whether background probing has been started."""
+        return self._started
+
+    def start(self):
+        """Start the config sync loop on the probe engine (idempotent)."""
+        if self._started:
+            return
+        self._started = True
+        self._engine.run(self._start())
+        logger.info("Probe scheduler started")
+
+    @property
+    def owner(self) -> bool:
+        """Whether this process runs the probes (the others follow its state file)."""
+        return self._owner
+
+    async def _start(self):
+        if self.state_file:
+            self._try_lock()
+        await self._refresh()
+        if self.state_file:
+            # A new owner starts from the table its predecessor last wrote
+            await self._follow()
+        asyncio.ensure_future(self._sync_loop())
+        if self.state_file:
+            asyncio.ensure_future(self._state_loop())
+        if self._owner:
+            self._lead()
+
+    def _lead(self):
+        if self._shard.enabled:
+            self._shard.mark_live()
+            asyncio.ensure_future(self._shard_loop())
+
+    def _try_lock(self) -> bool:
+        """Take the state file lock without blocking; True once this process owns it."""
+        try:
+            if self._lock_file is None:
+                self._lock_file = open(f"{self.state_file}.lock", 'a')
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._owner = True
+        logger.info(f"Probing services in this process (pid {os.getpid()})")
+        return True
+
+    async def _state_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.state_interval)
+            try:
+                if self._owner:
+                    state = {
+                        'pid': os.getpid(),
+                        'results': dict(self._table),
+                        'owned': list(self._tasks),
+                        'shard': self._shard.status()
+                    }
+                    await loop.run_in_executor(None, self._write_state, state)
+                elif self._try_lock():
+                    # The previous owner exited; probe from here on
+                    self._lead()
+                    self._sync(list(self._services.values()))
+                else:
+                    await self._follow()
+            except Exception as e:
+                logger.warning(f"Failed to share probe state via {self.state_file}: {e}")
+
+    def _write_state(self, state: Dict[str, Any]):
+        tmp = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_file)
+
+    def _read_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            mtime = os.stat(self.state_file).st_mtime_ns
+            if mtime == self._state_mtime:
+                return None
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._state_mtime = mtime
+        return state
+
+    async def _follow(self):
+        """Merge the owner's latest table into this follower's."""
+        state = await asyncio.get_event_loop().run_in_executor(None, self._read_state)
+        if state is None:
+            return
+        self._owned = state.get('owned', [])
+        self._shard_status = state.get('shard')
+        self._merge(state.get('results', {}), lambda key: True)
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.config_refresh)
+            await self._refresh()
+
+    async def _refresh(self):
+        loop = asyncio.get_event_loop()
+        try:
+            config = await loop.run_in_executor(None, load_services)
+            self._sync(config.get('services', []))
+        except Exception as e:
+            logger.warning(f"Failed to sync probe schedule: {e}")
+
+    async def _shard_loop(self):
+        while True:
+            await asyncio.sleep(self.shard_sync)
+            live = self._shard.live()
+            await asyncio.gather(*(self._pull(peer) for peer in self._shard.remote_peers()))
+            if self._shard.live() != live:
+                logger.info(f"Shard ring changed, live replicas: {', '.join(self._shard.live())}")
+                self._sync(list(self._services.values()))
+
+    async def _pull(self, peer):
+        """Merge the results a peer probed for services this replica does not own."""
+        try:
+            results = await asyncio.wait_for(self._shard.fetch(peer), self._shard.timeout)
+        except Exception as e:
+            logger.debug(f"Failed to pull probe results from {peer.url}: {e}")
+            return
+        self._merge(results, lambda key: not self._shard.owns(key))
+
+    def _merge(self, results: Dict[str, Dict[str, Any]], accept):
+        """Adopt results probed elsewhere, publishing status changes."""
+        for key, entry in results.items():
+            if key not in self._services or not accept(key):
+                continue
+            previous = self._table.get(key)
+            self._table[key] = entry
+            if previous is None or previous.get('last_change') != entry.get('last_change'):
+                self._bus.publish('service', dict(entry, key=key))
+
+    def _sync(self, services: List[Dict[str, Any]]):
+        """Start, restart or stop probe loops to match the configured services."""
+        new_services = {}
+        for service in services:
+            if isinstance(service, dict):
+                new_services[service_key(service)] = service
+
+        for key, task in list(self._tasks.items()):
+            if new_services.get(key) != self._services.get(key) or not self._shard.owns(key):
+                task.cancel()
+                del self._tasks[key]
+        for key in list(self._table):
+            if key not in new_services:
+                del self._table[key]
+
+        for key, service in new_services.items():
+            if key in self._tasks:
+                continue
+            try:
+                port = validate_port(service.get('port', 80))
+            except ValueError as e:
+                self._table[key] = {'status': 'error', 'message': str(e),
+                                    'latency_ms': None, 'last_checked': None,
+                                    'last_change': None}
+                continue
+            if not self._owner or not self._shard.owns(key):
+                continue
+            target = dict(service, host=service.get('host', 'localhost'), port=port)
+            self._tasks[key] = asyncio.ensure_future(
+                self._probe_loop(key, target,
+                                 float(service.get('interval', self.default_interval)))
+            )
+
+        changed = new_services != self._services
+        self._services = new_services
+        if changed:
+            self._bus.publish('services', self.snapshot())
+
+    def _next_delay(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def _probe_loop(self, key: str, service: Dict[str, Any], interval: float):
+        # Stagger the first round so a large config does not probe in lockstep
+        await asyncio.sleep(random.uniform(0, min(interval, 1.0)))
+        while True:
+            result = await probe_service(service, engine=self._engine)
+            self._record(key, result)
+            await asyncio.sleep(self._next_delay(interval))
+
+    def _record(self, key: str, result: Dict[str, Any]):
+        now = time.time()
+        previous = self._table.get(key)
+        status = result['status']
+        PROBES.inc((key, status))
+        if result['latency_ms'] is not None:
+            PROBE_LATENCY.observe((key,), result['latency_ms'] / 1000)
+        if previous and previous['status'] == status:
+            last_change = previous['last_change']
+        else:
+            last_change = now
+        entry = {
+            'status': status,
+            'message': result['message'],
+            'latency_ms': result['latency_ms'],
+            'last_checked': now,
+            'last_change': last_change
+        }
+        if self._shard.enabled:
+            entry['probed_by'] = self._shard.node
+        self._table[key] = entry
+        if last_change == now:
+            self._bus.publish('service', dict(entry, key=key))
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latest probe result of every service, keyed by service key."""
+        return dict(self._table)
+
+    def owned_results(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latest results of the services this replica probes itself."""
+        owned = self._tasks if self._owner else self._owned
+        return {key: entry for key, entry in list(self._table.items()) if key in owned}
+
+    def shard_status(self) -> Dict[str, Any]:
+        """Describe the shard ring as seen by the process that probes."""
+        if self._owner or self._shard_status is None:
+            return self._shard.status()
+        return self._shard_status
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the latest probe result for a service key, if any."""
+        return self._table.get(key)
+
+    def snapshot(self, services: Optional[Iterable[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Return services (default: all scheduled) merged with their latest probe results.
+
+        Only public fields are kept, since snapshots are sent to clients.
+        """
+        table = self._table
+        pending = {'status': 'checking', 'message': 'Waiting for first probe',
+                   'latency_ms': None, 'last_checked': None, 'last_change': None}
+        if services is None:
+            services = self._services.values()
+        return [dict(public_service(service), **table.get(service_key(service), pending))
+                for service in services]
+
+
+_scheduler = ProbeScheduler()
+
+
+def get_probe_scheduler() -> ProbeScheduler:
+    """Return the process-wide probe scheduler."""
+    return _scheduler
@@ -0,0 +1,542 @@
+"""Protocol-aware service probes.
+
+A TCP connect only proves that something is listening. The handlers in this
+module speak just enough of each service's protocol to tell whether it is
+actually answering:
+
+- http / https: a HEAD (or GET) request, checked against the expected status
+- redis: PING, expecting +PONG
+- postgres: SSLRequest followed by a startup message, expecting the server to
+  ask for authentication
+- banner: optional payload sent, then the reply matched against a string
+- tcp: a plain connect (also used for unknown types)
+
+Handlers run on the shared probe engine loop. HTTP and Redis connections are
+kept open in a small per-endpoint pool and reused by the next probe, so a
+steady-state check is a single request/response round trip; a pooled
+connection the server has since closed is retried once on a new connection.
+Per-service options come from extra fields in services.json, for example:
+
+    {"name": "api", "host": "api", "port": 8080, "type": "http",
+     "path": "/health", "expect_status": [200, 204]}
+
+New protocols can be added with register_handler().
+"""
+import asyncio
+import gzip
+import os
+import re
+import ssl
+import struct
+import time
+import zlib
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .logging_config import get_logger
+from .network import BATCH_DEADLINE, DEFAULT_TIMEOUT, ProbeEngine, get_probe_engine
+
+logger = get_logger('utils.protocols')
+
+
+# Idle keep-alive connections kept per endpoint, and how long they may idle
+POOL_MAX_IDLE = int(os.getenv('PROBE_POOL_MAX_IDLE', 2))
+POOL_IDLE_TIMEOUT = float(os.getenv('PROBE_POOL_IDLE_TIMEOUT', 30))
+# Upper bound on response bytes read by a probe (HTTP bodies, error messages)
+MAX_RESPONSE_BYTES = int(os.getenv('PROBE_MAX_RESPONSE_BYTES', 65536))
+
+USER_AGENT = 'simple-webapp-probe/1.0'
+
+# Postgres protocol constants
+_PG_SSL_REQUEST = struct.pack('!ii', 8, 80877103)
+_PG_PROTOCOL_3 = 196608
+_PG_TERMINATE = b'X' + struct.pack('!i', 4)
+# SQLSTATE classes meaning the server is up but not accepting sessions
+_PG_UNAVAILABLE = ('57P01', '57P02', '57P03', '53300')
+
+# What may appear in a request line and Host header: a method is an RFC 9110
+# token, a path or host is visible ASCII (no spaces or CR/LF to inject headers)
+_HTTP_TOKEN = re.compile(r"[!#$%&'*+.^_`|~0-9A-Za-z-]+\Z")
+_HTTP_VISIBLE = re.compile(r'[\x21-\x7e]+\Z')
+
+
+class ProtocolError(Exception):
+    """The service answered, but not in the protocol expected."""
+
+
+class InvalidProbeOptions(ValueError):
+    """A service's options cannot form a valid probe request."""
+
+
+class HttpResponse(NamedTuple):
+    """Response from http_request(); body is empty for HEAD requests."""
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+Handler = Callable[[ProbeEngine, Dict[str, Any], float], Awaitable[Tuple[str, str]]]
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections keyed by (host, port, tls).
+
+    Only touched from the probe engine loop, so it needs no locking.
+    """
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple[str, int, bool], deque] = {}
+
+    def acquire(self, key: Tuple[str, int, bool]):
+        """Pop a live idle connection for the key, or return None."""
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            reader, writer, released = idle.pop()
+            if (now - released < self.idle_timeout and not writer.is_closing()
+                    and not reader.at_eof()):
+                return reader, writer
+            writer.close()
+        return None
+
+    def release(self, key: Tuple[str, int, bool], reader, writer):
+        """Return a connection for reuse, closing it if the pool is full."""
+        idle = self._idle.setdefault(key, deque())
+        if len(idle) >= self.max_idle or writer.is_closing():
+            writer.close()
+            return
+        idle.append((reader, writer, time.monotonic()))
+
+    def close(self):
+        """Close every idle connection."""
+        for idle in self._idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self._idle.clear()
+
+
+_pool = ConnectionPool()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """Return the keep-alive pool used by protocol probes."""
+    return _pool
+
+
+def _ssl_context(service: Dict[str, Any]) -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    if service.get('verify_tls') is False:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ssl.SSLError):
+        pass
+
+
+async def _pooled(engine: ProbeEngine, service: Dict[str, Any], tls: bool,
+                  exchange: Callable[..., Awaitable[Tuple[Any, bool]]]) -> Any:
+    """
+    Run an exchange on a pooled connection, retrying once if it had gone stale.
+
+    The exchange is called with (reader, writer) and returns (result, keep
+    alive); the connection goes back to the pool only if keep alive is true.
+    """
+    host, port = service['host'], service['port']
+    key = (host, port, tls)
+    conn = _pool.acquire(key)
+    while True:
+        reused = conn is not None
+        if conn is None:
+            conn = await engine.connect(host, port, ssl=_ssl_context(service) if tls else None)
+        reader, writer = conn
+        try:
+            result, keep_alive = await exchange(reader, writer)
+        except (OSError, asyncio.IncompleteReadError, ProtocolError):
+            writer.close()
+            if not reused:
+                raise
+            conn = None
+            continue
+        except BaseException:
+            # Timeouts and cancellation leave the stream mid-response
+            writer.close()
+            raise
+        if keep_alive:
+            _pool.release(key, reader, writer)
+        else:
+            await _close(writer)
+        return result
+
+
+async def _read_line(reader) -> bytes:
+    line = await reader.readline()
+    if not line.endswith(b'\n'):
+        raise asyncio.IncompleteReadError(line, None)
+    return line.rstrip(b'\r\n')
+
+
+async def _read_body(reader, headers: Dict[str, str], limit: int) -> Tuple[bytes, bool]:
+    """Read a response body; returns (body, fully read). Bodies over limit are not read."""
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        chunks, size_read = [], 0
+        while True:
+            size = int((await _read_line(reader)).split(b';')[0], 16)
+            if size_read + size > limit:
+                return b'', False
+            chunks.append(await reader.readexactly(size + 2))
+            size_read += size
+            if size == 0:
+                return b''.join(chunk[:-2] for chunk in chunks), True
+    if 'content-length' in headers:
+        length = int(headers['content-length'])
+        if length > limit:
+            return b'', False
+        return await reader.readexactly(length), True
+    # Delimited by the server closing the connection
+    return await reader.read(limit), False
+
+
+async def http_request(engine: ProbeEngine, service: Dict[str, Any], method: str = 'GET',
+                       path: str = '/', tls: bool = False, accept_gzip: bool = False,
+                       limit: int = MAX_RESPONSE_BYTES) -> HttpResponse:
+    """
+    Make an HTTP/1.1 request over a pooled keep-alive connection.
+
+    Args:
+        service: Dict with 'host', 'port' and optionally 'verify_tls'
+        method: HTTP method
+        path: Request path and query
+        tls: Use HTTPS
+        accept_gzip: Ask for a gzip-encoded body and decode it
+        limit: Largest body read; bodies over it are returned empty
+
+    Returns:
+        HttpResponse: status, lower-cased headers and body
+
+    Raises:
+        InvalidProbeOptions: If the method, path or host would not form a single request line and header
+        OSError: If the connection fails
+        ProtocolError: If the reply is not HTTP
+    """
+    host, port = service['host'], service['port']
+    method = method.upper()
+    if not _HTTP_TOKEN.match(method):
+        raise InvalidProbeOptions("Invalid HTTP method")
+    if not _HTTP_VISIBLE.match(path) or not _HTTP_VISIBLE.match(host):
+        raise InvalidProbeOptions("HTTP path and host must be visible ASCII without spaces")
+    default_port = 443 if tls else 80
+    host_header = f"[{host}]" if ':' in host and not host.startswith('[') else host
+    if port != default_port:
+        host_header = f"{host_header}:{port}"
+    request_bytes = (
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {host_header}\r\n"
+        f"User-Agent: {USER_AGENT}\r\n"
+        "Accept: */*\r\n"
+        + ("Accept-Encoding: gzip\r\n" if accept_gzip else "")
+        + "Connection: keep-alive\r\n\r\n"
+    ).encode('latin-1')
+
+    async def exchange(reader, writer) -> Tuple[HttpResponse, bool]:
+        writer.write(request_bytes)
+        await writer.drain()
+        status_line = (await _read_line(reader)).decode('latin-1')
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+            raise ProtocolError("Reply is not an HTTP status line")
+        version, code = parts[0], int(parts[1])
+        headers = {}
+        while True:
+            line = await _read_line(reader)
+            if not line:
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = 'close' not in connection and (version != 'HTTP/1.0' or 'keep-alive' in connection)
+        body = b''
+        if method != 'HEAD' and code not in (204, 304) and not 100 <= code < 200:
+            body, complete = await _read_body(reader, headers, limit)
+            keep_alive = keep_alive and complete
+            if body and headers.get('content-encoding', '').lower() == 'gzip':
+                try:
+                    body = gzip.decompress(body)
+                except (OSError, EOFError, zlib.error):
+                    raise ProtocolError("Response body is not valid gzip")
+        return HttpResponse(code, headers, body), keep_alive
+
+    return await _pooled(engine, service, tls, exchange)
+
+
+def _expected_statuses(service: Dict[str, Any]) -> Callable[[int], bool]:
+    expected = service.get('expect_status')
+    if expected is None:
+        return lambda code: 200 <= code < 400
+    if not isinstance(expected, list):
+        expected = [expected]
+    expected = {int(code) for code in expected}
+    return lambda code: code in expected
+
+
+async def check_http(engine: ProbeEngine, service: Dict[str, Any], timeout: float) -> Tuple[str, str]:
+    """
+    Send a HEAD (or 'method') request for 'path' and check the response status.
+
+    Options:
+        path: Request path (default: '/')
+        method: HTTP method (default: 'HEAD')
+        expect_status: Accepted status code or list of codes (default: 2xx/3xx)
+        tls: Use TLS (default: True for type 'https')
+        verify_tls: Set to false to accept self-signed certificates
+    """
+    method = str(service.get('method', 'HEAD')).upper()
+    path = service.get('path', '/')
+    response = await http_request(
+        engine, service, method, path,
+        tls=service.get('tls', service.get('type') == 'https')
+    )
+    status = 'online' if _expected_statuses(service)(response.status) else 'offline'
+    return status, f"HTTP {response.status} from {method} {path}"
+
+
+async def check_redis(engine: ProbeEngine, service: Dict[str, Any], timeout: float) -> Tuple[str, str]:
+    """
+    Send PING and expect +PONG.
+
+    Options:
+        password: Sent with AUTH before the PING
+        username: ACL user for AUTH (Redis 6+)
+    """
+    commands = []
+    if service.get('password'):
+        auth = [service['username'], service['password']] if service.get('username') \
+            else [service['password']]
+        commands.append(['AUTH'] + auth)
+    commands.append(['PING'])
+    payload = b''.join(
+        f"*{len(args)}\r\n".encode() + b''.join(
+            f"${len(str(a).encode())}\r\n".encode() + str(a).encode() + b'\r\n' for a in args
+        )
+        for args in commands
+    )
+
+    async def exchange(reader, writer) -> Tuple[Tuple[str, str], bool]:
+        writer.write(payload)
+        await writer.drain()
+        replies = [(await _read_line(reader)).decode('utf-8', 'replace') for _ in commands]
+        if not all(r[:1] in ('+', '-') for r in replies):
+            raise ProtocolError("Reply is not a Redis status")
+        reply = next((r for r in replies if r.startswith('-')), replies[-1])
+        if reply == '+PONG':
+            return ('online', 'Redis replied PONG'), True
+        if reply.startswith('-NOAUTH'):
+            return ('online', 'Redis is up but requires authentication'), True
+        return ('offline', f"Redis replied {reply[1:80]}"), False
+
+    return await _pooled(engine, service, False, exchange)
+
+
+def _pg_error_fields(payload: bytes) -> Dict[str, str]:
+    fields = {}
+    for field in payload.split(b'\0'):
+        if field:
+            fields[chr(field[0])] = field[1:].decode('utf-8', 'replace')
+    return fields
+
+
+async def check_postgres(engine: ProbeEngine, service: Dict[str, Any], timeout: float) -> Tuple[str, str]:
+    """
+    Open a Postgres session up to the authentication request, then hang up.
+
+    Each check is a new connection: a startup message begins a backend session,
+    which cannot be reused without completing authentication.
+
+    Options:
+        user: Role named in the startup message (default: 'postgres')
+        database: Database named in the startup message (default: user)
+    """
+    reader, writer = await engine.connect(service['host'], service['port'])
+    try:
+        writer.write(_PG_SSL_REQUEST)
+        await writer.drain()
+        answer = await reader.readexactly(1)
+        if answer == b'S':
+            # Continuing would need a TLS handshake; the server has answered
+            return 'online', 'Postgres accepted SSLRequest'
+        if answer != b'N':
+            raise ProtocolError(f"Unexpected reply to SSLRequest: {answer!r}")
+
+        user = str(service.get('user', 'postgres'))
+        database = str(service.get('database', user))
+        params = b''.join(
+            name + b'\0' + value.encode() + b'\0'
+            for name, value in ((b'user', user), (b'database', database))
+        ) + b'\0'
+        body = struct.pack('!i', _PG_PROTOCOL_3) + params
+        writer.write(struct.pack('!i', len(body) + 4) + body)
+        await writer.drain()
+
+        kind = await reader.readexactly(1)
+        length = struct.unpack('!i', await reader.readexactly(4))[0] - 4
+        if length < 0 or length > MAX_RESPONSE_BYTES:
+            raise ProtocolError(f"Unexpected Postgres message length {length}")
+        payload = await reader.readexactly(length)
+        if kind == b'R':
+            writer.write(_PG_TERMINATE)
+            return 'online', 'Postgres requested authentication'
+        if kind == b'E':
+            fields = _pg_error_fields(payload)
+            code, text = fields.get('C', ''), fields.get('M', 'unknown error')
+            status = 'offline' if code in _PG_UNAVAILABLE else 'online'
+            return status, f"Postgres replied {code}: {text}"
+        raise ProtocolError(f"Unexpected Postgres message type {kind!r}")
+    finally:
+        await _close(writer)
+
+
+async def check_banner(engine: ProbeEngine, service: Dict[str, Any], timeout: float) -> Tuple[str, str]:
+    """
+    Optionally send a payload, then read until the expected text appears.
+
+    Options:
+        send: Text sent after connecting (JSON escapes such as \\r\\n apply)
+        expect: Text the reply must contain (default: any reply)
+    """
+    reader, writer = await engine.connect(service['host'], service['port'])
+    try:
+        if service.get('send'):
+            writer.write(str(service['send']).encode())
+            await writer.drain()
+        expect = str(service['expect']).encode() if service.get('expect') else b''
+        data = b''
+        while len(data) < MAX_RESPONSE_BYTES:
+            chunk = await reader.read(MAX_RESPONSE_BYTES - len(data))
+            if not chunk:
+                break
+            data += chunk
+            if expect in data:
+                # The reply is not echoed back: it is whatever the peer sent
+                return 'online', 'Banner matched' if expect else 'Service replied'
+        if not data:
+            return 'offline', 'Connection closed without a reply'
+        return 'offline', f"Reply did not contain {service['expect']!r}"
+    finally:
+        await _close(writer)
+
+
+async def check_tcp(engine: ProbeEngine, service: Dict[str, Any], timeout: float) -> Tuple[str, str]:
+    """Open and close a TCP connection."""
+    _, writer = await engine.connect(service['host'], service['port'])
+    await _close(writer)
+    return 'online', f"Successfully connected to {service['host']}:{service['port']}"
+
+
+_handlers: Dict[str, Handler] = {
+    'tcp': check_tcp,
+    'http': check_http,
+    'https': check_http,
+    'redis': check_redis,
+    'postgres': check_postgres,
+    'banner': check_banner
+}
+
+
+def register_handler(service_type: str, handler: Handler):
+    """
+    Register a probe coroutine for a service type.
+
+    The handler is called as handler(engine, service, timeout) on the probe
+    engine loop and returns (status, message); raising OSError or
+    ProtocolError marks the service offline. Timeouts are applied by the
+    caller.
+    """
+    _handlers[service_type] = handler
+    logger.info(f"Registered probe handler for type '{service_type}'")
+
+
+def handler_types() -> List[str]:
+    """Return the service types with a registered handler."""
+    return sorted(_handlers)
+
+
+async def probe_service(service: Dict[str, Any], timeout: Optional[float] = None,
+                        engine: Optional[ProbeEngine] = None) -> Dict[str, Any]:
+    """
+    Probe a service with the handler for its 'type' (default: tcp).
+
+    Args:
+        service: Service dict with 'host', a validated 'port', 'type' and options
+        timeout: Seconds allowed for connect plus exchange (default: engine timeout)
+        engine: Probe engine to run on (default: the process-wide engine)
+
+    Returns:
+        dict: {'status': 'online' | 'offline' | 'error' (invalid options),
+               'latency_ms': float or None, 'message': str}
+    """
+    engine = engine or get_probe_engine()
+    timeout = engine.timeout if timeout is None else timeout
+    handler = _handlers.get(service.get('type') or 'tcp', check_tcp)
+    endpoint = f"{service['host']}:{service['port']}"
+
+    async with engine.slots():
+        start = time.perf_counter()
+        try:
+            status, message = await asyncio.wait_for(handler(engine, service, timeout), timeout)
+        except asyncio.TimeoutError:
+            return {'status': 'offline', 'latency_ms': None,
+                    'message': f'No response from {endpoint} within {timeout:g}s'}
+        except ProtocolError as e:
+            return {'status': 'offline', 'latency_ms': None,
+                    'message': f'Protocol error from {endpoint}: {e}'}
+        except InvalidProbeOptions as e:
+            return {'status': 'error', 'latency_ms': None,
+                    'message': f'Invalid probe options for {endpoint}: {e}'}
+        except (OSError, asyncio.IncompleteReadError, ValueError, UnicodeError):
+            return {'status': 'offline', 'latency_ms': None,
+                    'message': f'Cannot connect to {endpoint}'}
+        latency_ms = (time.perf_counter() - start) * 1000
+    return {'status': status, 'latency_ms': round(latency_ms, 2), 'message': message}
+
+
+def check_service(service: Dict[str, Any], timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """
+    Probe one service with its protocol handler from synchronous code.
+
+    Example:
+        >>> check_service({'host': 'localhost', 'port': 80, 'type': 'http'})
+        {'status': 'online', 'latency_ms': 1.42, 'message': 'HTTP 200 from HEAD /'}
+    """
+    engine = get_probe_engine()
+    try:
+        # The deadline also bounds the wait for a free slot
+        return engine.run(probe_service(service, timeout, engine), timeout)
+    except asyncio.TimeoutError:
+        return {'status': 'offline', 'latency_ms': None,
+                'message': f"No response from {service['host']}:{service['port']} within {timeout:g}s"}
+
+
+def check_services(targets: List[Dict[str, Any]], timeout: float = DEFAULT_TIMEOUT,
+                   deadline: float = BATCH_DEADLINE) -> List[Dict[str, Any]]:
+    """
+    Probe many services concurrently with their protocol handlers.
+
+    Returns:
+        list: One result per target, in input order: a copy of the target
+              with 'status', 'latency_ms' and 'message' ('timeout' status and
+              no message if the batch deadline expired first)
+    """
+    engine = get_probe_engine()
+    return engine.run(engine.probe_many(
+        targets, timeout, deadline,
+        probe=lambda target, timeout: probe_service(target, timeout, engine)
+    ))
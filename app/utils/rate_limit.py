@@ -0,0 +1,146 @@
+"""Per-client rate limiting of expensive requests.
+
+RateLimiter keeps a token bucket per (endpoint, client IP). Budgets are set
+with RATE_LIMITS as comma separated `endpoint=requests/seconds` entries, so
+`network_scan=10/60` lets each client start a burst of 10 scans and then one
+every 6 seconds. Endpoints without a budget are not limited. Buckets live in
+this process; with several Gunicorn workers each enforces its own budget.
+Identical requests are coalesced separately, by utils.singleflight.
+"""
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger('utils.rate_limit')
+
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMITS = os.getenv(
+    'RATE_LIMITS',
+    'network_scan=10/60,system_info=60/60,check_service=60/60,check_services=20/60'
+)
+# Use the X-Forwarded-For address added by the proxy as the client (only
+# behind a trusted proxy; entries to its left come from the client and can be forged)
+RATE_LIMIT_TRUST_PROXY = os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', 10000))
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse `endpoint=requests/seconds` entries into {endpoint: (burst, rate)}.
+
+    Example:
+        >>> parse_limits('network_scan=10/60')
+        {'network_scan': (10.0, 0.16666666666666666)}
+
+    Raises:
+        ValueError: If an entry is malformed or not positive
+    """
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        endpoint, _, budget = part.partition('=')
+        requests, _, seconds = budget.partition('/')
+        try:
+            burst, period = float(requests), float(seconds or 1)
+        except ValueError:
+            raise ValueError(f"Invalid rate limit: {part}")
+        if not endpoint.strip() or burst <= 0 or period <= 0:
+            raise ValueError(f"Invalid rate limit: {part}")
+        limits[endpoint.strip()] = (burst, burst / period)
+    return limits
+
+
+def client_ip(request, trust_proxy: bool = RATE_LIMIT_TRUST_PROXY) -> str:
+    """
+    Return the address a Flask request is rate limited by.
+
+    Behind a trusted proxy this is the rightmost X-Forwarded-For entry, the
+    peer the proxy itself saw; a client can prepend any addresses it likes.
+    """
+    if trust_proxy:
+        forwarded = request.headers.get('X-Forwarded-For', '').split(',')[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.remote_addr or 'unknown'
+
+
+class RateLimiter:
+    """
+    Thread-safe token buckets keyed by (endpoint, client).
+
+    Example:
+        >>> limiter = RateLimiter('check_service=2/10')
+        >>> [limiter.allow('check_service', '10.0.0.1')[0] for _ in range(3)]
+        [True, True, False]
+    """
+
+    def __init__(self, limits: str = RATE_LIMITS, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.limits = parse_limits(limits)
+        self.max_clients = max_clients
+        self.limited = 0
+        # (endpoint, client) -> (tokens, monotonic time of last update)
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, endpoint: str, client: str) -> Tuple[bool, float]:
+        """
+        Take a token from the client's bucket for an endpoint.
+
+        Returns:
+            tuple: (allowed, seconds until a token is available when refused)
+        """
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return True, 0.0
+        burst, rate = limit
+        key = (endpoint, client)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.limited += 1
+                return False, (1 - tokens) / rate
+            if key not in self._buckets and len(self._buckets) >= self.max_clients:
+                self._prune(now)
+            self._buckets[key] = (tokens - 1, now)
+            return True, 0.0
+
+    def _prune(self, now: float):
+        # Caller holds self._lock. A bucket that has refilled is the same as no bucket.
+        for key, (tokens, updated) in list(self._buckets.items()):
+            burst, rate = self.limits.get(key[0], (0.0, 1.0))
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_clients:
+            logger.warning(f"Rate limiter tracking {len(self._buckets)} clients; dropping the oldest")
+            for key in list(self._buckets)[:len(self._buckets) - self.max_clients + 1]:
+                del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return configured budgets, tracked buckets and refusals."""
+        return {
+            'enabled': RATE_LIMIT_ENABLED,
+            'limits': {name: {'burst': burst, 'per_second': round(rate, 4)}
+                       for name, (burst, rate) in self.limits.items()},
+            'clients': len(self._buckets),
+            'limited': self.limited
+        }
+
+
+def retry_after_header(seconds: float) -> str:
+    """Format a wait as a Retry-After value (whole seconds, at least 1)."""
+    return str(max(1, math.ceil(seconds)))
+
+
+_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    return _limiter
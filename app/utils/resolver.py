@@ -0,0 +1,143 @@
+"""Caching DNS resolver shared by every probe path.
+
+Names are resolved with the system resolver (getaddrinfo, so /etc/hosts and
+Docker's embedded DNS behave as usual) on a small thread pool, never on the
+probe event loop. Answers are cached for DNS_CACHE_TTL seconds and failures
+for DNS_NEGATIVE_TTL seconds; concurrent lookups of the same name share one
+getaddrinfo call. IP literals bypass the cache entirely.
+
+getaddrinfo does not expose record TTLs, so cache lifetimes are set here;
+keep DNS_CACHE_TTL at or below the TTL of the records you probe.
+"""
+import asyncio
+import ipaddress
+import os
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from .cache import TTLCache
+from .logging_config import get_logger
+from .singleflight import SingleFlight
+
+logger = get_logger('utils.resolver')
+
+
+DNS_CACHE_TTL = float(os.getenv('DNS_CACHE_TTL', 30))
+DNS_NEGATIVE_TTL = float(os.getenv('DNS_NEGATIVE_TTL', 5))
+DNS_CACHE_SIZE = int(os.getenv('DNS_CACHE_SIZE', 1024))
+DNS_WORKERS = int(os.getenv('DNS_WORKERS', 8))
+
+_MISSING = object()
+
+# (family, address) pairs, in connection preference order
+Addresses = List[Tuple[int, str]]
+
+
+def interleave_families(addresses: Addresses) -> Addresses:
+    """
+    Reorder addresses to alternate between families, keeping the first first.
+
+    This is the ordering Happy Eyeballs (RFC 8305) uses for its staggered
+    connection attempts, so a broken IPv6 path costs one attempt, not many.
+    """
+    if not addresses:
+        return []
+    first_family = addresses[0][0]
+    preferred = [a for a in addresses if a[0] == first_family]
+    others = [a for a in addresses if a[0] != first_family]
+    result = []
+    for i in range(max(len(preferred), len(others))):
+        result.extend(group[i] for group in (preferred, others) if i < len(group))
+    return result
+
+
+class Resolver:
+    """
+    Thread-pool DNS resolver with positive/negative caching and single-flight.
+
+    Example:
+        >>> resolver = Resolver()
+        >>> resolver.resolve('localhost')
+        [(10, '::1'), (2, '127.0.0.1')]
+    """
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL, negative_ttl: float = DNS_NEGATIVE_TTL,
+                 maxsize: int = DNS_CACHE_SIZE, workers: int = DNS_WORKERS):
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache('dns', ttl=ttl, maxsize=maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dns')
+        # Concurrent lookups of a name share one executor job
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _literal(host: str) -> Optional[Addresses]:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return None
+        family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+        return [(family, host)]
+
+    def _cached(self, host: str):
+        addresses = self._literal(host)
+        if addresses is not None:
+            return addresses
+        cached = self._cache.get(host, _MISSING)
+        if isinstance(cached, socket.gaierror):
+            raise cached
+        return cached
+
+    def _lookup(self, host: str) -> Addresses:
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            self._cache.set(host, e, ttl=self.negative_ttl)
+            raise
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            entry = (family, sockaddr[0])
+            if entry not in addresses:
+                addresses.append(entry)
+        addresses = interleave_families(addresses)
+        self._cache.set(host, addresses)
+        return addresses
+
+    def _lookup_future(self, host: str) -> Future:
+        return self._flight.submit(host, lambda: self._executor.submit(self._lookup, host))
+
+    def resolve(self, host: str, timeout: Optional[float] = None) -> Addresses:
+        """
+        Resolve a host name to its addresses, blocking the caller.
+
+        Raises:
+            socket.gaierror: If the name does not resolve (also when cached)
+        """
+        cached = self._cached(host)
+        if cached is not _MISSING:
+            return cached
+        return self._lookup_future(host).result(timeout)
+
+    async def resolve_async(self, host: str) -> Addresses:
+        """Resolve a host name without blocking the running event loop."""
+        cached = self._cached(host)
+        if cached is not _MISSING:
+            return cached
+        # The lookup is shared by every coalesced caller: shield it so one
+        # caller's timeout does not cancel the lookup the others are awaiting
+        return await asyncio.shield(asyncio.wrap_future(self._lookup_future(host)))
+
+    def invalidate(self, host: Optional[str] = None):
+        """Forget one cached name, or all of them."""
+        if host is None:
+            self._cache.invalidate()
+        else:
+            self._cache.invalidate(host)
+
+
+_resolver = Resolver()
+
+
+def get_resolver() -> Resolver:
+    """Return the process-wide DNS resolver."""
+    return _resolver
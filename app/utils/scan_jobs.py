@@ -0,0 +1,513 @@
+"""Background job queue for network scans.
+
+Scans run on a small bounded worker pool instead of in the request thread.
+Submitting a scan returns a job immediately; its output is captured line by
+line so clients can poll for progress. A scan requested while an identical
+one is queued or running joins the existing job instead of starting another.
+
+Two scanners are available: nmap, whose machine-readable XML is parsed into
+structured host and port records, and the built-in port sweep (see
+port_sweep), which needs no external binary and streams open ports into the
+job output as they are found. SCAN_ENGINE picks the default; 'auto' uses nmap
+when it is installed. Completed jobs are cached per target, scanner and port
+set for SCAN_CACHE_TTL seconds, so repeat scans return immediately unless the
+caller asks for a refresh.
+
+Job state is kept in SQLite (SCAN_JOB_DB) rather than in process memory, so
+with several server workers any of them can answer for any job.
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional
+
+from .logging_config import get_logger
+from .network import get_probe_engine
+from .port_sweep import PortSweep, format_ports, plan_sweep
+
+logger = get_logger('utils.scan_jobs')
+
+
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 2))
+SCAN_MAX_PENDING = int(os.getenv('SCAN_MAX_PENDING', 16))
+SCAN_TIMEOUT = float(os.getenv('SCAN_TIMEOUT', 30))
+# Finished jobs are kept this many seconds for clients to collect results
+SCAN_JOB_RETENTION = float(os.getenv('SCAN_JOB_RETENTION', 600))
+SCAN_CACHE_TTL = float(os.getenv('SCAN_CACHE_TTL', 300))
+# Job database shared by the server's worker processes (default: this process only)
+SCAN_JOB_DB = os.getenv('SCAN_JOB_DB') or ':memory:'
+# Seconds between writes of a running sweep's newly found ports
+OUTPUT_FLUSH_INTERVAL = 0.25
+# 'nmap', 'sweep' (built-in) or 'auto' (nmap if installed)
+SCAN_ENGINE = os.getenv('SCAN_ENGINE', 'auto')
+
+NMAP = 'nmap'
+SWEEP = 'sweep'
+SCANNERS = (NMAP, SWEEP)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+TIMED_OUT = 'timeout'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class QueueFullError(Exception):
+    """Raised when too many scans are already queued or running."""
+
+
+def default_scanner() -> str:
+    """Return the scanner used when a request does not name one."""
+    if SCAN_ENGINE in SCANNERS:
+        return SCAN_ENGINE
+    return NMAP if shutil.which('nmap') else SWEEP
+
+
+def _nmap_family_flags(target: str) -> List[str]:
+    """
+    Return ['-6'] for IPv6 targets and [] for IPv4 targets and hostnames.
+
+    Raises:
+        ValueError: If the targets mix IPv6 with IPv4 or hostnames, which
+            one nmap run cannot scan
+    """
+    ipv6 = [':' in t for t in target.split()]
+    if any(ipv6) and not all(ipv6):
+        raise ValueError("nmap scans one address family per run; "
+                         "submit IPv4 and IPv6 targets as separate scans")
+    return ['-6'] if any(ipv6) else []
+
+
+def build_scan_command(target: str, xml_path: Optional[str] = None,
+                       ports: Optional[str] = None) -> List[str]:
+    """
+    Build the nmap command line for validated, space separated targets.
+
+    Raises:
+        ValueError: If the targets mix address families
+    """
+    cmd = ['nmap', '-sT', '--host-timeout', '10s']
+    cmd += ['-p', ports] if ports and ports != 'top100' else ['-F']
+    cmd += _nmap_family_flags(target)
+    if xml_path:
+        cmd += ['-oX', xml_path]
+    return cmd + target.split()
+
+
+def parse_nmap_xml(xml_text: str) -> List[Dict[str, Any]]:
+    """
+    Parse nmap XML output into host records.
+
+    Returns:
+        list: [{'address': str, 'hostnames': [str], 'state': str,
+                'ports': [{'port': int, 'protocol': str, 'state': str,
+                           'service': str or None}]}]
+
+    Raises:
+        ValueError: If the XML cannot be parsed
+    """
+    try:
+        root = ET.fromstring(xml_text)
+    except ET.ParseError as e:
+        raise ValueError(f"Invalid nmap XML output: {e}")
+
+    hosts = []
+    for host in root.iter('host'):
+        status = host.find('status')
+        address = host.find('address')
+        ports = []
+        for port in host.iter('port'):
+            state = port.find('state')
+            service = port.find('service')
+            ports.append({
+                'port': int(port.get('portid')),
+                'protocol': port.get('protocol'),
+                'state': state.get('state') if state is not None else None,
+                'service': service.get('name') if service is not None else None
+            })
+        hosts.append({
+            'address': address.get('addr') if address is not None else None,
+            'hostnames': [h.get('name') for h in host.iter('hostname')],
+            'state': status.get('state') if status is not None else None,
+            'ports': ports
+        })
+    return hosts
+
+
+class ScanJob:
+    """State of a single scan, as stored in the job database."""
+
+    def __init__(self, target: str, scanner: str = NMAP, ports: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.target = target
+        self.scanner = scanner
+        self.ports = ports
+        self.status = QUEUED
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.return_code: Optional[int] = None
+        self.error: Optional[str] = None
+        self.results: Optional[List[Dict[str, Any]]] = None
+        # Output lines written so far and lines waiting to be written (only
+        # tracked by the process running the job)
+        self.lines = 0
+        self.pending: List[str] = []
+        self._manager: Optional['ScanJobManager'] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row, manager: 'ScanJobManager') -> 'ScanJob':
+        job = cls(row['target'], row['scanner'], row['ports'])
+        for name in ('id', 'status', 'created', 'started', 'finished', 'return_code', 'error'):
+            setattr(job, name, row[name])
+        job.results = json.loads(row['results']) if row['results'] else None
+        job._manager = manager
+        return job
+
+    @property
+    def key(self):
+        """Identity used to coalesce and cache identical scans."""
+        return (self.target, self.scanner, self.ports)
+
+    def to_dict(self, offset: int = 0, include_output: bool = True) -> Dict[str, Any]:
+        """Serialize the job, including output lines from `offset` onwards."""
+        lines = self._manager.output(self.id, offset) if include_output and self._manager else []
+        return {
+            'job_id': self.id,
+            'target': self.target,
+            'scanner': self.scanner,
+            'ports': self.ports,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'return_code': self.return_code,
+            'error': self.error,
+            'results': self.results,
+            'output': lines,
+            'next_offset': offset + len(lines)
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    scanner TEXT NOT NULL,
+    ports TEXT,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    return_code INTEGER,
+    error TEXT,
+    results TEXT,
+    pid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (target, scanner, ports, status);
+CREATE TABLE IF NOT EXISTS output (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ScanJobManager:
+    """
+    Bounded worker pool for scans with de-duplication of in-flight targets.
+
+    Jobs, their output and cached results live in a SQLite database. With
+    SCAN_JOB_DB pointing at a file, every worker process of a server shares
+    it: a scan started by one worker can be polled, joined or reused from
+    any other. A job whose worker exits before it finishes is marked failed.
+    """
+
+    def __init__(self, workers: int = SCAN_WORKERS, max_pending: int = SCAN_MAX_PENDING,
+                 timeout: float = SCAN_TIMEOUT, retention: float = SCAN_JOB_RETENTION,
+                 cache_ttl: float = SCAN_CACHE_TTL, path: str = SCAN_JOB_DB):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retention = retention
+        self.cache_ttl = cache_ttl
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan')
+        # One connection per process, used under self._lock; SQLite locks the
+        # file between processes
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ':memory:':
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.executescript(_SCHEMA)
+
+    def submit(self, target: str, refresh: bool = False, scanner: Optional[str] = None,
+               ports: Optional[str] = None):
+        """
+        Queue a scan of a validated target, or reuse an existing job.
+
+        Args:
+            target: Validated scan target, or several separated by spaces
+            refresh: Ignore any cached result and scan again
+            scanner: 'nmap' or 'sweep' (default: default_scanner())
+            ports: Port set name ('top100') or list such as '22,80,8000-8100'
+
+        Returns:
+            tuple: (job, source) where source is 'new', 'coalesced' (an
+                   identical scan is already in flight) or 'cached' (a recent
+                   completed scan of the target)
+
+        Raises:
+            QueueFullError: If max_pending scans are already queued or running
+            ValueError: If the scanner, port set or scan size is invalid, or
+                nmap targets mix address families
+        """
+        scanner = scanner or default_scanner()
+        if scanner not in SCANNERS:
+            raise ValueError(f"Unknown scanner: {scanner}")
+        # Bounded for nmap as well, and canonical so '80,22' and '22,80' share a job
+        ports = format_ports(plan_sweep(target.split(), ports))
+        if scanner == NMAP:
+            _nmap_family_flags(target)
+        key = (target, scanner, ports)
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two workers cannot
+            # both decide to start the same scan
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._reap()
+                self._prune(now)
+                found = self._find(key, (COMPLETED,), now - self.cache_ttl) if not refresh else None
+                source = 'cached'
+                if found is None:
+                    found = self._find(key, ACTIVE_STATES)
+                    source = 'coalesced'
+                if found is None:
+                    active = self._db.execute(
+                        'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', ACTIVE_STATES
+                    ).fetchone()[0]
+                    if active >= self.max_pending:
+                        raise QueueFullError(f"Too many scans in progress (limit {self.max_pending})")
+                    job = ScanJob(target, scanner, ports)
+                    job._manager = self
+                    self._db.execute(
+                        'INSERT INTO jobs (id, target, scanner, ports, status, created, pid) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (job.id, target, scanner, ports, job.status, job.created, os.getpid())
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        if found is not None:
+            return ScanJob.from_row(found, self), source
+        self._executor.submit(self._run, job)
+        return job, 'new'
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        """Look up a job by ID."""
+        with self._lock:
+            self._reap()
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return ScanJob.from_row(row, self) if row is not None else None
+
+    def output(self, job_id: str, offset: int = 0) -> List[str]:
+        """Return a job's output lines from `offset` onwards."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT line FROM output WHERE job_id = ? AND seq >= ? ORDER BY seq',
+                (job_id, offset)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _find(self, key, states, finished_after: Optional[float] = None) -> Optional[sqlite3.Row]:
+        # Caller holds self._lock
+        query = ('SELECT * FROM jobs WHERE target = ? AND scanner = ? AND ports IS ? '
+                 f"AND status IN ({', '.join('?' * len(states))})")
+        params = list(key) + list(states)
+        if finished_after is not None:
+            query += ' AND finished >= ?'
+            params.append(finished_after)
+        return self._db.execute(query + ' ORDER BY created DESC LIMIT 1', params).fetchone()
+
+    def _reap(self):
+        # Caller holds self._lock. Fail jobs left behind by a worker that exited.
+        rows = self._db.execute(
+            'SELECT id, pid FROM jobs WHERE status IN (?, ?)', ACTIVE_STATES
+        ).fetchall()
+        for row in rows:
+            if row['pid'] != os.getpid() and not _pid_alive(row['pid']):
+                self._db.execute(
+                    'UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?',
+                    (FAILED, 'Scan worker exited before the scan finished', time.time(), row['id'])
+                )
+
+    def _prune(self, now: float):
+        # Caller holds self._lock. Jobs that can still be served from the
+        # cache are kept, so a cached response never names a pruned job.
+        cutoff = now - max(self.retention, self.cache_ttl)
+        self._db.execute('DELETE FROM output WHERE job_id IN '
+                         '(SELECT id FROM jobs WHERE finished < ?)', (cutoff,))
+        self._db.execute('DELETE FROM jobs WHERE finished < ?', (cutoff,))
+
+    def _save(self, job: ScanJob):
+        """Write a job's status fields to the database."""
+        results = json.dumps(job.results) if job.results is not None else None
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, started = ?, finished = ?, return_code = ?, '
+                'error = ?, results = ? WHERE id = ?',
+                (job.status, job.started, job.finished, job.return_code, job.error,
+                 results, job.id)
+            )
+
+    def _append(self, job: ScanJob, line: str):
+        """Add an output line to a running job."""
+        job.pending.append(line)
+        self._flush(job)
+
+    def _flush(self, job: ScanJob):
+        """Write a running job's pending output lines."""
+        lines = job.pending[:]
+        if not lines:
+            return
+        del job.pending[:len(lines)]
+        with self._lock:
+            self._db.executemany(
+                'INSERT INTO output (job_id, seq, line) VALUES (?, ?, ?)',
+                [(job.id, job.lines + i, line) for i, line in enumerate(lines)]
+            )
+        job.lines += len(lines)
+
+    def _run(self, job: ScanJob):
+        job.status = RUNNING
+        job.started = time.time()
+        self._save(job)
+        logger.info("Starting network scan", extra={
+            'job_id': job.id, 'target': job.target, 'scanner': job.scanner
+        })
+        try:
+            if job.scanner == SWEEP:
+                self._execute_sweep(job)
+            else:
+                self._execute(job)
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            logger.error("Network scan failed",
+                         extra={'job_id': job.id, 'target': job.target, 'error': str(e)})
+        finally:
+            job.finished = time.time()
+            self._save(job)
+            logger.info("Network scan finished", extra={
+                'job_id': job.id, 'target': job.target,
+                'status': job.status, 'return_code': job.return_code
+            })
+
+    def _execute(self, job: ScanJob):
+        fd, xml_path = tempfile.mkstemp(prefix='scan-', suffix='.xml')
+        os.close(fd)
+        try:
+            process = subprocess.Popen(
+                build_scan_command(job.target, xml_path, job.ports),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            timer = threading.Timer(self.timeout, process.kill)
+            timer.start()
+            try:
+                for line in process.stdout:
+                    self._append(job, line.rstrip('\n'))
+                stderr = process.stderr.read()
+                job.return_code = process.wait()
+            finally:
+                timed_out = not timer.is_alive()
+                timer.cancel()
+
+            if timed_out:
+                job.status = TIMED_OUT
+                job.error = 'Network scan timed out'
+                return
+
+            job.error = stderr or None
+            if job.return_code != 0:
+                job.status = FAILED
+                return
+            with open(xml_path, 'r', encoding='utf-8') as f:
+                job.results = parse_nmap_xml(f.read())
+            job.status = COMPLETED
+        finally:
+            os.unlink(xml_path)
+
+    def _execute_sweep(self, job: ScanJob):
+        ports = plan_sweep(job.target.split(), job.ports)
+        start = time.time()
+
+        def report(address: str, port: Dict[str, Any]):
+            # Runs on the probe engine loop, which must not wait on the
+            # database; this thread writes the lines out
+            service = f" ({port['service']})" if port['service'] else ''
+            job.pending.append(
+                f"Discovered open port {port['port']}/tcp on {address}{service} "
+                f"{port['latency_ms']:.2f}ms"
+            )
+
+        sweep = PortSweep(job.target.split(), ports, on_result=report)
+        self._append(job, f"Starting port sweep of {job.target} ({len(ports)} ports)")
+
+        async def run():
+            # Bounded on the loop itself, so a timed-out sweep stops probing
+            return await asyncio.wait_for(sweep.run(), self.timeout)
+
+        future = get_probe_engine().submit(run())
+        try:
+            while not future.done():
+                concurrent.futures.wait([future], timeout=OUTPUT_FLUSH_INTERVAL)
+                self._flush(job)
+            job.results = future.result()
+        except asyncio.TimeoutError:
+            job.results = sweep.results()
+            job.status = TIMED_OUT
+            job.error = 'Network scan timed out'
+            return
+        finally:
+            self._append(
+                job,
+                f"Swept {len(sweep.hosts)} live host(s) with {sweep.probes} connects "
+                f"in {time.time() - start:.2f}s"
+            )
+        job.return_code = 0
+        job.status = COMPLETED
+
+
+_manager = ScanJobManager()
+
+
+def get_scan_manager() -> ScanJobManager:
+    """Return the process-wide scan job manager."""
+    return _manager
@@ -0,0 +1,161 @@
+"""Consistent-hash sharding of service probes across replicas.
+
+With SHARD_PEERS listing every replica and SHARD_SELF naming this one, each
+replica probes only the services that hash to it on a consistent-hash ring
+(SHARD_VNODES virtual nodes per replica), so the probe load on a backend
+stays the same however many replicas run. Replicas pull each other's
+results every SHARD_SYNC_INTERVAL seconds over pooled keep-alive
+connections, so any replica can answer for the whole service set.
+
+A peer that has not answered for SHARD_PEER_TIMEOUT seconds drops off the
+ring and its services move to the remaining replicas until it is back.
+Adding or removing a replica only moves the services on its arcs.
+"""
+import bisect
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .fleet import Peer, parse_peer
+from .logging_config import get_logger
+from .network import ProbeEngine, get_probe_engine
+from .protocols import ProtocolError, http_request
+
+logger = get_logger('utils.sharding')
+
+
+# Comma separated replicas (host:port or URLs), including this one
+SHARD_PEERS = os.getenv('SHARD_PEERS', '')
+# This replica's entry in SHARD_PEERS
+SHARD_SELF = os.getenv('SHARD_SELF', '')
+SHARD_VNODES = int(os.getenv('SHARD_VNODES', 100))
+SHARD_SYNC_INTERVAL = float(os.getenv('SHARD_SYNC_INTERVAL', 5))
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', 2))
+SHARD_PEER_TIMEOUT = float(os.getenv('SHARD_PEER_TIMEOUT', 15))
+SHARD_MAX_RESPONSE_BYTES = int(os.getenv('SHARD_MAX_RESPONSE_BYTES', 16 * 1024 * 1024))
+
+RESULTS_PATH = '/api/shard/results'
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping keys to nodes.
+
+    Example:
+        >>> ring = HashRing(['http://a:80', 'http://b:80'])
+        >>> ring.owner('test-redis')
+        'http://b:80'
+    """
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = SHARD_VNODES):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Return the node owning a key (the first point clockwise of its hash)."""
+        if not self._nodes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class ShardMembership:
+    """
+    Replica list, peer liveness and the ring built from the live replicas.
+
+    Sharding is disabled (every service is owned locally) unless SHARD_SELF
+    is one of at least two SHARD_PEERS.
+    """
+
+    def __init__(self, peers: str = SHARD_PEERS, self_peer: str = SHARD_SELF,
+                 vnodes: int = SHARD_VNODES, peer_timeout: float = SHARD_PEER_TIMEOUT,
+                 timeout: float = SHARD_TIMEOUT, engine: Optional[ProbeEngine] = None):
+        self.peers: List[Peer] = list(dict.fromkeys(
+            parse_peer(p) for p in peers.split(',') if p.strip()
+        ))
+        self.self_peer = parse_peer(self_peer) if self_peer.strip() else None
+        self.vnodes = vnodes
+        self.peer_timeout = peer_timeout
+        self.timeout = timeout
+        self._engine = engine or get_probe_engine()
+        self.enabled = self.self_peer in self.peers and len(self.peers) > 1
+        if self.peers and not self.enabled:
+            logger.warning("Sharding disabled: SHARD_SELF must be one of at least two SHARD_PEERS")
+        self._last_seen: Dict[str, float] = {}
+        self.mark_live()
+        self._ring: Tuple[Tuple[str, ...], Optional[HashRing]] = ((), None)
+
+    def mark_live(self):
+        """Treat every peer as just seen, so replicas starting together do not all probe everything."""
+        now = time.monotonic()
+        self._last_seen = {peer.url: now for peer in self.peers}
+
+    @property
+    def node(self) -> Optional[str]:
+        """This replica's node ID, or None when sharding is disabled."""
+        return self.self_peer.url if self.enabled else None
+
+    def remote_peers(self) -> List[Peer]:
+        return [peer for peer in self.peers if peer != self.self_peer]
+
+    def live(self) -> Tuple[str, ...]:
+        """Node IDs currently on the ring."""
+        now = time.monotonic()
+        return tuple(
+            peer.url for peer in self.peers
+            if peer == self.self_peer or now - self._last_seen[peer.url] < self.peer_timeout
+        )
+
+    def owner(self, key: str) -> Optional[str]:
+        """Return the live node responsible for probing a service key."""
+        if not self.enabled:
+            return None
+        live = self.live()
+        if self._ring[0] != live:
+            self._ring = (live, HashRing(live, self.vnodes))
+        return self._ring[1].owner(key)
+
+    def owns(self, key: str) -> bool:
+        """Whether this replica should probe a service key."""
+        return not self.enabled or self.owner(key) == self.self_peer.url
+
+    async def fetch(self, peer: Peer) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch the results a peer probed itself, marking it live on success.
+
+        Raises:
+            OSError, ProtocolError, ValueError: If the peer cannot be read
+        """
+        response = await http_request(
+            self._engine, {'host': peer.host, 'port': peer.port}, 'GET', RESULTS_PATH,
+            tls=peer.tls, accept_gzip=True, limit=SHARD_MAX_RESPONSE_BYTES
+        )
+        if response.status != 200:
+            raise ProtocolError(f"HTTP {response.status} from {RESULTS_PATH}")
+        results = json.loads(response.body).get('results', {})
+        self._last_seen[peer.url] = time.monotonic()
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the ring for diagnostics."""
+        return {
+            'enabled': self.enabled,
+            'node': self.node,
+            'peers': [peer.url for peer in self.peers],
+            'live': list(self.live()) if self.enabled else []
+        }
+
+
+_membership = ShardMembership()
+
+
+def get_shard_membership() -> ShardMembership:
+    """Return the process-wide shard membership."""
+    return _membership
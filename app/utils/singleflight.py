@@ -0,0 +1,105 @@
+"""Single-flight coalescing of concurrent identical calls.
+
+SingleFlight runs one call per key at a time: callers arriving while an
+identical call is in flight wait for it and share its result (or exception)
+instead of starting their own, so a refresh stampede during an incident costs
+one probe rather than hundreds. Calls are tracked as concurrent futures, so
+blocking callers use do() while event loop code awaits the future returned
+by submit().
+
+It is used for identical API requests, cache misses and DNS lookups.
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one execution.
+
+    Example:
+        >>> flight = SingleFlight()
+        >>> flight.do(('check_service', 'redis:6379'), lambda: 'online')
+        ('online', False)
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn in this thread unless a call with the same key is in flight, then share its outcome.
+
+        Returns:
+            tuple: (result, whether it came from another caller's execution)
+
+        Raises:
+            Exception: Whatever fn raised, in the caller and every waiter
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            value = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            self._forget(key, future)
+        return value, False
+
+    def submit(self, key: Hashable, start: Callable[[], Future]) -> Future:
+        """
+        Return the future of the call in flight for key, or of a new one from start().
+
+        start() runs under the lock and must only schedule the work, e.g.
+        executor.submit(...). Callers awaiting the shared future from an event
+        loop should shield it, so one caller's cancellation does not cancel
+        the call for everyone.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future
+            future = self._calls[key] = start()
+            self.executions += 1
+        # Outside the lock: a call that already finished runs the callback here
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return executions, coalesced callers and calls in flight."""
+        return {
+            'executions': self.executions,
+            'shared': self.shared,
+            'in_flight': len(self._calls)
+        }
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide coalescer for API requests."""
+    return _single_flight
@@ -1,16 +1,209 @@
-"""System information utilities."""
+"""System information utilities.
+
+Besides the dashboard summaries, collect_system_report() gathers the details
+formerly produced by scripts/system-info.sh (interfaces, listening sockets,
+memory, filesystems and matching processes) in-process from /proc and psutil,
+without forking any commands.
+"""
 import socket
 import platform
+import re
 import time
 import psutil
 import os
+import threading
+from .cache import TTLCache
+from .cgroup import get_cgroup
 from .logging_config import get_logger
+from .resolver import get_resolver
 
 logger = get_logger('utils.system_info')
 
 
+SYSTEM_INFO_TTL = float(os.getenv('SYSTEM_INFO_TTL', 2))
+# Processes listed in the system report, matched against name and command line
+REPORT_PROCESS_PATTERN = re.compile(os.getenv('SYSTEM_REPORT_PROCESSES', r'docker|glances|python'))
+
+PROC_NET = '/proc/net'
+
+CPU_SAMPLE_INTERVAL = float(os.getenv('CPU_SAMPLE_INTERVAL', 1))
+# Weight of the newest sample in the exponentially smoothed CPU utilisation
+CPU_SMOOTHING = float(os.getenv('CPU_SMOOTHING', 0.3))
+# /proc/net/tcp socket states: 0A is LISTEN; 07 is an unconnected UDP socket
+_LISTEN_STATES = {'tcp': '0A', 'tcp6': '0A', 'udp': '07', 'udp6': '07'}
+
+_static_info = None
+_static_lock = threading.Lock()
+_volatile_cache = TTLCache('system_info', ttl=SYSTEM_INFO_TTL)
+_report_cache = TTLCache('system_report', ttl=SYSTEM_INFO_TTL)
+
+
+def _busy_percent(previous, current):
+    """CPU busy percentage between two psutil cpu_times samples (or since boot)."""
+    # guest time is already included in user/nice on Linux
+    fields = [f for f in current._fields if f not in ('guest', 'guest_nice')]
+    idle_fields = [f for f in ('idle', 'iowait') if f in fields]
+    total = sum(getattr(current, f) for f in fields)
+    idle = sum(getattr(current, f) for f in idle_fields)
+    if previous is not None:
+        total -= sum(getattr(previous, f) for f in fields)
+        idle -= sum(getattr(previous, f) for f in idle_fields)
+    if total <= 0:
+        return 0.0
+    return max(0.0, min(100.0, (total - idle) / total * 100))
+
+
+class CpuSampler:
+    """
+    Background sampler of host and container CPU utilisation.
+    
+    psutil.cpu_percent(interval=None) measures since the previous call in the
+    same process, so concurrent requests see 0.0% or spikes. Instead one
+    thread diffs the per-core CPU times (and the cgroup's CPU time) every
+    CPU_SAMPLE_INTERVAL seconds and keeps exponentially smoothed values;
+    readers just copy the latest snapshot.
+    """
+    
+    def __init__(self, interval=CPU_SAMPLE_INTERVAL, smoothing=CPU_SMOOTHING):
+        self.interval = interval
+        self.smoothing = smoothing
+        self._cgroup = get_cgroup()
+        self._snapshot = None
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Take a baseline sample and start the sampler thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._last = self._read()
+            # Until the first interval has elapsed, report the average since boot
+            now, per_cpu_times, _, _ = self._last
+            self._per_cpu = [_busy_percent(None, t) for t in per_cpu_times]
+            self._container = None
+            self._publish(now, None)
+            self._thread = threading.Thread(target=self._run, name='cpu-sampler', daemon=True)
+            self._thread.start()
+    
+    def current(self):
+        """Return the latest smoothed CPU snapshot without blocking."""
+        if self._snapshot is None:
+            self.start()
+        return self._snapshot
+    
+    def _read(self):
+        return (
+            time.monotonic(),
+            psutil.cpu_times(percpu=True),
+            self._cgroup.usage(),
+            self._cgroup.limits()
+        )
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._sample()
+            except Exception as e:
+                logger.warning(f"CPU sample failed: {e}")
+    
+    def _smooth(self, previous, value):
+        if previous is None:
+            return value
+        return previous + self.smoothing * (value - previous)
+    
+    def _sample(self):
+        current = self._read()
+        last_time, last_times, last_usage, _ = self._last
+        now, times, usage, limits = current
+        self._last = current
+        
+        busy = [_busy_percent(prev, cur) for prev, cur in zip(last_times, times)]
+        if len(busy) == len(self._per_cpu):
+            busy = [self._smooth(old, new) for old, new in zip(self._per_cpu, busy)]
+        self._per_cpu = busy
+        
+        throttled = None
+        elapsed = now - last_time
+        if usage['cpu_usage_seconds'] is not None and last_usage['cpu_usage_seconds'] is not None and elapsed > 0:
+            cores_used = (usage['cpu_usage_seconds'] - last_usage['cpu_usage_seconds']) / elapsed
+            capacity = limits['cpu_limit'] or len(times)
+            self._container = self._smooth(self._container, min(100.0, cores_used / capacity * 100))
+        if usage['periods'] and last_usage['periods'] is not None:
+            periods = usage['periods'] - last_usage['periods']
+            if periods > 0:
+                throttled = (usage['throttled_periods'] - last_usage['throttled_periods']) / periods * 100
+        self._publish(now, throttled)
+    
+    def _publish(self, now, throttled):
+        _, _, usage, limits = self._last
+        per_cpu = [round(p, 1) for p in self._per_cpu]
+        try:
+            load_average = [round(l, 2) for l in os.getloadavg()]
+        except OSError:
+            load_average = None
+        # Swap in a new dict so readers never see a half-updated snapshot
+        self._snapshot = {
+            'cpu_percent': round(sum(per_cpu) / len(per_cpu), 1) if per_cpu else None,
+            'per_cpu': per_cpu,
+            'load_average': load_average,
+            'container_cpu_percent': round(self._container, 1) if self._container is not None else None,
+            'cpu_limit': limits['cpu_limit'],
+            'throttled_percent': round(throttled, 1) if throttled is not None else None,
+            'memory_limit': limits['memory_limit'],
+            'memory_working_set': usage['memory_working_set'],
+            'timestamp': time.time()
+        }
+
+
+_cpu_sampler = CpuSampler()
+
+
+def get_cpu_sampler():
+    """Return the process-wide CPU sampler."""
+    return _cpu_sampler
+
+
+def _effective_cpu_percent(cpu):
+    """CPU utilisation relative to the container's quota when one is set."""
+    if cpu['cpu_limit'] and cpu['container_cpu_percent'] is not None:
+        return cpu['container_cpu_percent']
+    return cpu['cpu_percent']
+
+
+def _effective_memory_percent(cpu, memory):
+    """Memory utilisation relative to the container's limit when one is set."""
+    if cpu['memory_limit'] and cpu['memory_working_set'] is not None:
+        return cpu['memory_working_set'] / cpu['memory_limit'] * 100
+    return memory.percent
+
+
 def get_system_info():
-    """Get comprehensive system information."""
+    """
+    Get comprehensive system information.
+    
+    Facts that cannot change while the process runs (platform, boot time,
+    container type, private IP...) are collected once; volatile metrics are
+    cached for SYSTEM_INFO_TTL seconds. A new dict is returned on every call,
+    so callers may extend it freely.
+    """
+    info = dict(get_static_info())
+    info.update(_volatile_cache.get_or_compute('volatile', _collect_volatile_info))
+    return info
+
+
+def get_static_info():
+    """Get the system facts that are fixed for the lifetime of the process."""
+    global _static_info
+    if _static_info is None:
+        with _static_lock:
+            if _static_info is None:
+                _static_info = _collect_static_info()
+    return _static_info
+
+
+def _collect_static_info():
     info = {}
     
     # Basic system info
@@ -23,37 +216,67 @@ def get_system_info():
     
     # Network info
     try:
-        info['private_ip'] = socket.gethostbyname(socket.gethostname())
-    except (socket.gaierror, OSError) as e:
+        addresses = get_resolver().resolve(socket.gethostname())
+        info['private_ip'] = next(
+            (address for family, address in addresses if family == socket.AF_INET),
+            addresses[0][1]
+        )
+    except (socket.gaierror, OSError, IndexError) as e:
         logger.warning(f"Failed to get private IP: {e}")
         info['private_ip'] = 'Unknown'
     
+    # Boot time
+    try:
+        info['boot_time'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(psutil.boot_time()))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to get boot time: {e}")
+        info['boot_time'] = 'Unknown'
+    
+    # CPU topology
+    try:
+        info['cpu_cores'] = psutil.cpu_count(logical=False)
+        info['cpu_threads'] = psutil.cpu_count(logical=True)
+    except (OSError, AttributeError) as e:
+        logger.warning(f"Failed to get CPU info: {e}")
+        info['cpu_cores'] = 'Unknown'
+        info['cpu_threads'] = 'Unknown'
+    
+    # Container detection
+    info['container_type'] = detect_container_type()
+    
+    return info
+
+
+def _collect_volatile_info():
+    info = {}
+    
     # System uptime
     try:
-        boot_time = psutil.boot_time()
-        uptime_seconds = time.time() - boot_time
+        uptime_seconds = time.time() - psutil.boot_time()
         uptime_hours = int(uptime_seconds // 3600)
         uptime_minutes = int((uptime_seconds % 3600) // 60)
         info['uptime'] = f"{uptime_hours}h {uptime_minutes}m"
-        info['boot_time'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(boot_time))
     except (OSError, ValueError) as e:
         logger.warning(f"Failed to get uptime info: {e}")
         info['uptime'] = 'Unknown'
-        info['boot_time'] = 'Unknown'
     
-    # CPU info
+    # CPU usage, from the background sampler (relative to the quota if limited)
+    cpu = _cpu_sampler.current()
     try:
-        info['cpu_cores'] = psutil.cpu_count(logical=False)
-        info['cpu_threads'] = psutil.cpu_count(logical=True)
-        info['cpu_usage'] = f"{psutil.cpu_percent(interval=None):.1f}%"
+        info['cpu_usage'] = f"{_effective_cpu_percent(cpu):.1f}%"
+        info['cpu_per_core'] = [f"{p:.1f}%" for p in cpu['per_cpu']]
+        if cpu['load_average']:
+            info['load_average'] = ', '.join(f"{l:.2f}" for l in cpu['load_average'])
+        if cpu['cpu_limit']:
+            info['cpu_limit'] = f"{cpu['cpu_limit']:g} cores"
+        if cpu['throttled_percent'] is not None:
+            info['cpu_throttled'] = f"{cpu['throttled_percent']:.1f}%"
         
         cpu_freq = psutil.cpu_freq()
         if cpu_freq:
             info['cpu_frequency'] = f"{cpu_freq.current:.0f} MHz"
     except (OSError, AttributeError) as e:
         logger.warning(f"Failed to get CPU info: {e}")
-        info['cpu_cores'] = 'Unknown'
-        info['cpu_threads'] = 'Unknown'
         info['cpu_usage'] = 'Unknown'
     
     # Memory info
@@ -61,8 +284,10 @@ def get_system_info():
         memory = psutil.virtual_memory()
         info['memory_total'] = f"{memory.total / (1024**3):.1f} GB"
         info['memory_used'] = f"{memory.used / (1024**3):.1f} GB"
-        info['memory_usage'] = f"{memory.percent:.1f}%"
+        info['memory_usage'] = f"{_effective_memory_percent(cpu, memory):.1f}%"
         info['memory_available'] = f"{memory.available / (1024**3):.1f} GB"
+        if cpu['memory_limit']:
+            info['memory_limit'] = f"{cpu['memory_limit'] / (1024**3):.1f} GB"
     except (OSError, AttributeError) as e:
         logger.warning(f"Failed to get memory info: {e}")
         info['memory_total'] = 'Unknown'
@@ -96,12 +321,228 @@ def get_system_info():
         logger.warning(f"Failed to get network interfaces: {e}")
         info['network_interfaces'] = []
     
-    # Container detection
-    info['container_type'] = detect_container_type()
-    
     return info
 
 
+def get_usage_metrics():
+    """Get the volatile usage metrics shown on the dashboard overview."""
+    metrics = {}
+    
+    cpu = _cpu_sampler.current()
+    try:
+        cpu_percent = _effective_cpu_percent(cpu)
+        metrics['cpu_percent'] = round(cpu_percent, 1)
+        metrics['cpu_usage'] = f"{cpu_percent:.1f}%"
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Failed to get CPU usage: {e}")
+        metrics['cpu_percent'] = None
+        metrics['cpu_usage'] = 'Unknown'
+    
+    try:
+        memory_percent = _effective_memory_percent(cpu, psutil.virtual_memory())
+        metrics['memory_percent'] = round(memory_percent, 1)
+        metrics['memory_usage'] = f"{memory_percent:.1f}%"
+    except (OSError, AttributeError) as e:
+        logger.warning(f"Failed to get memory usage: {e}")
+        metrics['memory_percent'] = None
+        metrics['memory_usage'] = 'Unknown'
+    
+    try:
+        disk_usage = psutil.disk_usage('/')
+        disk_percent = disk_usage.used / disk_usage.total * 100
+        metrics['disk_percent'] = round(disk_percent, 1)
+        metrics['disk_usage'] = f"{disk_percent:.1f}%"
+    except (OSError, ZeroDivisionError) as e:
+        logger.warning(f"Failed to get disk usage: {e}")
+        metrics['disk_percent'] = None
+        metrics['disk_usage'] = 'Unknown'
+    
+    try:
+        uptime_seconds = time.time() - psutil.boot_time()
+        metrics['uptime'] = f"{int(uptime_seconds // 3600)}h {int((uptime_seconds % 3600) // 60)}m"
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to get uptime info: {e}")
+        metrics['uptime'] = 'Unknown'
+    
+    return metrics
+
+
+def collect_system_report():
+    """
+    Collect a structured system report without spawning subprocesses.
+    
+    Concurrent callers within SYSTEM_INFO_TTL seconds share one collection.
+    
+    Returns:
+        dict: {'hostname', 'date', 'cpu_cores', 'interfaces', 'listening',
+               'memory', 'swap', 'filesystems', 'processes'}
+    
+    Example:
+        >>> report = collect_system_report()
+        >>> [s['port'] for s in report['listening'] if s['protocol'] == 'tcp']
+        [80, 61208]
+    """
+    return _report_cache.get_or_compute('report', _collect_system_report)
+
+
+def _collect_system_report():
+    report = {
+        'hostname': socket.gethostname(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S %Z'),
+        'cpu_cores': os.cpu_count()
+    }
+    sections = {
+        'interfaces': (_collect_interfaces, []),
+        'listening': (_collect_listening_sockets, []),
+        'memory': (lambda: _memory_dict(psutil.virtual_memory()), {}),
+        'swap': (lambda: _memory_dict(psutil.swap_memory()), {}),
+        'filesystems': (_collect_filesystems, []),
+        'processes': (_collect_processes, [])
+    }
+    for name, (collect, default) in sections.items():
+        try:
+            report[name] = collect()
+        except (OSError, AttributeError, ValueError) as e:
+            logger.warning(f"Failed to collect {name}: {e}")
+            report[name] = default
+    return report
+
+
+def _collect_interfaces():
+    stats = psutil.net_if_stats()
+    interfaces = []
+    for name, addresses in psutil.net_if_addrs().items():
+        ipv4 = [
+            {'address': a.address, 'netmask': a.netmask}
+            for a in addresses if a.family == socket.AF_INET
+        ]
+        if not ipv4:
+            continue
+        interface_stats = stats.get(name)
+        interfaces.append({
+            'name': name,
+            'up': bool(interface_stats and interface_stats.isup),
+            'mtu': interface_stats.mtu if interface_stats else None,
+            'addresses': ipv4
+        })
+    return interfaces
+
+
+def _decode_proc_address(value):
+    # /proc/net encodes addresses as hex 32-bit words in host (little-endian) order
+    address, port = value.split(':')
+    raw = bytes.fromhex(address)
+    raw = b''.join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, raw), int(port, 16)
+
+
+def _collect_listening_sockets():
+    sockets = []
+    for protocol, listen_state in _LISTEN_STATES.items():
+        try:
+            with open(os.path.join(PROC_NET, protocol), 'r') as f:
+                next(f, None)  # header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 4 or fields[3] != listen_state:
+                        continue
+                    address, port = _decode_proc_address(fields[1])
+                    sockets.append({
+                        'protocol': protocol.rstrip('6'),
+                        'address': address,
+                        'port': port
+                    })
+        except FileNotFoundError:
+            continue  # e.g. IPv6 disabled
+    sockets.sort(key=lambda s: (s['protocol'], s['port'], s['address']))
+    return sockets
+
+
+def _memory_dict(memory):
+    return {
+        field: getattr(memory, field)
+        for field in ('total', 'used', 'free', 'available', 'percent')
+        if hasattr(memory, field)
+    }
+
+
+def _collect_filesystems():
+    filesystems = []
+    for partition in psutil.disk_partitions(all=False):
+        if not partition.device.startswith('/dev/'):
+            continue
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+        except OSError:
+            continue
+        filesystems.append({
+            'device': partition.device,
+            'mountpoint': partition.mountpoint,
+            'fstype': partition.fstype,
+            'total': usage.total,
+            'used': usage.used,
+            'free': usage.free,
+            'percent': usage.percent
+        })
+    return filesystems
+
+
+def _collect_processes():
+    processes = []
+    for proc in psutil.process_iter(['pid', 'name', 'username', 'cmdline', 'memory_info']):
+        info = proc.info
+        command = ' '.join(info['cmdline'] or []) or info['name'] or ''
+        if not REPORT_PROCESS_PATTERN.search(command):
+            continue
+        memory = info['memory_info']
+        processes.append({
+            'pid': info['pid'],
+            'user': info['username'],
+            'name': info['name'],
+            'rss': memory.rss if memory else None,
+            'command': command
+        })
+    return processes
+
+
+def render_system_report(report):
+    """Render a system report as the plain-text layout of system-info.sh."""
+    gb = 1024 ** 3
+    lines = [
+        '=== System Information ===', '',
+        f"Hostname: {report['hostname']}",
+        f"Date: {report['date']}", '',
+        '=== Network Interfaces ==='
+    ]
+    for interface in report['interfaces']:
+        state = 'UP' if interface['up'] else 'DOWN'
+        lines.append(f"{interface['name']}: {state} mtu {interface['mtu']}")
+        for address in interface['addresses']:
+            lines.append(f"    inet {address['address']} netmask {address['netmask']}")
+    lines += ['', '=== Listening Sockets ===']
+    lines.append(f"{'Proto':<6} {'Local Address':<40} Port")
+    for sock in report['listening']:
+        lines.append(f"{sock['protocol']:<6} {sock['address']:<40} {sock['port']}")
+    lines += ['', '=== System Resources ===', f"CPU: {report['cpu_cores']} cores"]
+    for label, memory in (('Mem', report['memory']), ('Swap', report['swap'])):
+        if memory:
+            lines.append(
+                f"{label + ':':<6} total {memory['total'] / gb:.1f}G "
+                f"used {memory['used'] / gb:.1f}G free {memory['free'] / gb:.1f}G"
+            )
+    lines.append(f"{'Filesystem':<24} {'Size':>7} {'Used':>7} {'Avail':>7} {'Use%':>5} Mounted on")
+    for fs in report['filesystems']:
+        lines.append(
+            f"{fs['device']:<24} {fs['total'] / gb:>6.1f}G {fs['used'] / gb:>6.1f}G "
+            f"{fs['free'] / gb:>6.1f}G {fs['percent']:>4.0f}% {fs['mountpoint']}"
+        )
+    lines += ['', '=== Running Services ===']
+    for proc in report['processes']:
+        lines.append(f"{proc['user'] or '?':<10} {proc['pid']:>7} {proc['command'][:120]}")
+    return '\n'.join(lines) + '\n'
+
+
 def detect_container_type():
     """Detect container environment type."""
     if os.path.exists('/.dockerenv'):
@@ -2,24 +2,36 @@
 
 This module provides security-focused validation functions to ensure that
 network operations are restricted to safe, private networks and valid inputs.
+
+Scan targets are checked against a ScanPolicy built from allow and deny
+lists. Network rules (IPv4 and IPv6 CIDRs) are held in a prefix index that
+resolves an address with one set lookup per distinct prefix length, the most
+specific matching rule deciding; hostname rules are compiled into a single
+regular expression. Recent decisions are kept in an LRU, so validating large
+target lists for batch probes and scans costs microseconds per entry.
 """
-import re
+import fnmatch
 import ipaddress
-from typing import Tuple
+import os
+import re
+import socket
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 
 # Define allowed scanning targets (private networks and localhost)
 ALLOWED_NETWORKS = [
     ipaddress.IPv4Network('10.0.0.0/8'),
-    ipaddress.IPv4Network('172.16.0.0/12'), 
+    ipaddress.IPv4Network('172.16.0.0/12'),
     ipaddress.IPv4Network('192.168.0.0/16'),
     ipaddress.IPv4Network('127.0.0.0/8'),
+    ipaddress.IPv6Network('::1/128'),
+    ipaddress.IPv6Network('fc00::/7'),  # Unique local addresses
+    ipaddress.IPv6Network('fe80::/10'),  # Link-local
 ]
 
-# Define blocked networks (public internet ranges to avoid)
-BLOCKED_NETWORKS = [
-    ipaddress.IPv4Network('0.0.0.0/0'),  # Will be checked after allowed networks
-]
+# Define blocked networks (checked before hostname rules; more specific rules win)
+BLOCKED_NETWORKS: List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = []
 
 # Define allowed hostnames patterns (for internal services)
 ALLOWED_HOSTNAME_PATTERNS = [
@@ -29,63 +41,240 @@ ALLOWED_HOSTNAME_PATTERNS = [
     r'^[\w\-]+$',  # Simple hostnames without dots
 ]
 
+# Extra comma-separated rules: CIDRs, IP addresses or hostname globs (*.corp.example)
+SCAN_ALLOW = os.getenv('SCAN_ALLOW', '')
+SCAN_DENY = os.getenv('SCAN_DENY', '')
+# Largest CIDR targets accepted (smallest prefix length) per address family
+SCAN_MIN_PREFIX_V4 = int(os.getenv('SCAN_MIN_PREFIX_V4', 16))
+SCAN_MIN_PREFIX_V6 = int(os.getenv('SCAN_MIN_PREFIX_V6', 112))
+VALIDATION_CACHE_SIZE = int(os.getenv('VALIDATION_CACHE_SIZE', 4096))
+
+_UNSAFE_CHARS = re.compile(r'[;&|`$]')
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class PrefixIndex:
+    """
+    Longest-prefix-match index of allow/deny network rules.
+
+    Rules are bucketed by (address family, prefix length) into sets of network
+    numbers, so a lookup is one shift and set probe per distinct prefix
+    length, most specific first.
+
+    Example:
+        >>> index = PrefixIndex()
+        >>> index.add(ipaddress.ip_network('10.0.0.0/8'), True)
+        >>> index.add(ipaddress.ip_network('10.1.0.0/16'), False)
+        >>> index.lookup(ipaddress.ip_address('10.1.2.3'))
+        False
+    """
+
+    def __init__(self):
+        # version -> {prefixlen: {network number: allowed}}
+        self._rules: Dict[int, Dict[int, Dict[int, bool]]] = {4: {}, 6: {}}
+        self._lengths: Dict[int, List[int]] = {4: [], 6: []}
+
+    def add(self, network: Network, allowed: bool):
+        """Add a rule; a deny wins over an allow for the identical prefix."""
+        bucket = self._rules[network.version].setdefault(network.prefixlen, {})
+        number = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+        bucket[number] = bucket.get(number, True) and allowed
+        self._lengths[network.version] = sorted(self._rules[network.version], reverse=True)
+
+    def lookup(self, address, max_prefixlen: Optional[int] = None) -> Optional[bool]:
+        """
+        Return the decision of the most specific rule containing the address.
+
+        Args:
+            address: IPv4Address or IPv6Address
+            max_prefixlen: Ignore rules more specific than this (for networks)
+
+        Returns:
+            bool: True if allowed, False if denied, None if no rule matches
+        """
+        bits = address.max_prefixlen
+        number = int(address)
+        rules = self._rules[address.version]
+        for length in self._lengths[address.version]:
+            if max_prefixlen is not None and length > max_prefixlen:
+                continue
+            decision = rules[length].get(number >> (bits - length))
+            if decision is not None:
+                return decision
+        return None
+
+    def denies_within(self, network: Network) -> bool:
+        """Return True if any deny rule is more specific than, and inside, the network."""
+        shift_base = network.max_prefixlen
+        prefix = int(network.network_address) >> (shift_base - network.prefixlen)
+        for length, bucket in self._rules[network.version].items():
+            if length <= network.prefixlen:
+                continue
+            for number, allowed in bucket.items():
+                if not allowed and number >> (length - network.prefixlen) == prefix:
+                    return True
+        return False
+
+
+def _compile_hostname_rules(patterns: Iterable[str]) -> Optional['re.Pattern']:
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+
+
+def _split_rules(spec: str) -> Tuple[List[Network], List[str]]:
+    """Split comma-separated rules into networks and hostname regexes."""
+    networks, hostnames = [], []
+    for rule in filter(None, (r.strip() for r in spec.split(','))):
+        try:
+            networks.append(ipaddress.ip_network(rule, strict=False))
+        except ValueError:
+            hostnames.append(fnmatch.translate(rule))
+    return networks, hostnames
+
+
+class ScanPolicy:
+    """
+    Allow/deny policy for scan and probe targets.
+
+    Targets may be hostnames, IPv4/IPv6 addresses or CIDR networks. An
+    address is decided by the most specific matching network rule; a network
+    is allowed only if its own prefix is allowed, no deny rule lies inside
+    it and it is no larger than the configured minimum prefix. Hostnames are
+    rejected if they match a deny pattern and allowed if they match an
+    allow pattern.
+    """
+
+    def __init__(self, allow_networks: Iterable[Network] = (), deny_networks: Iterable[Network] = (),
+                 allow_hostnames: Iterable[str] = (), deny_hostnames: Iterable[str] = (),
+                 min_prefix: Optional[Dict[int, int]] = None,
+                 cache_size: int = VALIDATION_CACHE_SIZE):
+        self.index = PrefixIndex()
+        for network in allow_networks:
+            self.index.add(network, True)
+        for network in deny_networks:
+            self.index.add(network, False)
+        self._allow_hostnames = _compile_hostname_rules(allow_hostnames)
+        self._deny_hostnames = _compile_hostname_rules(deny_hostnames)
+        self.min_prefix = min_prefix or {4: SCAN_MIN_PREFIX_V4, 6: SCAN_MIN_PREFIX_V6}
+        self.check = lru_cache(maxsize=cache_size)(self._check)
+
+    @classmethod
+    def from_config(cls, allow: str = SCAN_ALLOW, deny: str = SCAN_DENY) -> 'ScanPolicy':
+        """Build the default policy extended with comma-separated allow/deny rules."""
+        allow_networks, allow_hostnames = _split_rules(allow)
+        deny_networks, deny_hostnames = _split_rules(deny)
+        return cls(
+            allow_networks=ALLOWED_NETWORKS + allow_networks,
+            deny_networks=BLOCKED_NETWORKS + deny_networks,
+            allow_hostnames=ALLOWED_HOSTNAME_PATTERNS + allow_hostnames,
+            deny_hostnames=deny_hostnames
+        )
+
+    def _check(self, target: str) -> Tuple[bool, Optional[str]]:
+        if '/' in target:
+            return self._check_network(target)
+        try:
+            address = ipaddress.ip_address(target)
+        except ValueError:
+            return self._check_hostname(target)
+        allowed = self.index.lookup(address)
+        if allowed:
+            return True, None
+        if allowed is False:
+            return False, "Address is denied by scan policy"
+        return False, "Scanning of external IP addresses is not allowed"
+
+    def _check_network(self, target: str) -> Tuple[bool, Optional[str]]:
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            return False, "Invalid network address"
+        if network.prefixlen < self.min_prefix[network.version]:
+            return False, f"Network too large (minimum prefix /{self.min_prefix[network.version]})"
+        allowed = self.index.lookup(network.network_address, max_prefixlen=network.prefixlen)
+        if allowed is None:
+            return False, "Scanning of external networks is not allowed"
+        if not allowed or self.index.denies_within(network):
+            return False, "Network is denied by scan policy"
+        return True, None
+
+    def _check_hostname(self, target: str) -> Tuple[bool, Optional[str]]:
+        # Resolvers read '134744072', '0x08080808' or '8.8.2056' as IPv4
+        # addresses; they would otherwise pass as simple hostnames
+        try:
+            socket.inet_aton(target)
+        except OSError:
+            pass
+        else:
+            return False, "Numeric addresses must be written as dotted quads"
+        if self._deny_hostnames is not None and self._deny_hostnames.match(target):
+            return False, "Hostname is denied by scan policy"
+        if self._allow_hostnames is not None and self._allow_hostnames.match(target):
+            return True, None
+        return False, "Invalid hostname format or external hostname not allowed"
+
+
+_policy = ScanPolicy.from_config()
+
+
+def get_scan_policy() -> ScanPolicy:
+    """Return the process-wide scan target policy."""
+    return _policy
+
 
 def validate_scan_target(target: str) -> Tuple[bool, str]:
     """
     Validate network scan target for security compliance.
-    
+
     This function ensures that network scanning is restricted to private networks
     and localhost only, preventing scanning of external/public networks.
-    
+
     Args:
-        target: Target hostname or IP address to validate
-        
+        target: Target hostname, IP address (IPv4 or IPv6) or CIDR network to validate
+
     Returns:
         tuple: (is_valid, error_message)
             - is_valid (bool): True if target is allowed, False otherwise
             - error_message (str): None if valid, error description if invalid
-            
+
     Security Policy:
-        - Only private networks are allowed (RFC 1918)
+        - Only private networks are allowed (RFC 1918, IPv6 ULA and link-local)
         - Localhost and loopback addresses are allowed
         - External IP addresses and public hostnames are blocked
-        
+        - Numeric IPv4 forms other than dotted quads ('134744072') are blocked
+        - SCAN_ALLOW / SCAN_DENY add rules; the most specific network rule wins
+
     Example:
         >>> validate_scan_target('192.168.1.1')
         (True, None)
+        >>> validate_scan_target('10.0.0.0/24')
+        (True, None)
         >>> validate_scan_target('8.8.8.8')
         (False, 'Scanning of external IP addresses is not allowed')
     """
     if not target or not isinstance(target, str):
         return False, "Target cannot be empty"
-    
+
     target = target.strip()
-    
+
     if len(target) > 255:
         return False, "Target name too long"
-    
+
     # Check for suspicious characters
-    if re.search(r'[;&|`$]', target):
+    if _UNSAFE_CHARS.search(target):
         return False, "Invalid characters in target"
-    
-    # Try to parse as IP address first
-    try:
-        ip = ipaddress.IPv4Address(target)
-        
-        # Check if IP is in allowed networks
-        for network in ALLOWED_NETWORKS:
-            if ip in network:
-                return True, None
-                
-        return False, "Scanning of external IP addresses is not allowed"
-        
-    except ipaddress.AddressValueError:
-        # Not a valid IP, check as hostname
-        pass
-    
-    # Validate hostname format
-    for pattern in ALLOWED_HOSTNAME_PATTERNS:
-        if re.match(pattern, target, re.IGNORECASE):
-            return True, None
-    
-    return False, "Invalid hostname format or external hostname not allowed"
+
+    return _policy.check(target)
+
+
+def validate_scan_targets(targets: Iterable[str]) -> List[Tuple[bool, str]]:
+    """
+    Validate many scan targets, e.g. for batch probes.
+
+    Returns:
+        list: One (is_valid, error_message) tuple per target, in order
+    """
+    return [validate_scan_target(target) for target in targets]
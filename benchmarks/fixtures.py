@@ -0,0 +1,104 @@
+"""Local stand-ins for the services the benchmarks exercise.
+
+- FakeIMDS: an HTTP server answering like the EC2 instance metadata service
+  (IMDSv2 token endpoint plus the fields utils.aws_info reads)
+- TCPListener: a socket that accepts and immediately closes connections
+- write_services_file: a services.json with any number of entries
+"""
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METADATA = {
+    'instance-id': 'i-0123456789abcdef0',
+    'instance-type': 't3.micro',
+    'public-ipv4': '203.0.113.10',
+    'placement/availability-zone': 'us-east-1a',
+    'security-groups': 'default'
+}
+
+
+class _IMDSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=b''):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        if self.path == '/latest/api/token':
+            self._send(200, b'benchmark-token')
+        else:
+            self._send(404)
+
+    def do_GET(self):
+        prefix = '/latest/meta-data/'
+        value = METADATA.get(self.path[len(prefix):]) if self.path.startswith(prefix) else None
+        if value is None:
+            self._send(404)
+        elif self.headers.get('X-aws-ec2-metadata-token') != 'benchmark-token':
+            self._send(401)
+        else:
+            self._send(200, value.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeIMDS:
+    """Fake instance metadata service on a free localhost port."""
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _IMDSHandler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TCPListener:
+    """Listening socket that accepts and closes connections in a thread."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1024)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+def closed_port() -> int:
+    """Return a localhost port with nothing listening on it."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def write_services_file(path: str, count: int, port: int = 6379):
+    """Write a services.json with `count` TCP services on localhost."""
+    services = [
+        {'name': f'service-{i}', 'host': '127.0.0.1', 'port': port, 'type': 'tcp'}
+        for i in range(count)
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'services': services}, f)
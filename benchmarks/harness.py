@@ -0,0 +1,166 @@
+"""Timing, statistics and result storage for the benchmark suite.
+
+Every benchmark produces a Result with throughput and latency percentiles.
+A run is saved as JSON keyed by benchmark name, together with the git commit
+it was measured on, so two runs can be compared with compare_runs().
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Result:
+    """Latency samples and throughput of one benchmark."""
+
+    def __init__(self, name: str, latencies: List[float], elapsed: float,
+                 errors: int = 0, concurrency: int = 1):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.elapsed = elapsed
+        self.errors = errors
+        self.concurrency = concurrency
+
+    def percentile(self, pct: float) -> float:
+        """Nearest-rank percentile of the latency samples, in seconds."""
+        if not self.latencies:
+            return 0.0
+        rank = max(1, int(round(pct / 100 * len(self.latencies))))
+        return self.latencies[min(rank, len(self.latencies)) - 1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        count = len(self.latencies)
+        return {
+            'operations': count,
+            'errors': self.errors,
+            'concurrency': self.concurrency,
+            'throughput': round(count / self.elapsed, 2) if self.elapsed > 0 else 0.0,
+            'mean_ms': round(sum(self.latencies) / count * 1000, 4) if count else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 4),
+            'p95_ms': round(self.percentile(95) * 1000, 4),
+            'p99_ms': round(self.percentile(99) * 1000, 4)
+        }
+
+
+def measure(name: str, func: Callable[[], Any], duration: float = 1.0,
+            min_iterations: int = 5, max_iterations: Optional[int] = None,
+            setup: Optional[Callable[[], Any]] = None) -> Result:
+    """
+    Call func repeatedly for about `duration` seconds and time every call.
+
+    Args:
+        name: Benchmark name used in reports
+        func: Zero-argument callable under test
+        duration: Target wall-clock time in seconds
+        min_iterations: Run at least this many calls even if slow
+        max_iterations: Stop after this many calls
+        setup: Untimed callable run before every call (e.g. to clear a cache)
+
+    Returns:
+        Result: Latencies of every call; exceptions are counted as errors
+    """
+    latencies, errors = [], 0
+    func()  # warm-up
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+        count = len(latencies)
+        if max_iterations and count >= max_iterations:
+            break
+        if count >= min_iterations and time.perf_counter() >= deadline:
+            break
+    # Throughput counts only timed calls, not the untimed setup
+    return Result(name, latencies, sum(latencies), errors)
+
+
+def git_commit(cwd: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_run(results: List[Result], cwd: str) -> Dict[str, Any]:
+    """Assemble a machine-readable run record."""
+    return {
+        'commit': git_commit(cwd),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': {result.name: result.to_dict() for result in results}
+    }
+
+
+def save_run(run: Dict[str, Any], path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2, sort_keys=True)
+
+
+def load_run(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_table(run: Dict[str, Any]) -> str:
+    """Render a run as a fixed-width text table."""
+    lines = [f"{'benchmark':<44} {'ops/s':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"]
+    for name, r in sorted(run['results'].items()):
+        lines.append(
+            f"{name:<44} {r['throughput']:>11.1f} {r['p50_ms']:>9.3f} "
+            f"{r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['errors']:>7}"
+        )
+    return '\n'.join(lines)
+
+
+def compare_runs(baseline: Dict[str, Any], current: Dict[str, Any],
+                 threshold: float = 0.2):
+    """
+    Compare two runs benchmark by benchmark.
+
+    A benchmark regresses when its p95 latency grows, or its throughput
+    drops, by more than `threshold` (a fraction).
+
+    Returns:
+        tuple: (report text, list of regressed benchmark names)
+    """
+    lines = [f"{'benchmark':<44} {'ops/s':>9} {'p95':>9}   (baseline {baseline.get('commit')})"]
+    regressions = []
+    for name, r in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            lines.append(f"{name:<44} {'new':>9}")
+            continue
+        throughput = _change(base['throughput'], r['throughput'])
+        p95 = _change(base['p95_ms'], r['p95_ms'])
+        regressed = (throughput is not None and throughput < -threshold) or \
+                    (p95 is not None and p95 > threshold)
+        if regressed:
+            regressions.append(name)
+        lines.append(
+            f"{name:<44} {_format_change(throughput):>9} {_format_change(p95):>9}"
+            f"{'   REGRESSION' if regressed else ''}"
+        )
+    return '\n'.join(lines), regressions
+
+
+def _change(old: float, new: float) -> Optional[float]:
+    return (new - old) / old if old else None
+
+
+def _format_change(change: Optional[float]) -> str:
+    return 'n/a' if change is None else f"{change * 100:+.1f}%"
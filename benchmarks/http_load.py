@@ -0,0 +1,175 @@
+"""End-to-end HTTP load generator for every route in app/api.py.
+
+Each route is hit by `concurrency` threads for `duration` seconds, every
+thread reusing one keep-alive connection. The target is either a server
+started in-process on a free port or any running instance given by URL
+(for example the Gunicorn production mode).
+"""
+import http.client
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from harness import Result
+
+# (name, method, path, JSON body, accepted statuses); {job_id} and
+# {listener_port} are filled in before the run
+ROUTES: List[Tuple[str, str, str, Optional[Dict[str, Any]], Tuple[int, ...]]] = [
+    ('index', 'GET', '/', None, (200,)),
+    ('instance_info_page', 'GET', '/instance-info', None, (200,)),
+    ('network_analysis_page', 'GET', '/network-analysis', None, (200,)),
+    ('instance_info', 'GET', '/api/instance-info', None, (200,)),
+    ('metrics', 'GET', '/metrics', None, (200,)),
+    ('metrics_history', 'GET', '/api/metrics/history?points=200', None, (200,)),
+    ('cache_stats', 'GET', '/api/cache-stats', None, (200,)),
+    # 404 unless the target runs in fleet mode
+    ('fleet_page', 'GET', '/fleet', None, (200, 404)),
+    ('fleet', 'GET', '/api/fleet', None, (200, 404)),
+    ('health', 'GET', '/health', None, (200, 503)),
+    ('ready', 'GET', '/ready', None, (200, 503)),
+    ('services', 'GET', '/api/services', None, (200,)),
+    ('shard_results', 'GET', '/api/shard/results', None, (200,)),
+    ('system_info', 'GET', '/api/system-info', None, (200,)),
+    ('check_service', 'POST', '/api/check-service',
+     {'host': '127.0.0.1', 'port': '{listener_port}'}, (200,)),
+    ('check_services', 'POST', '/api/check-services', {'targets': 'all'}, (200,)),
+    ('network_scan', 'POST', '/api/network-scan', {'target': 'localhost'}, (200, 202, 429)),
+    ('network_scan_job', 'GET', '/api/network-scan/{job_id}', None, (200,)),
+]
+
+# Routes that are not simple request/response and get their own measurement
+STREAM_PATH = '/api/stream'
+
+
+def start_app_server():
+    """Serve the Flask app from a background thread; returns (base URL, server)."""
+    from werkzeug.serving import make_server
+    from api import app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def _fill(value, params: Dict[str, Any]):
+    if isinstance(value, dict):
+        return {k: _fill(v, params) for k, v in value.items()}
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
+        return params.get(value[1:-1], value)
+    return value
+
+
+def _request(conn, method: str, path: str, body: Optional[bytes]):
+    headers = {'Accept-Encoding': 'gzip'}
+    if body is not None:
+        headers['Content-Type'] = 'application/json'
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def load_route(base_url: str, name: str, method: str, path: str, body: Optional[bytes],
+               accepted: Tuple[int, ...], concurrency: int, duration: float) -> Result:
+    """Hit one route from `concurrency` keep-alive clients for `duration` seconds."""
+    target = urlsplit(base_url)
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                status = _request(conn, method, path, body)
+                if status not in accepted:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+            local.append(time.perf_counter() - t0)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Result(f'http.{name}', latencies, time.perf_counter() - start, errors[0], concurrency)
+
+
+def stream_first_event(base_url: str, duration: float) -> Result:
+    """Time from opening /api/stream to receiving its initial snapshot event."""
+    target = urlsplit(base_url)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+        try:
+            conn.request('GET', STREAM_PATH)
+            response = conn.getresponse()
+            data = b''
+            while b'\n\n' not in data:
+                chunk = response.fp.readline()
+                if not chunk:
+                    break
+                data += chunk
+            if response.status != 200 or b'event: snapshot' not in data:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+        finally:
+            conn.close()
+        latencies.append(time.perf_counter() - t0)
+    return Result('http.stream_first_event', latencies, time.perf_counter() - start, errors)
+
+
+def _create_job(base_url: str) -> str:
+    target = urlsplit(base_url)
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+    try:
+        conn.request('POST', '/api/network-scan', body=json.dumps({'target': 'localhost'}),
+                     headers={'Content-Type': 'application/json'})
+        return json.loads(conn.getresponse().read()).get('job_id', 'missing')
+    finally:
+        conn.close()
+
+
+def run_http(base_url: str, concurrency: int, duration: float, listener_port: int,
+             only: Optional[List[str]] = None) -> List[Result]:
+    """Load-test every route (or those named in `only`) against base_url."""
+    params = {'listener_port': listener_port, 'job_id': _create_job(base_url)}
+    results = []
+    for name, method, path, body, accepted in ROUTES:
+        if only and name not in only:
+            continue
+        path = path.format(**params)
+        payload = json.dumps(_fill(body, params)).encode() if body is not None else None
+        results.append(load_route(base_url, name, method, path, payload, accepted,
+                                  concurrency, duration))
+    if not only or 'stream' in only:
+        results.append(stream_first_event(base_url, duration))
+    return results
+
+
+def uncovered_routes(app) -> List[str]:
+    """Return app routes that ROUTES does not exercise."""
+    covered = {path.split('?')[0] for _, _, path, _, _ in ROUTES} | {STREAM_PATH}
+    return sorted(
+        rule.rule for rule in app.url_map.iter_rules()
+        if rule.endpoint != 'static'
+        and rule.rule.replace('<job_id>', '{job_id}') not in covered
+    )
@@ -0,0 +1,121 @@
+"""Micro-benchmarks of the utility functions behind the API.
+
+These import the app's utils package directly, so run.py must configure the
+environment (AWS_METADATA_ENDPOINT, SERVICES_CONFIG_PATH, ...) first.
+"""
+import itertools
+import os
+import tempfile
+from typing import List
+
+from harness import Result, measure
+from fixtures import TCPListener, closed_port, write_services_file
+
+SERVICE_COUNTS = (10, 1000, 10000)
+
+SCAN_TARGETS = (
+    'localhost', '127.0.0.1', '10.0.0.0/24', '192.168.1.10',
+    'redis.local', '8.8.8.8', 'localhost; rm -rf /', 'a' * 300
+)
+
+
+def bench_system_info(duration: float) -> List[Result]:
+    from utils.system_info import (
+        get_system_info, get_usage_metrics, collect_system_report,
+        _volatile_cache, _report_cache
+    )
+    return [
+        measure('system_info.get_system_info.cached', get_system_info, duration),
+        measure('system_info.get_system_info.cold', get_system_info, duration,
+                setup=_volatile_cache.invalidate),
+        measure('system_info.get_usage_metrics', get_usage_metrics, duration),
+        measure('system_info.collect_system_report.cold', collect_system_report, duration,
+                setup=_report_cache.invalidate)
+    ]
+
+
+def bench_aws_info(duration: float) -> List[Result]:
+    from utils.aws_info import get_aws_info, reset_aws_info_cache
+    results = [measure('aws_info.get_aws_info.cached', get_aws_info, duration)]
+    # Cold path: token request plus a parallel fetch of every field
+    results.append(measure(
+        'aws_info.get_aws_info.cold', get_aws_info, duration,
+        setup=reset_aws_info_cache
+    ))
+    return results
+
+
+def bench_load_services(duration: float) -> List[Result]:
+    from utils.config import ServiceRegistry
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in SERVICE_COUNTS:
+            path = os.path.join(tmp, f'services-{count}.json')
+            write_services_file(path, count)
+            registry = ServiceRegistry(path)
+            results.append(measure(
+                f'config.load_services.parse.{count}',
+                lambda: registry.refresh(force=True), duration
+            ))
+            results.append(measure(
+                f'config.load_services.cached.{count}', registry.as_config, duration
+            ))
+            results.append(measure(
+                f'config.filter_by_name.{count}',
+                lambda: registry.filter(name=f'service-{count // 2}'), duration
+            ))
+    return results
+
+
+def bench_validate_scan_target(duration: float) -> List[Result]:
+    from utils.validation import validate_scan_target, get_scan_policy
+
+    def validate_all():
+        for target in SCAN_TARGETS:
+            validate_scan_target(target)
+
+    # Every call after the warm-up hits ScanPolicy's LRU cache unless it is
+    # cleared, so also measure cold checks and a stream of unseen targets
+    serial = itertools.count()
+
+    def validate_distinct():
+        n = next(serial)
+        for target in (f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}',
+                       f'192.168.{n >> 8 & 255}.0/{24 + n % 8}',
+                       f'host-{n}.local', f'203.0.{n >> 8 & 255}.{n & 255}'):
+            validate_scan_target(target)
+
+    return [
+        measure(f'validation.validate_scan_target.cached.x{len(SCAN_TARGETS)}', validate_all, duration),
+        measure(f'validation.validate_scan_target.cold.x{len(SCAN_TARGETS)}', validate_all, duration,
+                setup=get_scan_policy().check.cache_clear),
+        measure('validation.validate_scan_target.distinct.x4', validate_distinct, duration)
+    ]
+
+
+def bench_tcp_connection(duration: float) -> List[Result]:
+    from utils.network import test_tcp_connection, check_tcp_connections
+    listener = TCPListener()
+    try:
+        refused = closed_port()
+        batch = ([{'host': '127.0.0.1', 'port': listener.port}] * 50
+                 + [{'host': '127.0.0.1', 'port': refused}] * 50)
+        return [
+            measure('network.test_tcp_connection.open',
+                    lambda: test_tcp_connection('127.0.0.1', listener.port), duration),
+            measure('network.test_tcp_connection.refused',
+                    lambda: test_tcp_connection('127.0.0.1', refused), duration),
+            measure('network.check_tcp_connections.x100',
+                    lambda: check_tcp_connections(batch), duration)
+        ]
+    finally:
+        listener.close()
+
+
+BENCHMARKS = {
+    'system_info': bench_system_info,
+    'aws_info': bench_aws_info,
+    'load_services': bench_load_services,
+    'validation': bench_validate_scan_target,
+    'tcp': bench_tcp_connection
+}
@@ -0,0 +1,118 @@
+"""Run the benchmark suite and store machine-readable results.
+
+Usage (from the repository root):
+
+    python benchmarks/run.py                          # everything, in-process server
+    python benchmarks/run.py --suite micro --duration 2
+    python benchmarks/run.py --suite http --url http://localhost:8080 --concurrency 16
+    python benchmarks/run.py --compare benchmarks/results/abc1234.json
+
+Results are written to benchmarks/results/<commit>.json (or --output).
+With --compare, the run is diffed against a saved run and the exit status is
+1 when any benchmark's throughput drops or p95 latency grows by more than
+--threshold.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_DIR = os.path.join(REPO_DIR, 'app')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+from harness import build_run, compare_runs, format_table, load_run, save_run  # noqa: E402
+from fixtures import FakeIMDS, TCPListener, write_services_file  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Simple Web App.')
+    parser.add_argument('--suite', choices=('all', 'micro', 'http'), default='all')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='Run only these micro groups or HTTP route names')
+    parser.add_argument('--duration', type=float, default=1.0,
+                        help='Seconds per benchmark (default: 1)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Concurrent HTTP clients per route (default: 8)')
+    parser.add_argument('--url', help='Load-test a running server instead of an in-process one')
+    parser.add_argument('--services', type=int, default=10,
+                        help='Services in the in-process server config (default: 10)')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Saved run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change treated as a regression (default: 0.2)')
+    return parser.parse_args(argv)
+
+
+def configure_environment(tmp: str, imds: FakeIMDS, listener: TCPListener, services: int):
+    """Point the app at the local fixtures; must run before utils is imported."""
+    services_path = os.path.join(tmp, 'services.json')
+    write_services_file(services_path, services, port=listener.port)
+    os.environ.update({
+        'AWS_METADATA_ENDPOINT': imds.url,
+        'SERVICES_CONFIG_PATH': services_path,
+        'PORT': str(listener.port),
+        'LOG_LEVEL': 'WARNING',
+        'LOG_REQUEST_SAMPLE_RATE': '0',
+        'HISTORY_FILE': '',
+        # Load tests measure the handlers, not the per-client budgets
+        'RATE_LIMIT_ENABLED': 'false'
+    })
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    imds, listener = FakeIMDS(), TCPListener()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, imds, listener, args.services)
+        from utils.logging_config import setup_logging
+        setup_logging()
+
+        if args.suite in ('all', 'micro'):
+            from micro import BENCHMARKS
+            for name, bench in BENCHMARKS.items():
+                if args.only and name not in args.only:
+                    continue
+                print(f"running {name}...", file=sys.stderr)
+                results.extend(bench(args.duration))
+
+        if args.suite in ('all', 'http'):
+            from http_load import run_http, start_app_server, uncovered_routes
+            server = None
+            base_url = args.url
+            if base_url is None:
+                base_url, server = start_app_server()
+                from api import app
+                missing = uncovered_routes(app)
+                if missing:
+                    print(f"warning: routes without a load test: {', '.join(missing)}",
+                          file=sys.stderr)
+            print(f"load-testing {base_url}...", file=sys.stderr)
+            results.extend(run_http(base_url, args.concurrency, args.duration,
+                                    listener.port, args.only))
+            if server is not None:
+                server.shutdown()
+
+    imds.close()
+    listener.close()
+
+    run = build_run(results, REPO_DIR)
+    print(format_table(run))
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{run['commit'] or 'run'}.json")
+    save_run(run, output)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        report, regressions = compare_runs(load_run(args.compare), run, args.threshold)
+        print('\n' + report)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())